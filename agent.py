@@ -1,17 +1,27 @@
 # agent.py
 
+import asyncio
 import json
 import random
 import os
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import Dict, List, Any, Optional
 import re
 
+from llm_cache import LLMResponseCache, get_response_cache, CacheMissError
+from llm_pool import get_llm_pool, call_with_retries, hedged, default_backend
+from prompt_builder import build_decision_prompt, build_batch_prompt
+from surrogate import log_decision
+import llm_trace
+from decision_schema import CHOICES_SCHEMA, DECISION_STATS, parse_choices, parse_batch, validate_choices
+
 load_dotenv()
 
+# 에이전트 한 명의 결정에 허용하는 턴당 지연 예산(초). 넘기면 해당 에이전트만 Fallback 결정을 사용
+AGENT_TURN_SLO_SEC = float(os.getenv("AGENT_TURN_SLO_SEC", "120"))
+
 class CompanyInputs(BaseModel):
     price: int = Field(description="제품 가격 (정수)")
     marketing_spend_ratio: float = Field(description="매출 대비 마케팅비 비율 (0.05~0.3)")
@@ -123,23 +133,51 @@ def extract_and_load_json(text: str):
         return None
 
 class AIAgent:
-    def __init__(self, name: str, persona: str, use_mock: bool = False):
+    def __init__(self, name: str, persona: str, use_mock: bool = False, response_cache=None, sim_id: str = None,
+                 backend: str = None):
         self.name = name
         self.persona = persona
-        self.use_mock = use_mock
+        # LLM 백엔드: gemini(실제 API) | http(로컬 스탠드인 서버) | mock(프로세스 내 고정 응답)
+        self.backend = "mock" if use_mock else (backend or default_backend())
+        self.use_mock = self.backend == "mock"
+        self.sim_id = sim_id  # 공용 클라이언트 풀에서 시뮬레이션별 공정 큐잉 단위
         self.model_name = 'gemini-2.5-pro' # 필요에 따라 모델명 변경 (예: gemini-pro)
+        # 응답 캐시 (LLM_CACHE_MODE=off|read_write|replay). replay 모드는 네트워크를 쓰지 않으므로 API 키도 필요 없음
+        self.response_cache = response_cache if response_cache is not None else get_response_cache()
 
-        if not self.use_mock and not os.getenv("GOOGLE_API_KEY") and not os.getenv("GEMINI_API_KEY"):
+        if self.backend == "gemini" and not self.response_cache.replay_only \
+                and not os.getenv("GOOGLE_API_KEY") and not os.getenv("GEMINI_API_KEY"):
              raise ValueError("GOOGLE_API_KEY 또는 GEMINI_API_KEY 환경 변수가 설정되지 않았습니다.")
 
-    async def get_gemini_response_async(self, prompt: str) -> str:
+    async def get_gemini_response_async(self, prompt: str, deadline: float = None, system_instruction: str = None,
+                                        response_schema=None) -> str:
+        cache = self.response_cache
+        if cache.enabled:
+            cached = cache.get(self.model_name, prompt, system_instruction)
+            if cached is not None:
+                print(f"--- (LLM 캐시 적중: {self.name}) ---")
+                llm_trace.annotate(cache_hit=True)
+                return cached
+            if cache.replay_only:
+                # decide_action의 예외 처리에서 Fallback 결정으로 넘어감
+                raise CacheMissError(f"replay 모드: {self.name}의 프롬프트가 캐시에 없습니다.")
         try:
-            print(f"--- (실제 Gemini API 비동기 호출 시작: {self.name}) ---")
-            async with genai.Client().aio as client:
-                response = await client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt
-                )
+            print(f"--- (LLM 비동기 호출 시작: {self.name}, backend={self.backend}) ---")
+            pool = get_llm_pool(self.backend)
+
+            # Native JSON 모드: 코드 블록/설명 없이 스키마에 맞는 JSON만 받음
+            config = types.GenerateContentConfig(
+                system_instruction=system_instruction,
+                response_mime_type="application/json",
+                response_schema=response_schema,
+            )
+
+            def call():
+                return pool.generate_content(model=self.model_name, contents=prompt, config=config, sim_id=self.sim_id)
+
+            response = await call_with_retries(lambda: hedged(call, pool.hedge_delay()), deadline=deadline)
+            if cache.enabled:
+                cache.put(self.model_name, prompt, response.text, system_instruction)
             return response.text
         except Exception as e:
             print(f"!!! Gemini API 비동기 호출 중 오류 발생 ({self.name}): {e} !!!")
@@ -147,7 +185,7 @@ class AIAgent:
             # decide_action의 try-except 블록이 '현재 상태 기반 Fallback'을 쓰게 유도함
             raise e
 
-    def _create_fallback_decision(self, market_state: dict, reason: str):
+    def _create_fallback_decision(self, market_state: dict, reason: str, deferred=None):
         my_data = market_state.get("companies", {}).get(self.name, {})
         current_cost = my_data.get("unit_cost", 100) # 원가 없으면 100
         safe_price = int(current_cost * 1.1) # 10% 마진
@@ -156,6 +194,9 @@ class AIAgent:
         safe_budget = max(0, int(current_capital * 0.01))
 
         print(f"🛡️ [Fallback] {self.name} 안전 모드! 원가({current_cost}) -> 가격({safe_price})")
+        (deferred or DECISION_STATS).record_decision(fallback=True)
+        llm_trace.increment("fallbacks")
+        llm_trace.annotate(error=reason[:200])
 
         return [
             {
@@ -171,267 +212,141 @@ class AIAgent:
             }
         ]
 
-    async def decide_action(self, market_state: dict) -> dict:
-        """[Phase 1] R&D 누적 시스템, 물리 엔진 튜닝, 하이브리드 예산 규칙에 따라 행동을 결정합니다."""
-        
-        opponent_name = market_state.get("opponent_name", "경쟁사")
-
-        # --- 1. 분기 보고서 정보 포맷팅 ---
-        quarterly_report_info = ""
-        report = market_state.get("quarterly_report")
-        if report:
-            quarterly_report_info = f"""
-            # [A. 지난 분기({report['turn_range'][0]}~{report['turn_range'][1]}턴) 재무제표 (공개 정보)]
-            {json.dumps(report['data'], indent=2)}
-            """
-        else:
-            quarterly_report_info = """
-            # [A. 지난 분기 재무제표]
-            # (이번 턴에는 분기 보고서가 없습니다. '전쟁 안개' 상태입니다.)
-            """
-
-        # --- 2. 턴별 요약 정보 포맷팅 ---
-        comparison_info = ""
-        if market_state.get("last_turn_comparison"):
-            comp = market_state["last_turn_comparison"]
-            comparison_info = f"""
-            # [B. 지난 턴 나의 성과 (단기)]
-            * 나의 이익: {comp['my_profit']:,.0f}
-            """
-        
-        summary_info = ""
-        if market_state.get("historical_summary"):
-            summary = market_state["historical_summary"]
-            summary_info = f"""
-            # [C. 최근 {summary['window_size']}턴 나의 평균 이익 (중기 추세)]
-            * 나의 평균 이익: {summary['my_avg_profit_4turn']:,.0f}
-            """
-
-        # --- 3. 예산 제약 조건 포맷팅 (하이브리드 예산) ---
-        constraint_info = ""
-        my_company_data = market_state.get("companies", {}).get(self.name, {})
-        current_unit_cost = my_company_data.get("unit_cost", 0)
-        
-        # 지난 턴 나의 결정(가격)을 확인 (없으면 기본값)
-        last_turn_results = market_state.get("last_turn_results", {})
-        last_price = last_turn_results.get(f"{self.name}_price", current_unit_cost * 1.1)
-        
-        # 단위당 마진 계산
-        unit_margin = last_price - current_unit_cost
-        margin_rate = (unit_margin / last_price * 100) if last_price > 0 else 0
-        
-        cfo_warning = ""
-        if unit_margin < 0:
-            cfo_warning = f"""
-            🚨 [CFO 긴급 경고: 역마진(Negative Margin) 발생 중!] 🚨
-            * 현재 당신은 물건을 하나 팔 때마다 {abs(unit_margin):,.0f}원씩 손해를 보고 있습니다!
-            * 원가({current_unit_cost:,.0f}원) > 판매가({last_price:,.0f}원) 상태입니다.
-            * 이 상태가 지속되면 점유율이 높을수록 더 빨리 파산합니다.
-            * 즉시 가격을 원가 이상(최소 {current_unit_cost * 1.05:,.0f}원 권장)으로 인상하십시오.
-            """
-        elif margin_rate < 5.0:
-            cfo_warning = f"""
-            ⚠️ [CFO 경고: 이익률 위험 수준]
-            * 현재 대당 마진이 {unit_margin:,.0f}원 ({margin_rate:.1f}%)에 불과합니다.
-            * 마케팅/R&D 비용을 감당하기에 턱없이 부족합니다. 가격 인상을 고려하십시오.
-            """
-        else:
-            cfo_warning = f"""
-            ✅ [CFO 보고: 재무 건전성 양호]
-            * 현재 대당 마진: {unit_margin:,.0f}원 ({margin_rate:.1f}%)
-            * 안정적인 수익 구조를 유지하고 있습니다.
-            """
-        my_accumulated_profit = my_company_data.get("accumulated_profit", 0)
-        
-        max_marketing_budget = my_company_data.get('max_marketing_budget', 1000000)
-        max_rd_budget = my_company_data.get('max_rd_budget', 500000)
+    def _normalize_choices(self, choices_list: list, market_state: dict) -> list:
+        """[호환성 처리 및 안전장치] 단일/배치 응답 공통."""
+        for choice in choices_list:
+            decision = choice.get("decision", {})
             
-        constraint_info = f"""
-        # [D. 기업 생존 및 예산 제약 (현실)]
-        * (참고) 현재 총 누적 이익(자본): {my_accumulated_profit:,.0f} 원
-        
-        **[중요: 하이브리드 예산 한도]**
-        * **1. 최대 R&D 예산 (전략): {max_rd_budget:,.0f} 원**
-            * (이 예산은 매 턴 '총 누적 이익(자본)'에 비례하여 갱신됩니다.)
-        * **2. 최대 마케팅 예산 (운영): {max_marketing_budget:,.0f} 원**
-            * (이 예산은 4턴(1분기)마다 '지난 분기 이익'을 바탕으로 갱신됩니다.)
-
-        * **'rd_...' 지출 총합은 '최대 R&D 예산'을 초과할 수 없습니다.**
-        * **'marketing_...' 지출 총합은 '최대 마케팅 예산'을 초과할 수 없습니다.**
-        * **파산(누적 이익 < 0)은 CEO로서 최악의 실패입니다.**
-        """
-
-        # --- [신규] 3.5. R&D 누적 현황 정보 (Phase 1 추가) ---
-        # simulator.py에서 보내준 누적 포인트와 설정값(threshold)을 읽어옵니다.
-        acc_rd_inno = my_company_data.get("accumulated_rd_innovation_point", 0)
-        acc_rd_eff = my_company_data.get("accumulated_rd_efficiency_point", 0)
-        
-        config = market_state.get("config", {})
-        thresh_inno = config.get("rd_innovation_threshold", 5000000)
-        thresh_eff = config.get("rd_efficiency_threshold", 5000000)
-        
-        # 달성률 계산 (0으로 나누기 방지)
-        percent_inno = (acc_rd_inno / thresh_inno * 100) if thresh_inno > 0 else 0
-        percent_eff = (acc_rd_eff / thresh_eff * 100) if thresh_eff > 0 else 0
-
-        rd_status_info = f"""
-        # [E. R&D 프로젝트 진행 현황 (누적 시스템)]
-        * **혁신(품질) 프로젝트:** 현재 누적 {acc_rd_inno:,.0f} / 목표 {thresh_inno:,.0f} (진척률 {percent_inno:.1f}%)
-        * **효율(원가) 프로젝트:** 현재 누적 {acc_rd_eff:,.0f} / 목표 {thresh_eff:,.0f} (진척률 {percent_eff:.1f}%)
-        * (목표 금액을 채우면 즉시 기술적 성과(품질 향상 또는 원가 절감)가 발생하고, 누적 포인트는 차감됩니다.)
-        """
-
-        # --- 4. 현재 시장 상황 (전쟁 안개 적용) ---
-        state_for_prompt = market_state.copy()
-        # 프롬프트 토큰 절약을 위해 중복/불필요 정보 제거
-        state_for_prompt.pop("last_turn_comparison", None)
-        state_for_prompt.pop("historical_summary", None)
-        state_for_prompt.pop("quarterly_report", None)
+            # 가격이 0이거나 터무니없이 작으면 원가 기반 보정
+            price = decision.get("price", 0)
+            my_cost = market_state.get("companies", {}).get(self.name, {}).get("unit_cost", 100)
+            if price <= 0:
+                 decision["price"] = int(my_cost * 1.1)
+            
+            # 키 이름 보정 (구버전 호환)
+            if "marketing_spend" in decision and "marketing_brand_spend" not in decision:
+                decision["marketing_brand_spend"] = int(decision.get("marketing_spend", 0))
+            if "rd_spend" in decision and "rd_innovation_spend" not in decision:
+                decision["rd_innovation_spend"] = int(decision.get("rd_spend", 0))
+            
+            choice["decision"] = decision 
+
+        return choices_list
+
+    async def decide_action(self, market_state: dict, deadline: float = None, projection=None,
+                            deferred=None) -> dict:
+        """[Phase 1] R&D 누적 시스템, 물리 엔진 튜닝, 하이브리드 예산 규칙에 따라 행동을 결정합니다.
+        deadline(이벤트 루프 시간)까지 응답이 없으면 이 에이전트만 Fallback 결정을 반환합니다.
+        projection은 시뮬레이션당 한 번 계산한 prompt_builder.TurnProjection (없으면 market_state에서 생성).
+        deferred(decision_schema.DeferredDecisions)를 주면 선행 계산: 결정 로그/DECISION_STATS 기록은 채택될 때까지 미루고
+        추적 로그에는 kind="speculative"로 기록합니다."""
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + AGENT_TURN_SLO_SEC
         
-        # 상대방의 민감한 정보(예산, 원가 등) 숨기기
-        if "companies" in state_for_prompt:
-            for name in list(state_for_prompt["companies"].keys()):
-                if name != self.name:
-                    state_for_prompt["companies"][name].pop("max_marketing_budget", None)
-                    state_for_prompt["companies"][name].pop("max_rd_budget", None)
-                    state_for_prompt["companies"][name].pop("unit_cost", None)
-                    state_for_prompt["companies"][name].pop("accumulated_profit", None)
-                    # 품질/브랜드 점수도 가끔은 숨겨질 수 있으나, 지금은 공개 정보로 가정
-                    # state_for_prompt["companies"][name].pop("product_quality", None)
-                    # state_for_prompt["companies"][name].pop("brand_awareness", None)
-                    state_for_prompt["companies"][name].pop("market_share", None)
-                    # 상대방 R&D 진행 상황도 숨김 (비밀 프로젝트)
-                    state_for_prompt["companies"][name].pop("accumulated_rd_innovation_point", None)
-                    state_for_prompt["companies"][name].pop("accumulated_rd_efficiency_point", None)
+        # 정적 규칙/페르소나는 system_instruction, 턴별 정보는 압축된 프롬프트로 분리
+        system_instruction, prompt = build_decision_prompt(self.name, self.persona, market_state, projection=projection)
+
+        # LLM_TRACE_DIR이 있으면 호출 하나를 추적 로그 한 줄로 기록 (지연/토큰/파싱/Fallback)
+        with llm_trace.traced_call(prompt, system_instruction, kind="speculative" if deferred else "decision",
+                                   sim_id=self.sim_id,
+                                   turn=market_state.get("turn"), agent=self.name, backend=self.backend,
+                                   model=self.model_name):
+            # --- 7. API 호출 및 파싱 ---
+            try:
+                if self.use_mock:
+                    response_text = call_mock_llm_api(prompt) 
                 else:
-                    # 내 정보에서는 점유율만 제거 (결과로 확인하므로)
-                    state_for_prompt["companies"][name].pop("market_share", None)
-        
-        market_snapshot = json.dumps(state_for_prompt, indent=2)
-
-        # --- 5. 최종 프롬프트 생성 (Phase 1 로직 반영) ---
-        prompt = f"""
-        # [1. 당신의 최종 목표]
-        당신의 목표는 경쟁사를 이기고 시뮬레이션 종료 시 **'누적 이익(accumulated_profit)'을 극대화**하는 것입니다.
-
-        # [2. 당신의 전략적 성향 (페르소나)]
-        **{self.persona}**
-
-        # [3. 현재 시장 상황 (실시간 공개 정보)]
-        {market_snapshot}
-
-        # [3-1. CFO의 재무 분석 리포트 (가장 중요)]
-        {cfo_warning}
-
-        # [4. 성과 및 제약 리포트]
-        {quarterly_report_info}
-        {comparison_info}  
-        {summary_info}    
-        {constraint_info}
-        {rd_status_info} 
-
-        # [5. 새로운 시장 물리 법칙 (Phase 1: 축적과 물리 엔진)]
-        당신은 불확실한 도박이 아닌, **'축적의 시간'**을 보내고 있습니다.
-        
-        * **법칙 1: 자산 감가상각 (Asset Decay)**
-            * 품질(Quality)과 브랜드(Brand)는 가만히 있으면 매 턴 하락(Decay)합니다.
-            * 현상 유지를 위해서라도 꾸준한 투자가 필요합니다.
-
-        * **법칙 2: R&D 누적 (Accumulation System)**
-            * R&D는 마일스톤(목표 금액)을 달성할 때까지 투자를 '누적'해야 합니다.**
-            * [E. R&D 프로젝트 진행 현황]을 참고하여, 조금씩 꾸준히 투자할지, 아니면 한 번에 큰돈을 부어 기술 격차를 벌릴지 결정하십시오.
-            * `rd_innovation_spend`: 품질 향상 프로젝트에 누적됩니다. (제품 경쟁력 상승)
-            * `rd_efficiency_spend`: 원가 절감 프로젝트에 누적됩니다. (이익률 개선)
-
-        * **법칙 3: 마케팅 효율 (Marketing Physics)**
-            * 마케팅은 브랜드 자산을 쌓습니다.
-            * `marketing_brand_spend`: 장기적인 브랜드 인지도를 높입니다.
-            * `marketing_promo_spend`: 이번 턴에만 적용되는 가격 할인(판촉) 효과를 냅니다.
-
-        * **법칙 4: 하이브리드 예산**
-            * R&D 예산은 '총자본'에서 나오므로 장기적인 계획이 가능합니다.
-            * 마케팅 예산은 '분기 이익'에서 나오므로 실적이 나쁘면 예산이 삭감됩니다.
-
-        위 정보를 바탕으로, [2. 페르소나]에 맞춰 4가지 지출 항목에 예산을 현명하게 배분하십시오.
-
-        # [6. 응답 형식]
-        반드시 3가지의 논리적인 전략적 선택지를 포함한 JSON 배열 형식으로 응답해야 합니다.
-        각 선택지는 'reasoning', 'probability', 'decision' 키를 포함해야 합니다.
-        'probability'의 총합은 1.0이어야 합니다.
-        예시는 다음과 같습니다.
-        [
-            {{
-                "reasoning": "경쟁사의 기술 추격을 따돌리기 위해 혁신 R&D에 집중 투자하여 마일스톤을 달성합니다.",
-                "probability": 0.6,
-                "decision": {{
-                "price": 20000,
-                "marketing_brand_spend": 1000000,
-                "marketing_promo_spend": 0,
-                "rd_innovation_spend": 3000000,
-                "rd_efficiency_spend": 0
-                }}
-            }},
-            {{
-                "reasoning": "R&D 투자를 잠시 줄이고 마케팅 판촉에 집중하여 단기 점유율을 방어합니다.",
-                "probability": 0.4,
-                "decision": {{
-                "price": 19000,
-                "marketing_brand_spend": 2000000,
-                "marketing_promo_spend": 1500000,
-                "rd_innovation_spend": 500000,
-                "rd_efficiency_spend": 0
-                }}
-            }}
-        ]
-        """
+                    response_text = await asyncio.wait_for(
+                        self.get_gemini_response_async(prompt, deadline=deadline, system_instruction=system_instruction,
+                                                       response_schema=CHOICES_SCHEMA),
+                        timeout=max(0.0, deadline - loop.time()),
+                    )
+            
+                # 스키마 검증 한 번 (실패하면 로컬 복구 후 재검증, 그래도 안 되면 DecisionParseError -> Fallback)
+                choices = self._normalize_choices(parse_choices(response_text, deferred), market_state)
+                (deferred or DECISION_STATS).record_decision(fallback=False)
+                # DECISION_LOG_PATH가 있으면 대리 정책(surrogate) 학습용으로 기록 (Fallback은 기록하지 않음)
+                if deferred:
+                    deferred.defer(log_decision, market_state, self.name, self.persona, choices)
+                else:
+                    log_decision(market_state, self.name, self.persona, choices)
+                return choices
+
+            except asyncio.TimeoutError:
+                return self._create_fallback_decision(market_state, "응답 마감 시간 초과", deferred)
+            except Exception as e:
+                # [핵심] 모든 에러(API, 파싱 등)를 잡아서 안전 모드 가동
+                return self._create_fallback_decision(market_state, str(e), deferred)
         
-        # --- 7. API 호출 및 파싱 ---
+async def decide_actions_batched(agents: list, market_states: dict, projection, deadline: float = None,
+                                 deferred=None) -> dict:
+    """
+    [배치 모드] 한 번의 LLM 호출로 여러 에이전트의 선택지를 받습니다. {회사이름: 선택지 배열}을 반환합니다.
+    공통 시장 정보는 한 번만 보내고, 응답은 회사별로 따로 검증합니다.
+    응답에서 빠졌거나 형식이 잘못된 회사는 그 회사만 Fallback 결정을 사용합니다.
+    호출 자체는 첫 번째 에이전트의 백엔드/모델/캐시/sim_id로 나갑니다.
+    deferred는 AIAgent.decide_action과 같음 (결정 로그/통계는 채택될 때 반영, 추적 kind="speculative")
+    """
+    loop = asyncio.get_running_loop()
+    if deadline is None:
+        deadline = loop.time() + AGENT_TURN_SLO_SEC
+    lead = agents[0]
+
+    system_instruction, prompt = build_batch_prompt(
+        market_states, {agent.name: agent.persona for agent in agents}, projection)
+
+    with llm_trace.traced_call(prompt, system_instruction, kind="speculative" if deferred else "batch",
+                               sim_id=lead.sim_id,
+                               turn=next(iter(market_states.values())).get("turn"),
+                               agent=",".join(agent.name for agent in agents), backend=lead.backend,
+                               model=lead.model_name):
         try:
-            if self.use_mock:
-                response_text = call_mock_llm_api(prompt) 
+            if lead.use_mock:
+                batch = {agent.name: json.loads(call_mock_llm_api("")) for agent in agents}
             else:
-                response_text = await self.get_gemini_response_async(prompt)
-            
-            # extract_and_load_json은 JSON 배열(list)을 반환해야 함
-            choices_list = extract_and_load_json(response_text)
-
-            if choices_list is None or not isinstance(choices_list, list):
-                print(f"오류: AI 응답이 JSON 배열이 아닙니다. 응답: {response_text[:100]}...")
-                raise json.JSONDecodeError("JSON 파싱 함수가 list를 반환하지 않음", response_text, 0)
-
-            # [호환성 처리 및 안전장치]
-            for choice in choices_list:
-                decision = choice.get("decision", {})
-                
-                # 가격이 0이거나 터무니없이 작으면 원가 기반 보정
-                price = decision.get("price", 0)
-                my_cost = market_state.get("companies", {}).get(self.name, {}).get("unit_cost", 100)
-                if price <= 0:
-                     decision["price"] = int(my_cost * 1.1)
-                
-                # 키 이름 보정 (구버전 호환)
-                if "marketing_spend" in decision and "marketing_brand_spend" not in decision:
-                    decision["marketing_brand_spend"] = int(decision.get("marketing_spend", 0))
-                if "rd_spend" in decision and "rd_innovation_spend" not in decision:
-                    decision["rd_innovation_spend"] = int(decision.get("rd_spend", 0))
-                
-                choice["decision"] = decision 
-
-            return choices_list 
-
+                response_text = await asyncio.wait_for(
+                    lead.get_gemini_response_async(prompt, deadline=deadline, system_instruction=system_instruction),
+                    timeout=max(0.0, deadline - loop.time()),
+                )
+                batch = parse_batch(response_text, deferred)
+            batch_error = None
+        except asyncio.TimeoutError:
+            batch, batch_error = {}, "응답 마감 시간 초과"
         except Exception as e:
-            # [핵심] 모든 에러(API, 파싱 등)를 잡아서 안전 모드 가동
-            return self._create_fallback_decision(market_state, str(e))
-        
-SCENARIO_DESIGNER_SYSTEM_PROMPT = """
+            batch, batch_error = {}, str(e)
+
+        results = {}
+        for agent in agents:
+            state = market_states[agent.name]
+            try:
+                if agent.name not in batch:
+                    raise ValueError(batch_error or "배치 응답에 해당 회사가 없음")
+                results[agent.name] = agent._normalize_choices(validate_choices(batch[agent.name]), state)
+            except ValueError as e:
+                results[agent.name] = agent._create_fallback_decision(state, str(e), deferred)
+                continue
+            (deferred or DECISION_STATS).record_decision(fallback=False)
+            if deferred:
+                deferred.defer(log_decision, state, agent.name, agent.persona, results[agent.name])
+            else:
+                log_decision(state, agent.name, agent.persona, results[agent.name])
+    return results
+
+# --- 시나리오 생성: 개요(outline) 1회 + 턴별 호출 동시 실행 ---
+# 10턴 전체를 한 번에 받으면 max_output_tokens 근처에서 잘려 요청 전체가 실패하므로,
+# 작은 개요를 먼저 받고 각 턴은 개요를 공통 접두부로 삼아 동시에 생성한 뒤 ScenarioOutput으로 검증합니다.
+SCENARIO_TURN_MAX_ATTEMPTS = 2
+
+SCENARIO_PERSONA_RULES = """
 당신은 정교한 '비즈니스 워게임 시뮬레이션 설계자'입니다.
-사용자 주제를 바탕으로 JSON 시나리오를 작성하되, **AI 에이전트가 시뮬레이션 변수(점유율, 이익 등)를 보고 판단할 수 있는 "구체적이고 실전적인 페르소나"**를 작성해야 합니다.
+**AI 에이전트가 시뮬레이션 변수(점유율, 이익 등)를 보고 판단할 수 있는 "구체적이고 실전적인 페르소나"**를 작성해야 합니다.
 문장을 길게 쓰지 말고 **핵심만 짧게** 쓰십시오.
 
 ### 1. 페르소나 작성 규칙 (Simulation-Friendly)
 각 회사의 `persona`는 아래 3단 구조를 따르며, **시뮬레이션 변수(Market Share, Profit, R&D, Cost)**를 직접 언급해야 합니다.
 
-* **[1. 정체성 (Identity)]**: 회사의 궁극적 목표 (1턴부터 10턴까지 **동일한 문장 복사**)
+* **[1. 정체성 (Identity)]**: 회사의 궁극적 목표 (모든 턴에서 **동일한 문장 복사**)
     * 예: "우리는 **고마진(High Profit)**과 **프리미엄 브랜드(High Brand)**를 추구하는 럭셔리 기업입니다."
 
 * **[2. 상황 (Context)]**: 현재 수치적 상황 요약
@@ -440,165 +355,206 @@ SCENARIO_DESIGNER_SYSTEM_PROMPT = """
 * **[3. 지침 (Directive)]**: 구체적인 행동 전략 (우선순위 설정)
     * 상황에 따라 **'선택과 집중'** 혹은 **'균형 유지'**를 명확히 지시하십시오.
     * **Type A (공격/위기):** "~를 희생해서라도 ~를 달성하라." (Trade-off)
-        * 예: "가격을 낮춰 **단기 이익(Profit)** 희생/**점유율(Share)** 방어."
     * **Type B (안정/성장):** "~와 ~의 균형을 맞춰라." (Balance)
-        * 예: "안정적인 선에서 **R&D 혁신(Innovation)** 투자 증가."
-
-### 2. 분량 및 구조
-* **총 10턴(Turns)**으로 구성하십시오.
-* `turn_description`: 1문장 요약.
-* 시나리오에서 시장의 판도를 가장 크게 바꾸는 턴을 **핵심 턴**이라 규정합니다.
-* **핵심 턴**은 반드시 전체 턴(10턴)의 중앙(4~5턴)이어야 합니다.
 
-### 3. 경제 데이터 (Realistic Data)
+### 2. 경제 데이터 (Realistic Data)
 * `unit_cost`: 판매가(`price`) 대비 마진(10~30%)을 고려하여 **반드시 정수(Integer)**로 기입.
 * `marketing_cost_base` 등은 자본금 규모에 맞춰 현실적으로 설정.
-
-### 4. 출력 형식
 * 오직 **순수한 JSON 문자열**만 출력하십시오.
+"""
+
+SCENARIO_OUTLINE_PROMPT = SCENARIO_PERSONA_RULES + """
+### 3. 지금 작성할 것: 시나리오 개요 (Outline)
+* `config`, 등장 회사(`companies`: 이름, [1.정체성] 문장, 0턴 `inputs`)와 턴별 1문장 요약(`turn_descriptions`)만 작성합니다.
+* `turn_descriptions`의 길이는 반드시 `config.total_turns`와 같아야 합니다.
+* 시장의 판도를 가장 크게 바꾸는 **핵심 턴**(`key_turn`)은 전체 턴의 중앙이어야 합니다.
+* 턴별 회사 데이터는 이후 단계에서 따로 작성하므로 여기서는 쓰지 마십시오.
+"""
+
+SCENARIO_TURN_PROMPT = SCENARIO_PERSONA_RULES + """
+### 3. 지금 작성할 것: 한 턴의 데이터
+* 주어진 개요의 회사 전원에 대해 지정된 턴 하나의 `TurnData`만 작성합니다.
+* `persona`의 [1.정체성]은 개요의 `identity` 문장을 그대로 복사하고, [2.상황]/[3.지침]은 이 턴의 요약에 맞게 씁니다.
+* 수치는 개요의 0턴 `inputs`에서 출발해 턴 요약의 흐름대로 자연스럽게 변하도록 추정합니다.
 * `companies` 내부 데이터는 반드시 `inputs`과 `outputs` 객체로 분리해야 합니다. **구조 평탄화 금지.**
 
----
-**[JSON 출력 예시 (Strictly Follow)]**
-{
-  "scenario_name": "Smartphone Wars 2010",
-  "description": "Apple vs Samsung competition...",
-  "config": {
-    "total_turns": 10,
-    "market_size": 1000000,
-    "initial_capital": 5000000000,
-    "physics": { "price_sensitivity": 30.0, "marketing_efficiency": 2.0, "weight_quality": 0.5, "weight_brand": 0.3, "weight_price": 0.2, "others_overall_competitiveness": 0.5 },
-    "marketing_cost_base": 2000000,
-    "rd_innovation_threshold": 100000000
-  },
-  "turns_data": [
-    {
-      "turn": 0,
-      "turn_description": "Galaxy S 출시로 인한 경쟁 본격화.",
-      "companies": {
-        "Apple": {
-          "persona": "[1.정체성] 우리는 **고마진(High Profit)**과 **프리미엄 브랜드(High Brand)**를 최우선으로 추구합니다. 점유율보다 대당 순이익을 중시합니다. [2.상황] 독점적 지위가 흔들림. [3.지침] **가격(Price) 방어**, **이익(Profit) 우선**, **마케팅(Marketing) 집중**.",
-          "inputs": { 
-            "price": 800, "unit_cost": 400, 
-            "marketing_spend_ratio": 0.2, "rd_spend_ratio": 0.1, 
-            "initial_quality": 90, "initial_brand": 95 
-          },
-          "outputs": { "actual_market_share": 0.45, "actual_accumulated_profit": 100000000 }
-        },
-        "Samsung": {
-          "persona": "[1.정체성] 우리는 **시장 점유율(Market Share)** 극대화와 **가격 경쟁력(Price Competitiveness)**을 핵심 가치로 삼습니다. [2.상황] 시장 진입 초기. [3.지침] **이익(Profit) 희생**, **점유율(Share) 확대**, **저가 정책(Low Price)**.",
-          "inputs": { 
-            "price": 600, "unit_cost": 350, 
-            "marketing_spend_ratio": 0.3, "rd_spend_ratio": 0.1, 
-            "initial_quality": 80, "initial_brand": 60 
-          },
-          "outputs": { "actual_market_share": 0.25, "actual_accumulated_profit": 50000000 }
-        }
-      }
-    },
-    {
-      "turn": 1,
-      "turn_description": "보급형 모델 확산으로 삼성 점유율 상승.",
-      "companies": {
-        "Apple": {
-          "persona": "[1.정체성] 우리는 **고마진(High Profit)**과 **프리미엄 브랜드(High Brand)**를 최우선으로 추구합니다. 점유율보다 대당 순이익을 중시합니다. (복사됨) [2.상황] 경쟁사 추격 허용. [3.지침] **가격(Price) 동결**, **R&D 품질 혁신(Innovation)**, **격차 유지**.",
-          "inputs": { 
-            "price": 800, "unit_cost": 390, 
-            "marketing_spend_ratio": 0.2, "rd_spend_ratio": 0.15,
-            "initial_quality": 92, "initial_brand": 94
-          },
-          "outputs": { 
-            "actual_market_share": 0.42, 
-            "actual_accumulated_profit": 250000000 
-          }
-        },
-        "Samsung": {
-          "persona": "[1.정체성] 우리는 **시장 점유율(Market Share)** 극대화와 **가격 경쟁력(Price Competitiveness)**을 핵심 가치로 삼습니다. (복사됨) [2.상황] 점유율 확대 성공. [3.지침] **마진(Margin) 최소화**, **물량 공세(Volume)**, **판촉 강화**.",
-          "inputs": { 
-            "price": 550, "unit_cost": 340, 
-            "marketing_spend_ratio": 0.25, "rd_spend_ratio": 0.1,
-            "initial_quality": 82, "initial_brand": 65
-          },
-          "outputs": { 
-            "actual_market_share": 0.30, 
-            "actual_accumulated_profit": 130000000 
-          }
-        }
-      }
-    }
-  ]
-}
+**[출력 형식]**
+{"turn": 3, "turn_description": "...", "companies": {"Apple": {"persona": "[1.정체성] ... [2.상황] ... [3.지침] ...",
+  "inputs": {"price": 800, "unit_cost": 390, "marketing_spend_ratio": 0.2, "rd_spend_ratio": 0.15, "initial_quality": 92, "initial_brand": 94},
+  "outputs": {"actual_market_share": 0.42, "actual_accumulated_profit": 250000000}}}}
 """
 
-async def generate_scenario_async(topic: str, model_name: str = 'gemini-2.5-pro') -> dict:
+class ScenarioCompanySeed(BaseModel):
+    name: str
+    identity: str = Field(description="[1.정체성] 문장 (모든 턴에서 그대로 복사)")
+    inputs: CompanyInputs = Field(description="0턴 기준 수치")
+
+class ScenarioOutline(BaseModel):
+    scenario_name: str
+    description: str
+    config: ScenarioConfig
+    companies: List[ScenarioCompanySeed]
+    turn_descriptions: List[str] = Field(description="턴별 핵심 사건 1문장 (길이 = total_turns)")
+    key_turn: int = Field(description="판도를 가장 크게 바꾸는 핵심 턴")
+
+def normalize_topic(topic: str) -> str:
+    return " ".join((topic or "").lower().split())
+
+_scenario_cache = None
+
+def get_scenario_cache() -> LLMResponseCache:
+    """완성된 시나리오 캐시 (SCENARIO_CACHE_MODE=off|read_write|replay, SCENARIO_CACHE_PATH)."""
+    global _scenario_cache
+    if _scenario_cache is None:
+        _scenario_cache = LLMResponseCache(
+            path=os.getenv("SCENARIO_CACHE_PATH", "scenario_cache.sqlite3"),
+            mode=os.getenv("SCENARIO_CACHE_MODE", "read_write"),
+        )
+    return _scenario_cache
+
+def _auto_balance(scenario_json: dict):
+    """대표 가격 x 시장 크기로 마케팅 기준가/R&D 임계값을 다시 맞춥니다."""
+    config = scenario_json["config"]
+    market_size = config.get("market_size", 1000000)
+    
+    # 대표 가격 찾기 (첫 턴의 첫 회사 가격 참조)
+    first_turn = scenario_json["turns_data"][0]
+    first_company = list(first_turn.get("companies", {}).values())[0]
+    price = first_company.get("inputs", {}).get("price", 100)
+    
+    # 예상 시장 총 매출 (Total Addressable Market Revenue)
+    estimated_revenue = market_size * price
+    
+    # 밸런싱 공식 적용
+    # - 마케팅 기준가: 매출의 10% (이 정도 써야 브랜드 점수 오름)
+    # - R&D 임계값: 매출의 20% (이 정도 써야 기술 혁신 일어남)
+    new_mkt_base = int(estimated_revenue * 0.1)
+    new_rd_threshold = int(estimated_revenue * 0.2)
+    
+    print(f"🔧 [Auto-Balance] Revenue: {estimated_revenue:,}")
+    print(f"   -> Marketing Base: {new_mkt_base:,} (Was: {config.get('marketing_cost_base', 'N/A')})")
+    print(f"   -> R&D Threshold:  {new_rd_threshold:,}")
+
+    config["marketing_cost_base"] = new_mkt_base
+    config["rd_innovation_threshold"] = new_rd_threshold
+    config["rd_efficiency_threshold"] = new_rd_threshold
+
+async def _scenario_call(pool, model_name: str, prompt: str, system_instruction: str, max_output_tokens: int,
+                         response_schema=None) -> dict:
+    def call():
+        return pool.generate_content(
+            model=model_name,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=response_schema,
+                system_instruction=system_instruction,
+                max_output_tokens=max_output_tokens,
+                temperature=0.7,
+            ),
+            sim_id="scenario_generator",
+        )
+    response = await call_with_retries(call)
+    data = extract_and_load_json(response.text or "")
+    if not isinstance(data, dict):
+        print(f"Truncated Text Check: ...{(response.text or '')[-200:]}")
+        raise ValueError("LLM이 유효한 JSON을 반환하지 않았습니다.")
+    return data
+
+async def _generate_turn(pool, model_name: str, outline: ScenarioOutline, outline_json: str, turn: int) -> dict:
+    """한 턴 생성. 잘림/형식 오류는 이 턴만 다시 요청합니다."""
+    names = [c.name for c in outline.companies]
+    descriptions = outline.turn_descriptions
+    # 개요를 앞에 두어 모든 턴 호출이 같은 접두부를 공유
+    prompt = (f"# 시나리오 개요\n{outline_json}\n\n"
+              f"# 작성할 턴: {turn}\n"
+              f"- 이번 턴 요약: {descriptions[turn]}\n"
+              f"- 이전 턴 요약: {descriptions[turn - 1] if turn > 0 else '(시작)'}\n"
+              f"- 다음 턴 요약: {descriptions[turn + 1] if turn + 1 < len(descriptions) else '(종료)'}\n"
+              f"- 핵심 턴: {outline.key_turn}\n"
+              f"- 포함할 회사: {', '.join(names)}")
+    last_error = None
+    for _ in range(SCENARIO_TURN_MAX_ATTEMPTS):
+        try:
+            data = await _scenario_call(pool, model_name, prompt, SCENARIO_TURN_PROMPT, max_output_tokens=2048)
+            data["turn"] = turn
+            data.setdefault("turn_description", descriptions[turn])
+            turn_data = TurnData.model_validate(data)
+            missing = set(names) - set(turn_data.companies)
+            if missing:
+                raise ValueError(f"턴 {turn}에 회사 누락: {sorted(missing)}")
+            return turn_data.model_dump()
+        except (ValueError, ValidationError) as e:
+            last_error = e
+            print(f"⚠️ [Scenario] 턴 {turn} 재생성: {e}")
+    raise ValueError(f"턴 {turn} 생성 실패: {last_error}")
+
+async def _generate_outline(pool, model_name: str, topic: str, total_turns: int) -> ScenarioOutline:
+    """
+    개요 생성. 턴 수는 요청한 total_turns로 고정합니다. (LLM이 적어 준 total_turns는 무시)
+    턴 요약이 모자라면 다시 요청하고, 넘치면 앞의 total_turns개만 씁니다.
+    """
+    last_error = None
+    for _ in range(SCENARIO_TURN_MAX_ATTEMPTS):
+        try:
+            outline_data = await _scenario_call(
+                pool, model_name,
+                f'주제: "{topic}"\n총 턴 수: {total_turns}\n위 주제로 시나리오 개요 JSON을 작성해줘.',
+                SCENARIO_OUTLINE_PROMPT, max_output_tokens=4096, response_schema=ScenarioOutline,
+            )
+            outline = ScenarioOutline.model_validate(outline_data)
+            if len(outline.turn_descriptions) < total_turns:
+                raise ValueError(f"턴 요약 {len(outline.turn_descriptions)}개 < 요청 {total_turns}턴")
+            outline.config.total_turns = total_turns
+            outline.turn_descriptions = outline.turn_descriptions[:total_turns]
+            return outline
+        except (ValueError, ValidationError) as e:
+            last_error = e
+            print(f"⚠️ [Scenario] 개요 재생성: {e}")
+    raise ValueError(f"개요 생성 실패: {last_error}")
+
+async def generate_scenario_async(topic: str, model_name: str = 'gemini-2.5-pro', total_turns: int = 10,
+                                  refresh: bool = False) -> dict:
     """
     LLM을 사용하여 주제(topic)에 맞는 시나리오 JSON을 생성합니다.
+    개요 1회 호출 뒤 턴별 호출을 동시에 보내므로 지연은 대략 '개요 + 가장 느린 턴' 입니다.
+    완성된 시나리오는 정규화된 주제 + 파라미터로 캐시합니다. (refresh=True면 캐시를 건너뜀)
     """
     if not os.getenv("GOOGLE_API_KEY") and not os.getenv("GEMINI_API_KEY"):
         print("!!! API Key not found. Returning MOCK Scenario. !!!")
         return _generate_mock_scenario(topic)
 
-    prompt = f"""
-    주제: "{topic}"
-    위 주제로 시뮬레이션 시나리오 JSON을 작성해줘.
-    """
+    cache = get_scenario_cache()
+    cache_prompt = json.dumps({"topic": normalize_topic(topic), "total_turns": total_turns}, ensure_ascii=False)
+    if cache.enabled and not refresh:
+        cached = cache.get(model_name, cache_prompt, SCENARIO_TURN_PROMPT)
+        if cached is not None:
+            print(f"--- (Scenario Cache Hit: {topic}) ---")
+            return json.loads(cached)
+        if cache.replay_only:
+            raise CacheMissError(f"replay 모드: '{topic}' 시나리오가 캐시에 없습니다.")
 
     try:
         print(f"--- (Scenario Generation Start: {topic}) ---")
-        
-        async with genai.Client().aio as client:
-            response = await client.models.generate_content(
-                model=model_name,
-                contents=prompt,
-                # [핵심 수정] Native JSON Mode 활성화 & 토큰 한도 최대치
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    # response_schema=ScenarioOutput,
-                    system_instruction=SCENARIO_DESIGNER_SYSTEM_PROMPT,
-                    max_output_tokens=8192, 
-                    temperature=0.7,
-                )
-            )
-        
-        scenario_json = json.loads(response.text)
-        
-        # Native JSON 모드는 마크다운 없이 순수 JSON만 주므로 바로 파싱 가능
-        try:
-            config = scenario_json.get("config", {})
-            market_size = config.get("market_size", 1000000)
-            
-            # 대표 가격 찾기 (첫 턴의 첫 회사 가격 참조)
-            first_turn = scenario_json.get("turns_data", [])[0]
-            first_company = list(first_turn.get("companies", {}).values())[0]
-            price = first_company.get("inputs", {}).get("price", 100)
-            
-            # 예상 시장 총 매출 (Total Addressable Market Revenue)
-            estimated_revenue = market_size * price
-            
-            # 밸런싱 공식 적용
-            # - 마케팅 기준가: 매출의 10% (이 정도 써야 브랜드 점수 오름)
-            # - R&D 임계값: 매출의 20% (이 정도 써야 기술 혁신 일어남)
-            new_mkt_base = int(estimated_revenue * 0.1)
-            new_rd_threshold = int(estimated_revenue * 0.2)
-            
-            print(f"🔧 [Auto-Balance] Revenue: {estimated_revenue:,}")
-            print(f"   -> Marketing Base: {new_mkt_base:,} (Was: {config.get('marketing_cost_base', 'N/A')})")
-            print(f"   -> R&D Threshold:  {new_rd_threshold:,}")
-
-            # 값 덮어쓰기
-            scenario_json["config"]["marketing_cost_base"] = new_mkt_base
-            scenario_json["config"]["rd_innovation_threshold"] = new_rd_threshold
-            scenario_json["config"]["rd_efficiency_threshold"] = new_rd_threshold
-
-        except json.JSONDecodeError:
-            # 혹시라도 실패하면 기존 추출 함수 시도
-            print(f"⚠️ Auto-balancing skipped due to error: {e}")
-            scenario_json = extract_and_load_json(response.text)
-        
-        if not scenario_json:
-            print(f"Truncated Text Check: ...{response.text[-200:]}")
-            raise ValueError("LLM이 유효한 JSON을 반환하지 않았습니다.")
-            
+        pool = get_llm_pool("gemini")
+
+        outline = await _generate_outline(pool, model_name, topic, total_turns)
+        outline_json = outline.model_dump_json()
+
+        turns = await asyncio.gather(*(_generate_turn(pool, model_name, outline, outline_json, t)
+                                       for t in range(total_turns)))
+
+        scenario = ScenarioOutput(
+            scenario_name=outline.scenario_name,
+            description=outline.description,
+            config=outline.config,
+            turns_data=turns,
+        )
+        scenario_json = scenario.model_dump()
+        _auto_balance(scenario_json)
+
+        if cache.enabled:
+            cache.put(model_name, cache_prompt, json.dumps(scenario_json, ensure_ascii=False), SCENARIO_TURN_PROMPT)
         return scenario_json
 
     except Exception as e:
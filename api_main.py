@@ -1,16 +1,33 @@
 import asyncio
+import copy
 import uuid
 import itertools
 import time
 import json
 import os
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Dict, Optional, Any
 from fastapi.middleware.cors import CORSMiddleware
-
-from simulator import MarketSimulator
-from agent import AIAgent, generate_scenario_async
+from fastapi.responses import StreamingResponse
+
+from simulator import MarketSimulator, FrozenConfig, freeze_config
+from agent import AIAgent, generate_scenario_async, decide_actions_batched, AGENT_TURN_SLO_SEC
+from benchmark_cache import BenchmarkPrefixCache, params_key, prefix_hashes
+from estimator import estimate_physics, local_search_values
+from shared_scenario import evaluate_candidates_shared
+from llm_cache import get_response_cache
+from llm_pool import get_llm_pool, LLM_BACKENDS
+from surrogate import SurrogateAgent
+from best_response import DUMMY_POLICIES, BestResponseAgent
+from batch_sim import demand_curve, project_choices
+from oracle import ORACLE_MODES, forward_oracle, hindsight_oracle
+from decision_schema import DECISION_STATS
+import llm_trace
+from speculation import SPECULATOR
+from choice_flight import CHOICE_FLIGHTS, StaleChoices, sim_lock
+from autoplay import AUTOPLAY_POLICIES, run_games
+from prompt_builder import TurnProjection
 
 QUARTERLY_REPORT_INTERVAL = 4
 
@@ -29,6 +46,12 @@ app.add_middleware(
 
 active_simulations = {}
 
+# 벤치마크 증분 재개 캐시 (BENCHMARK_CACHE_DIR가 있으면 디스크에도 보존)
+benchmark_prefix_cache = BenchmarkPrefixCache(
+    max_entries=int(os.getenv("BENCHMARK_CACHE_MAX_ENTRIES", "2048")),
+    cache_dir=os.getenv("BENCHMARK_CACHE_DIR") or None,
+)
+
 # --- 데이터 모델 ---
 class MarketPhysicsConfig(BaseModel):
     weight_quality: float = Field(0.4)
@@ -44,6 +67,11 @@ class BenchmarkData(BaseModel):
     config: Optional[Dict[str, Any]] = None 
     turns_data: List[dict]
     physics_override: Optional[Dict[str, Any]] = None
+    seed_from_estimate: bool = True # auto_tune 전에 회귀 추정치로 탐색 공간을 좁힐지 여부
+    workers: Optional[int] = None # auto_tune 후보 평가에 쓸 프로세스 수 (2 이상이면 공유 메모리 풀 사용)
+    batched_prompting: bool = False # create_from_scenario: 모든 AI 회사의 결정을 LLM 한 번에 요청
+    speculative_prefetch: bool = False # 예측 결정으로 다음 턴 선택지를 미리 계산
+    _frozen_base_config: Optional[Any] = PrivateAttr(default=None) # 시뮬레이션들이 공유하는 불변 base config
 
 class CompanyConfig(BaseModel):
     name: str = Field(..., example="GM")
@@ -53,6 +81,8 @@ class CompanyConfig(BaseModel):
     initial_product_quality: float = Field(..., example=60.0)
     initial_brand_awareness: float = Field(..., example=70.0)
     initial_accumulated_profit: Optional[float] = Field(None)
+    # 회사별 의사결정 백엔드: gemini | http | mock | surrogate (없으면 LLM_BACKEND 기본값)
+    agent_backend: Optional[str] = Field(None, example="surrogate")
 
 class SimulationConfig(BaseModel):
     preset_name: Optional[str] = None
@@ -79,9 +109,47 @@ class SimulationConfig(BaseModel):
     brand_decay_rate: float = Field(0.2)
     
     physics: MarketPhysicsConfig = Field(default_factory=MarketPhysicsConfig)
+    # 모든 AI 회사의 결정을 LLM 한 번의 호출로 요청 (회사 수가 많을수록 요청 수/입력 토큰 절감)
+    batched_prompting: bool = Field(False)
+    # True면 get_choices 직후 가장 유력한 결정으로 다음 턴 선택지를 백그라운드에서 미리 계산
+    speculative_prefetch: bool = Field(False)
+    # Others(더미) 정책: fixed = 지난 AI 평균가의 95% + 고정 예산 / best_response = 이익 극대화 가격
+    dummy_policy: str = Field("fixed")
+    # get_choices 선택지마다 k턴 앞 예상 점유율/이익을 붙임 (0이면 끔)
+    lookahead_turns: int = Field(3)
+    # LLM 에이전트가 쓸 응답 캐시 (None이면 프로세스 공용 캐시). 토너먼트처럼 코드에서 모드를 고정할 때만 설정
+    _response_cache: Optional[Any] = PrivateAttr(default=None)
+
+class AutoplayOptions(BaseModel):
+    policy: str = Field("top", description="top: 확률 최대 선택지 / sample: 확률에 따라 샘플링")
+    seed: Optional[int] = Field(None, description="sample 정책의 재현용 seed (게임별 seed + 순번)")
+
+class AutoplayRequest(AutoplayOptions):
+    games: List[SimulationConfig]
+    max_concurrent_games: int = Field(16, ge=1)
+    keep_simulations: bool = Field(False, description="False면 끝난 게임을 active_simulations에서 제거")
+    game_seeds: Optional[List[int]] = Field(None, description="게임별 seed (주면 seed + 순번 대신 사용)")
 
 class ScenarioRequest(BaseModel):
     topic: str = Field(..., description="시나리오 주제 (예: 2010년 스마트폰 전쟁)")
+    total_turns: int = Field(10, ge=1, le=30)
+    refresh: bool = Field(False, description="True면 시나리오 캐시를 무시하고 새로 생성")
+
+class OracleRequest(BaseModel):
+    company: str
+    mode: str = Field("hindsight", description="hindsight: 시작 시점부터 재생해 regret 계산 / forward: 남은 턴 최적 계획")
+    # 빔 x 행동 격자(168) x 남은 턴만큼 롤아웃하므로 상한을 둠
+    beam_width: int = Field(8, ge=1, le=64)
+
+class WhatIfRequest(BaseModel):
+    company: str
+    # prices를 주지 않으면 원가의 price_min_markup~price_max_markup 배 구간을 price_steps개로 나눔
+    prices: Optional[List[float]] = None
+    price_min_markup: float = Field(0.8)
+    price_max_markup: float = Field(3.0)
+    price_steps: int = Field(200)
+    promo_spends: List[float] = Field(default_factory=lambda: [0.0])
+    brand_spends: List[float] = Field(default_factory=lambda: [0.0])
 
 class EventInject(BaseModel):
     description: str
@@ -100,6 +168,8 @@ class AgentFinalDecision(BaseModel):
 
 class ExecuteTurnRequest(BaseModel):
     decisions: Dict[str, AgentFinalDecision]
+    # 결정을 내린 턴 (선택지를 받을 때의 state.turn). 주면 시뮬레이션이 이미 넘어간 경우 409로 거절
+    turn: Optional[int] = None
 
 class PresetSaveRequest(BaseModel):
     filename: str
@@ -162,6 +232,8 @@ async def save_preset(req: PresetSaveRequest):
 @app.post("/simulations")
 async def create_simulation(config: SimulationConfig):
     sim_id = str(uuid.uuid4())
+    if config.dummy_policy not in DUMMY_POLICIES:
+        raise HTTPException(400, f"Unknown dummy_policy '{config.dummy_policy}'. Use one of {DUMMY_POLICIES}")
     
     sim_config_dict = config.model_dump(exclude={"companies", "preset_name"}) 
     
@@ -199,8 +271,13 @@ async def create_simulation(config: SimulationConfig):
             # 이익 기반 예산 재산정
             market.companies[c.name]["max_rd_budget"] = max(500000, c.initial_accumulated_profit * 0.05)
 
-    agents = [AIAgent(name=name, persona=personas[name], use_mock=False) for name in [c.name for c in config.companies]]
-    active_simulations[sim_id] = {"market": market, "agents": agents}
+    agents = [_make_agent(c.name, personas[c.name], sim_id, c.agent_backend, config._response_cache)
+              for c in config.companies]
+    active_simulations[sim_id] = {"market": market, "agents": agents, "batched": config.batched_prompting,
+                                  "speculative": config.speculative_prefetch, "speculation": None,
+                                  "lookahead_turns": config.lookahead_turns,
+                                  # oracle의 hindsight 재생용 생성 시점 스냅샷
+                                  "initial_market": copy.deepcopy(market)}
     print(f"✅ Simulation Created: {sim_id} (Turn {market.turn})")
     
     return {"simulation_id": sim_id, "initial_state": market.get_market_state()}
@@ -210,22 +287,100 @@ async def run_benchmark_simulation(data: BenchmarkData):
     if not data.turns_data: raise HTTPException(status_code=400, detail="No turn data provided")
     
     override_params = data.physics_override
-    market = _initialize_market_for_benchmark(data, override_params=override_params)
+    market, resumed_turns = _run_benchmark_turns(data, override_params=override_params)
     
-    results_log = []; total_mae = 0.0
-    for turn_data in data.turns_data:
-        market.run_benchmark_turn(turn_data)
-        last_result = market.history[-1]
-        results_log.append(last_result)
-        total_mae += last_result.get("total_error_mae", 0)
+    results_log = market.history[:len(data.turns_data)]
+    total_mae = sum(r.get("total_error_mae", 0) for r in results_log)
     avg_mae = total_mae / len(data.turns_data)
-    return {"scenario": data.scenario_name, "average_error_mae": avg_mae, "history": results_log, "message": f"Completed. MAE: {avg_mae:.4f}"}
+    return {"scenario": data.scenario_name, "average_error_mae": avg_mae, "history": results_log, "resumed_from_turn": resumed_turns, "message": f"Completed. MAE: {avg_mae:.4f}"}
+
+@app.get("/admin/benchmark_cache")
+async def get_benchmark_cache_stats():
+    return benchmark_prefix_cache.stats()
+
+@app.get("/admin/llm_cache_stats")
+async def get_llm_cache_stats():
+    return get_response_cache().stats()
+
+@app.get("/admin/llm_pool_stats")
+async def get_llm_pool_stats():
+    return get_llm_pool().stats()
+
+@app.get("/admin/decision_stats")
+async def get_decision_stats():
+    """에이전트 응답 파싱 경로(직접/복구/실패), 파싱 시간, Fallback 비율"""
+    return DECISION_STATS.summary()
+
+@app.get("/admin/llm_trace_summary")
+async def get_llm_trace_summary(by: str = "agent", sort: str = "latency_sec"):
+    """LLM_TRACE_DIR 추적 로그의 그룹별 퍼센타일 요약 (by: 쉼표로 구분한 필드, 예: sim_id,agent / prompt_hash)"""
+    trace_dir = os.getenv("LLM_TRACE_DIR")
+    if not trace_dir: raise HTTPException(400, "LLM_TRACE_DIR is not set")
+    return llm_trace.summarize(llm_trace.load_traces(trace_dir), by=tuple(by.split(",")), sort=sort)
+
+@app.post("/admin/estimate_physics")
+async def estimate_physics_endpoint(data: BenchmarkData):
+    estimate = estimate_physics(data.turns_data)
+    if estimate is None:
+        raise HTTPException(status_code=400, detail="Not enough price/share variation to estimate physics")
+    return estimate
 
 @app.post("/admin/auto_tune")
 async def auto_tune_parameters(data: BenchmarkData):
     print(f"\n=== ⚡ Auto-Tuning Started (Deep Search Mode) ===")
     start_time = time.time()
     
+    valid_combinations, estimate = _build_tuning_candidates(data)
+    
+    total_combos = len(valid_combinations)
+    print(f"🧪 Total Dense Combinations to Test: {total_combos}")
+    print(f"⏳ 예상 소요 시간: {total_combos * 0.002:.1f}초 (약 {total_combos/500/60:.1f}분)")
+
+    best_mae = float('inf')
+    best_params = {}
+    
+    # 진행 상황 표시를 위한 카운터
+    log_interval = max(1, total_combos // 10) 
+
+    # 벤치마크 실행 (workers가 2 이상이면 시나리오를 공유 메모리에 올리고 프로세스 풀로 평가)
+    if data.workers and data.workers > 1:
+        # 프로세스 풀이 끝날 때까지 이벤트 루프(SSE/자동 진행/선행 계산)가 멈추지 않게 스레드에서 대기
+        maes = await asyncio.to_thread(evaluate_candidates_shared, data, valid_combinations, workers=data.workers)
+    else:
+        # 후보마다 접두사 캐시 키가 다르므로, 턴이 덧붙은 뒤 다시 돌릴 때까지 모든 후보의 항목이 남도록 LRU 크기를 그리드에 맞춤
+        # (재실행 중에는 후보당 이전 접두사 + 늘어난 접두사 두 개가 함께 있음)
+        benchmark_prefix_cache.reserve(2 * total_combos)
+        maes = (_evaluate_benchmark_params(data, params) for params in valid_combinations)
+
+    for i, (params, avg_mae) in enumerate(zip(valid_combinations, maes)):
+        if avg_mae is None:
+            continue
+        
+        if avg_mae < best_mae:
+            best_mae = avg_mae
+            best_params = params.copy()
+            print(f"  [🔥 New Best! {i+1}/{total_combos}] MAE: {best_mae*100:.2f}% | Sensitivity: {params['price_sensitivity']} | Brand: {params['weight_brand']}")
+
+        # 진행 로그 (너무 자주 찍지 않음)
+        if i % log_interval == 0:
+             print(f"  .. processing {i}/{total_combos} ({i/total_combos*100:.0f}%) ..")
+
+    elapsed = time.time() - start_time
+    print(f"=== 🏁 Deep Tuning Finished in {elapsed:.2f} seconds ===")
+    print(f"=== 🏆 Best MAE: {best_mae*100:.2f}% ===")
+    
+    return {
+        "best_params": best_params, 
+        "lowest_mae": best_mae, 
+        "seed_estimate": estimate,
+        "message": f"Tested {total_combos} scenarios in {elapsed:.1f}s. Best MAE: {best_mae*100:.2f}%"
+    }
+
+def _build_tuning_candidates(data: BenchmarkData):
+    """
+    auto_tune 탐색 후보(파라미터 조합) 목록을 만듭니다. 분산 튜닝(distributed.py)도 같은 후보를 씁니다.
+    반환: (유효한 조합 리스트, 회귀 추정치 또는 None)
+    """
     # [개선점 1] 탐색 범위를 매우 촘촘하게(Dense) 설정
     # 기존에 3~4개씩 보던 것을 5~8개 단계로 세분화했습니다.
     search_space = {
@@ -239,6 +394,20 @@ async def auto_tune_parameters(data: BenchmarkData):
         "rd_innovation_threshold": [1000000.0, 3000000.0, 5000000.0]
     }
     
+    # [개선점 3] 회귀 추정치로 탐색 공간 축소 (가중치/가격 민감도는 데이터에서 바로 추정 가능)
+    estimate = estimate_physics(data.turns_data) if data.seed_from_estimate else None
+    if estimate:
+        for name in ("weight_quality", "weight_brand"):
+            if name in estimate["seeded"]:
+                lo, hi = estimate["ranges"][name]
+                search_space[name] = local_search_values(estimate["physics"][name], lo, hi)
+        if "price_sensitivity" in estimate["seeded"]:
+            # 가격 효과는 weight_price * price_sensitivity로만 식별되므로 곱(beta)을 탐색하고 조합별로 역산
+            beta = estimate["beta_price"]
+            search_space.pop("price_sensitivity")
+            search_space["_beta_price"] = [b for b in local_search_values(beta["value"], *beta["range"]) if b > 0]
+        print(f"📐 Regression Seed: {estimate['physics']} (seeded={estimate['seeded']}, R²={estimate['r2']:.2f})")
+    
     # 모든 조합 생성 (Cartesian Product)
     keys, values = zip(*search_space.items())
     param_combinations = [dict(zip(keys, v)) for v in itertools.product(*values)]
@@ -260,75 +429,54 @@ async def auto_tune_parameters(data: BenchmarkData):
             # 만약 합이 1.0을 넘어가면, 시뮬레이터가 알아서 비율대로 처리하겠지만
             # 여기서는 명시적으로 weight_price를 별도로 할당
             params["weight_price"] = weight_price
+            if "_beta_price" in params:
+                params["price_sensitivity"] = round(params.pop("_beta_price") * 5.0 / weight_price, 4)
             valid_combinations.append(params)
     
-    total_combos = len(valid_combinations)
-    print(f"🧪 Total Dense Combinations to Test: {total_combos}")
-    print(f"⏳ 예상 소요 시간: {total_combos * 0.002:.1f}초 (약 {total_combos/500/60:.1f}분)")
-
-    best_mae = float('inf')
-    best_params = {}
-    
-    # 진행 상황 표시를 위한 카운터
-    log_interval = max(1, total_combos // 10) 
-
-    for i, params in enumerate(valid_combinations):
-        # 벤치마크 실행
-        try:
-            market = _initialize_market_for_benchmark(data, override_params=params)
-            current_total_mae = 0.0
-            
-            # 턴별 실행 및 오차 계산
-            valid_run = True
-            for turn_data in data.turns_data:
-                market.run_benchmark_turn(turn_data)
-                # 결과가 비정상(NaN 등)이면 중단
-                last_res = market.history[-1]
-                if "total_error_mae" not in last_res:
-                    valid_run = False
-                    break
-                current_total_mae += last_res["total_error_mae"]
-            
-            if valid_run:
-                avg_mae = current_total_mae / len(data.turns_data)
-                
-                if avg_mae < best_mae:
-                    best_mae = avg_mae
-                    best_params = params.copy()
-                    print(f"  [🔥 New Best! {i+1}/{total_combos}] MAE: {best_mae*100:.2f}% | Sensitivity: {params['price_sensitivity']} | Brand: {params['weight_brand']}")
-        
-        except Exception as e:
-            continue
-
-        # 진행 로그 (너무 자주 찍지 않음)
-        if i % log_interval == 0:
-             print(f"  .. processing {i}/{total_combos} ({i/total_combos*100:.0f}%) ..")
+    return valid_combinations, estimate
 
-    elapsed = time.time() - start_time
-    print(f"=== 🏁 Deep Tuning Finished in {elapsed:.2f} seconds ===")
-    print(f"=== 🏆 Best MAE: {best_mae*100:.2f}% ===")
-    
-    return {
-        "best_params": best_params, 
-        "lowest_mae": best_mae, 
-        "message": f"Tested {total_combos} scenarios in {elapsed:.1f}s. Best MAE: {best_mae*100:.2f}%"
-    }
+def _evaluate_benchmark_params(data: BenchmarkData, params: Dict) -> Optional[float]:
+    """파라미터 조합 하나로 벤치마크를 돌려 평균 MAE를 반환합니다. 비정상 실행이면 None."""
+    try:
+        market, _ = _run_benchmark_turns(data, override_params=params)
+    except Exception:
+        return None
+
+    # 턴별 오차 집계 (캐시에서 재개된 턴 포함)
+    current_total_mae = 0.0
+    for last_res in market.history:
+        # 결과가 비정상(NaN 등)이면 중단
+        if "total_error_mae" not in last_res:
+            return None
+        current_total_mae += last_res["total_error_mae"]
+    return current_total_mae / len(data.turns_data)
 
 def _initialize_market_for_benchmark(data: BenchmarkData, override_params: Optional[Dict] = None) -> MarketSimulator:
-    # 1. Config 로드 및 물리 엔진 오버라이드
-    config = data.config.copy()
+    # 1. 공유 base config (불변) + 후보별 overlay
+    #    base는 시나리오당 한 번만 만들고 모든 시뮬레이션이 공유하므로, 오버라이드가 호출자의 config를 오염시키지 않습니다.
+    base_config = _benchmark_base_config(data)
+    overlay = {}
     if override_params:
         # physics가 있으면 병합
-        if "physics" in config and isinstance(config["physics"], dict):
-            config["physics"].update(override_params)
-        else:
-            config["physics"] = override_params
+        physics = base_config.get("physics")
+        overlay["physics"] = {**(physics if isinstance(physics, dict) else {}), **override_params}
             
         # Root 레벨 파라미터(R&D 등)도 오버라이드 지원
         if "rd_innovation_impact" in override_params:
-            config["rd_innovation_impact"] = override_params["rd_innovation_impact"]
+            overlay["rd_innovation_impact"] = override_params["rd_innovation_impact"]
         if "rd_innovation_threshold" in override_params:
-            config["rd_innovation_threshold"] = override_params["rd_innovation_threshold"]
+            overlay["rd_innovation_threshold"] = override_params["rd_innovation_threshold"]
+
+    company_names = list(base_config["initial_configs"].keys())
+    return MarketSimulator(company_names=company_names, config=base_config, overlay=overlay)
+
+def _benchmark_base_config(data: BenchmarkData) -> FrozenConfig:
+    """시나리오 config + 첫 턴 기반 initial_configs를 얼려서 만들고, data에 캐시해 둡니다."""
+    cached = getattr(data, "_frozen_base_config", None)
+    if cached is not None:
+        return cached
+
+    config = dict(data.config or {})
 
     # 2. 첫 턴 데이터에서 회사 목록 및 초기 상태 추출
     first_turn = data.turns_data[0]
@@ -378,10 +526,32 @@ def _initialize_market_for_benchmark(data: BenchmarkData, override_params: Optio
             "accumulated_profit": outputs.get("actual_accumulated_profit", 0)
         }
 
-    return MarketSimulator(company_names=company_names, config=config)
+    base_config = freeze_config(config)
+    data._frozen_base_config = base_config
+    return base_config
+
+def _run_benchmark_turns(data: BenchmarkData, override_params: Optional[Dict] = None):
+    """
+    벤치마크를 실행하되, 같은 설정/파라미터로 이미 계산한 가장 긴 턴 접두사가 있으면 거기서 이어서 실행합니다.
+    반환: (전체 턴을 마친 MarketSimulator, 캐시에서 재사용한 턴 수)
+    """
+    key = params_key(data.config, override_params)
+    hashes = prefix_hashes(data.turns_data)
+    resumed_turns, market = benchmark_prefix_cache.lookup(key, hashes)
+    if market is None:
+        market = _initialize_market_for_benchmark(data, override_params=override_params)
+
+    for turn_data in data.turns_data[resumed_turns:]:
+        market.run_benchmark_turn(turn_data)
+
+    if resumed_turns < len(hashes):
+        benchmark_prefix_cache.store(key, hashes[-1], market)
+    return market, resumed_turns
 
 # --- Helper Functions ---
-def _get_agent_specific_state(market, agent, all_agents): return market.get_market_state()
+def _get_agent_specific_state(market, agent, all_agents, market_state: dict = None):
+    """공통 시장 상태에 에이전트 시점의 지난 턴 비교/최근 N턴 요약을 붙입니다. (시뮬레이터의 증분 집계 사용)"""
+    return market.get_agent_state(agent.name, market_state)
 def _validate_and_clean_ai_decisions(raw, market):
     # 1. 프론트엔드에서 받은 데이터(raw)에서 reasoning만 뽑아서 별도 딕셔너리로 만듦
     reasoning = {}
@@ -392,32 +562,304 @@ def _validate_and_clean_ai_decisions(raw, market):
     # 2. (정제된 결정 데이터, 추출한 reasoning 딕셔너리) 순서로 반환
     return raw, reasoning
 
-@app.post("/simulations/{sim_id}/get_choices")
-async def get_agent_choices(sim_id: str):
+AGENT_BACKENDS = LLM_BACKENDS + ("surrogate", "best_response")
+
+def _make_agent(name: str, persona: str, sim_id: str, backend: Optional[str] = None, response_cache=None):
+    """
+    회사별 에이전트 생성. (surrogate/best_response는 LLM 호출 없음)
+    surrogate는 SURROGATE_MODEL_PATH의 학습된 대리 정책, best_response는 로짓 모델의 해석적 최적 대응을 사용.
+    response_cache는 LLM 에이전트에만 전달 (None이면 프로세스 공용 캐시)
+    """
+    if backend is not None and backend not in AGENT_BACKENDS:
+        raise HTTPException(400, f"Unknown agent_backend '{backend}'. Use one of {AGENT_BACKENDS}")
+    if backend == "surrogate":
+        try:
+            return SurrogateAgent(name=name, persona=persona, sim_id=sim_id)
+        except (OSError, ValueError) as e:
+            raise HTTPException(400, f"Surrogate model unavailable: {e}")
+    if backend == "best_response":
+        return BestResponseAgent(name=name, persona=persona, sim_id=sim_id)
+    return AIAgent(name=name, persona=persona, use_mock=False, sim_id=sim_id, backend=backend,
+                   response_cache=response_cache)
+
+def _start_choice_tasks(sim_id: str):
+    """get_choices / get_choices_stream 공통: 에이전트별 decide_action 코루틴을 (에이전트, 코루틴) 목록으로 만듭니다."""
     if sim_id not in active_simulations: raise HTTPException(404, "Not found")
     sim_data = active_simulations[sim_id]
     market = sim_data["market"]; agents = sim_data["agents"]
     if market.turn >= market.config.get("total_turns", 30): raise HTTPException(400, "Ended")
-    tasks = []
-    for agent in agents:
-        state = _get_agent_specific_state(market, agent, agents)
-        tasks.append(agent.decide_action(state))
-    choices = await asyncio.gather(*tasks)
-    return {a.name: c for a, c in zip(agents, choices)}
+    speculative = SPECULATOR.take(sim_data)
+    if speculative is not None:
+        # 지난 턴에 미리 계산한 선택지 사용 (아직 진행 중이면 남은 시간만 기다림)
+        async def pick_speculative(name):
+            return (await speculative)[name]
+        return market, [(agent, pick_speculative(agent.name)) for agent in agents]
+    return market, _choice_jobs(sim_data, market)
+
+def _choice_jobs(sim_data: dict, market, deferred=None):
+    """
+    market(실제 또는 선행 계산용 복제본)의 현재 턴에 대한 에이전트별 선택지 작업 목록.
+    deferred(DeferredDecisions)를 주면 선행 계산용 (결정 로그/통계는 채택될 때 반영)
+    """
+    agents = sim_data["agents"]
+    # 모든 에이전트가 같은 턴 마감 시간을 공유 -> 턴 지연은 가장 느린 호출이 아니라 SLO로 제한됨
+    deadline = asyncio.get_running_loop().time() + AGENT_TURN_SLO_SEC
+    # 공개 시장 정보 투영은 에이전트 수와 상관없이 턴당 한 번만 계산
+    market_state = market.get_market_state()
+    projection = TurnProjection(market_state)
+    states = {agent.name: _get_agent_specific_state(market, agent, agents, market_state) for agent in agents}
+
+    llm_agents = [agent for agent in agents if isinstance(agent, AIAgent)]
+    if sim_data.get("batched") and len(llm_agents) > 1:
+        # 배치 모드: LLM 호출은 한 번, 에이전트별 작업은 그 결과에서 자기 몫만 꺼냄 (대리 정책 에이전트는 따로 결정)
+        batch = asyncio.ensure_future(decide_actions_batched(llm_agents, states, projection, deadline=deadline,
+                                                             deferred=deferred))
+
+        async def pick(name):
+            return (await batch)[name]
+        return [(agent, pick(agent.name) if isinstance(agent, AIAgent)
+                 else agent.decide_action(states[agent.name], deadline=deadline, projection=projection,
+                                          deferred=deferred))
+                for agent in agents]
+
+    return [(agent, agent.decide_action(states[agent.name], deadline=deadline, projection=projection,
+                                        deferred=deferred))
+            for agent in agents]
+
+def _attach_lookahead(sim_id: str, market, choices: dict) -> dict:
+    """선택지마다 배치 fork로 계산한 k턴 앞 예상치('lookahead')를 붙입니다. (실제 시장 상태는 그대로)"""
+    turns = active_simulations.get(sim_id, {}).get("lookahead_turns", 0)
+    if not turns:
+        return choices
+    return project_choices(market, choices, turns)
+
+def _start_speculation(sim_id: str, choices: dict):
+    sim_data = active_simulations.get(sim_id)
+    if sim_data is not None:
+        SPECULATOR.maybe_start(sim_data, choices, lambda fork, deferred: _choice_jobs(sim_data, fork, deferred))
+
+async def _choice_flight(sim_id: str):
+    """현재 턴의 선택지 계산 (같은 턴의 동시/반복 요청은 하나의 계산을 공유)"""
+    if sim_id not in active_simulations: raise HTTPException(404, "Not found")
+    sim_data = active_simulations[sim_id]
+
+    # 시작 시점의 상태 읽기는 execute_turn/자동 진행과 겹치지 않게
+    async with sim_lock(sim_data):
+        turn = sim_data["market"].turn
+
+        def finish(market, choices):
+            if market.turn != turn:
+                # 계산 도중 턴이 이미 실행됨 -> 지난 턴 선택지로 선행 계산/lookahead를 만들지 않음
+                return choices
+            _start_speculation(sim_id, choices)
+            return _attach_lookahead(sim_id, market, choices)
+
+        return CHOICE_FLIGHTS.get(sim_data, lambda: _start_choice_tasks(sim_id), finish)
+
+@app.post("/simulations/{sim_id}/get_choices")
+async def get_agent_choices(sim_id: str):
+    try:
+        return await CHOICE_FLIGHTS.wait(await _choice_flight(sim_id))
+    except StaleChoices as e:
+        raise HTTPException(409, str(e))
+
+@app.get("/admin/speculation_stats")
+async def get_speculation_stats():
+    return SPECULATOR.stats()
+
+@app.get("/admin/choice_flight_stats")
+async def get_choice_flight_stats():
+    return CHOICE_FLIGHTS.stats()
+
+CHOICE_STREAM_PROGRESS_SEC = float(os.getenv("CHOICE_STREAM_PROGRESS_SEC", "1.0"))
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/simulations/{sim_id}/get_choices_stream")
+async def stream_agent_choices(sim_id: str):
+    """
+    get_choices의 SSE 버전. 에이전트 응답이 준비되는 즉시 'choice' 이벤트를 보내고,
+    호출이 진행 중인 동안에는 CHOICE_STREAM_PROGRESS_SEC마다 'progress' 이벤트를 보냅니다.
+    마지막에 'done' 이벤트로 get_choices와 같은 형태의 전체 결과를 보냅니다.
+    (선택지 조합이 모두 모여야 계산할 수 있는 lookahead는 'done' 이벤트의 결과에만 붙습니다)
+    계산이 끝나기 전에 그 턴이 실행되면 'error' 이벤트로 끝납니다.
+    """
+    flight = await _choice_flight(sim_id)
+
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tasks = {task: name for name, task in flight.agent_tasks.items()}
+        pending = set(tasks)
+        results = {}
+        with CHOICE_FLIGHTS.waiting(flight):
+            # 클라이언트가 연결을 끊으면 (다른 요청이 같은 계산을 기다리지 않는 한) 남은 LLM 호출도 취소
+            yield _sse("start", {"turn": flight.turn + 1, "agents": list(tasks.values())})
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, timeout=CHOICE_STREAM_PROGRESS_SEC,
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                    elapsed = round(loop.time() - started, 2)
+                    for task in done:
+                        if task.cancelled():
+                            raise flight.stale()
+                        name = tasks[task]
+                        results[name] = task.result()
+                        yield _sse("choice", {"agent": name, "choices": results[name], "elapsed_sec": elapsed,
+                                              "completed": len(results), "total": len(tasks)})
+                    if not done:
+                        yield _sse("progress", {"waiting": sorted(tasks[t] for t in pending), "elapsed_sec": elapsed,
+                                                "completed": len(results), "total": len(tasks)})
+                # 에이전트 순서와 lookahead는 get_choices와 같은 공유 결과 사용
+                choices = await CHOICE_FLIGHTS.wait(flight)
+            except StaleChoices as e:
+                yield _sse("error", {"detail": str(e)})
+                return
+            yield _sse("done", {"choices": choices, "elapsed_sec": round(loop.time() - started, 2)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/simulations/{sim_id}/execute_turn")
 async def execute_turn(sim_id: str, request: ExecuteTurnRequest):
     if sim_id not in active_simulations: raise HTTPException(404, "Not found")
-    market = active_simulations[sim_id]["market"]
-    decisions = {n: d.model_dump() for n, d in request.decisions.items()}
-    cleaned, reasoning = _validate_and_clean_ai_decisions(decisions, market)
-    next_state = market.process_turn(cleaned)
+    sim_data = active_simulations[sim_id]
+    async with sim_lock(sim_data):
+        market = sim_data["market"]
+        if request.turn is not None and request.turn != market.turn:
+            # 더블클릭/다른 탭에서 이미 진행된 턴의 결정
+            raise HTTPException(409, f"Stale turn: decisions for turn {request.turn}, simulation is at turn {market.turn}")
+        decisions = {n: d.model_dump() for n, d in request.decisions.items()}
+        cleaned, reasoning = _validate_and_clean_ai_decisions(decisions, market)
+        next_state = market.process_turn(cleaned)
+        # 실행된 턴의 선택지 계산이 아직 진행 중이면 취소 (끝난 뒤 지난 턴 선택지로 선행 계산을 시작하지 않게)
+        CHOICE_FLIGHTS.discard(sim_data, cancel=True)
+        SPECULATOR.on_commit(sim_data, cleaned)
     return {"turn": market.turn, "turn_results": market.history[-1], "ai_reasoning": reasoning, "next_state": next_state}
 
+def _ndjson(events):
+    async def body():
+        async for event in events:
+            yield json.dumps(event, ensure_ascii=False, default=float) + "\n"
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+def _check_autoplay_policy(policy: str):
+    if policy not in AUTOPLAY_POLICIES:
+        raise HTTPException(400, f"Unknown policy '{policy}'. Use one of {AUTOPLAY_POLICIES}")
+
+async def autoplay_events(req: AutoplayRequest):
+    """
+    게임들을 만들고 끝까지 동시에 진행하며 이벤트를 완료 순서대로 흘려보냅니다. (autoplay CLI에서도 사용)
+    설정이 잘못된 게임(예: 없는 agent_backend)은 error 이벤트로 알리고 나머지 게임만 진행합니다.
+    (스트림 헤더가 이미 나간 뒤라 HTTPException으로 끊으면 앞서 만든 시뮬레이션이 남음)
+    """
+    if req.game_seeds is not None and len(req.game_seeds) != len(req.games):
+        raise ValueError("game_seeds must have one seed per game")
+    games, sim_ids, game_seeds = [], [], []
+    try:
+        for index, config in enumerate(req.games):
+            try:
+                sim_id = (await create_simulation(config))["simulation_id"]
+            except Exception as e:
+                yield {"game": index, "event": "error", "error": getattr(e, "detail", None) or str(e)}
+                continue
+            sim_ids.append(sim_id)
+            sim_data = active_simulations[sim_id]
+            games.append((index, sim_data["market"], lambda market, sd=sim_data: _choice_jobs(sd, market)))
+            # 건너뛴 게임이 있어도 게임별 seed는 원래 순번 기준으로 유지
+            game_seeds.append(req.game_seeds[index] if req.game_seeds is not None
+                              else None if req.seed is None else req.seed + index)
+            yield {"game": index, "event": "game_start", "sim_id": sim_id,
+                   "companies": {c.name: c.persona for c in config.companies}}
+        async for event in run_games(games, req.policy, req.seed, req.max_concurrent_games,
+                                     game_seeds):
+            yield event
+    finally:
+        if not req.keep_simulations:
+            for sim_id in sim_ids:
+                active_simulations.pop(sim_id, None)
+    yield {"event": "done", "games": len(games)}
+
+@app.post("/autoplay")
+async def autoplay(req: AutoplayRequest):
+    """
+    여러 게임을 서버에서 끝까지 자동 진행하고 NDJSON으로 스트리밍합니다.
+    이벤트: game_start -> turn ... -> game_done (게임별, 완료 순서대로) -> done
+    """
+    _check_autoplay_policy(req.policy)
+    if req.game_seeds is not None and len(req.game_seeds) != len(req.games):
+        raise HTTPException(400, "game_seeds must have one seed per game")
+    return _ndjson(autoplay_events(req))
+
+@app.post("/simulations/{sim_id}/autoplay")
+async def autoplay_simulation(sim_id: str, options: AutoplayOptions):
+    """이미 만든 시뮬레이션의 남은 턴을 자동 진행 (NDJSON 스트림)"""
+    if sim_id not in active_simulations: raise HTTPException(404, "Not found")
+    _check_autoplay_policy(options.policy)
+    sim_data = active_simulations[sim_id]
+    games = [(sim_id, sim_data["market"], lambda market: _choice_jobs(sim_data, market))]
+
+    async def locked():
+        # 자동 진행 중에는 같은 시뮬레이션의 execute_turn/get_choices가 끝날 때까지 기다림
+        async with sim_lock(sim_data):
+            SPECULATOR.discard(sim_data, "invalidated")
+            CHOICE_FLIGHTS.discard(sim_data)
+            async for event in run_games(games, options.policy, options.seed, 1):
+                yield event
+    return _ndjson(locked())
+
+WHAT_IF_MAX_POINTS = int(os.getenv("WHAT_IF_MAX_POINTS", "20000"))
+
+@app.post("/simulations/{sim_id}/what_if")
+async def what_if_demand_curve(sim_id: str, req: WhatIfRequest):
+    """
+    읽기 전용 what-if: req.company의 다음 턴 가격(x 판촉비 x 브랜드비) 격자에 대한 점유율/이익 곡선과
+    이익 극대화 지점. 다른 회사는 지난 턴 결정을 유지하며, 실제 시뮬레이션 상태는 바뀌지 않습니다.
+    """
+    if sim_id not in active_simulations: raise HTTPException(404, "Not found")
+    market = active_simulations[sim_id]["market"]
+    if req.company not in market.ai_company_names:
+        raise HTTPException(400, f"Unknown company '{req.company}'")
+    if market.turn >= market.config.get("total_turns", 30): raise HTTPException(400, "Ended")
+    prices = req.prices
+    if not prices:
+        unit_cost = market.companies[req.company]["unit_cost"]
+        low, high, steps = unit_cost * req.price_min_markup, unit_cost * req.price_max_markup, max(2, req.price_steps)
+        prices = [low + (high - low) * i / (steps - 1) for i in range(steps)]
+    points = len(prices) * len(req.promo_spends or [0.0]) * len(req.brand_spends or [0.0])
+    if points > WHAT_IF_MAX_POINTS:
+        raise HTTPException(400, f"Grid too large ({points} > {WHAT_IF_MAX_POINTS})")
+    return demand_curve(market, req.company, prices, req.promo_spends or [0.0], req.brand_spends or [0.0])
+
+@app.post("/simulations/{sim_id}/oracle")
+async def oracle_plan(sim_id: str, req: OracleRequest):
+    """
+    한 회사의 최적 결정 시퀀스(oracle)를 빔 서치로 찾고, hindsight 모드에서는 에이전트의 regret을 함께 보고합니다.
+    다른 회사의 결정은 고정하며, 실제 시뮬레이션 상태는 바뀌지 않습니다.
+    """
+    if sim_id not in active_simulations: raise HTTPException(404, "Not found")
+    if req.mode not in ORACLE_MODES:
+        raise HTTPException(400, f"Unknown mode '{req.mode}'. Use one of {ORACLE_MODES}")
+    sim_data = active_simulations[sim_id]
+    market = sim_data["market"]
+    if req.company not in market.ai_company_names:
+        raise HTTPException(400, f"Unknown company '{req.company}'")
+    try:
+        if req.mode == "hindsight":
+            if sim_data.get("initial_market") is None:
+                raise HTTPException(400, "No initial snapshot for this simulation")
+            return await asyncio.to_thread(hindsight_oracle, sim_data["initial_market"], market, req.company, req.beam_width)
+        return await asyncio.to_thread(forward_oracle, market, req.company, req.beam_width)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
 @app.post("/simulations/{sim_id}/inject_event")
 async def inject_event_into_simulation(sim_id: str, event: EventInject):
     if sim_id not in active_simulations: raise HTTPException(404, "Not found")
     active_simulations[sim_id]["market"].inject_event(event.description, event.target_company, event.effect_type, event.impact_value, event.duration)
+    SPECULATOR.discard(active_simulations[sim_id], "invalidated")
+    CHOICE_FLIGHTS.discard(active_simulations[sim_id])
     return {"message": "Injected"}
 
 class PersonaUpdate(BaseModel):
@@ -440,6 +882,8 @@ async def update_persona(sim_id: str, update: PersonaUpdate):
     # 페르소나 교체
     old_persona = target_agent.persona
     target_agent.persona = update.new_persona
+    SPECULATOR.discard(sim_data, "invalidated")
+    CHOICE_FLIGHTS.discard(sim_data)
     
     print(f"🔄 [Intervention] {update.company_name} Persona Updated!")
     print(f"   OLD: {old_persona[:30]}...")
@@ -469,9 +913,10 @@ async def create_simulation_from_scenario(data: BenchmarkData):
         if "persona" in companies_data.get(name, {}):
              persona_text = companies_data[name]["persona"]
              
-        agents.append(AIAgent(name=name, persona=persona_text, use_mock=False))
+        agents.append(AIAgent(name=name, persona=persona_text, use_mock=False, sim_id=sim_id))
 
-    active_simulations[sim_id] = {"market": market, "agents": agents}
+    active_simulations[sim_id] = {"market": market, "agents": agents, "batched": data.batched_prompting,
+                                  "speculative": data.speculative_prefetch, "speculation": None}
     
     # 3. 중요: 프론트엔드가 비교할 수 있도록 '실제 역사 데이터'를 포함해서 리턴
     return {
@@ -487,7 +932,7 @@ async def generate_scenario_endpoint(req: ScenarioRequest):
     """
     try:
         # agent.py에 있는 함수를 호출
-        scenario_json = await generate_scenario_async(req.topic)
+        scenario_json = await generate_scenario_async(req.topic, total_turns=req.total_turns, refresh=req.refresh)
         return scenario_json
         
     except Exception as e:
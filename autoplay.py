@@ -0,0 +1,186 @@
+# autoplay.py
+"""
+서버 측 자동 진행(autoplay): 프론트엔드 왕복 없이 한 게임을 끝까지 진행합니다.
+    decide_action -> 선택(확률 최대 또는 seed 기반 샘플링) -> process_turn -> ... -> total_turns
+
+- 여러 게임을 동시에 돌리며, LLM 대기는 이벤트 루프에서 게임 간에 겹치고
+  시뮬레이터 계산(process_turn)은 asyncio.to_thread로 이벤트 루프 밖에서 실행합니다.
+- 결과는 턴/게임이 끝나는 순서대로 이벤트(dict)로 흘려보냅니다. (api_main에서는 NDJSON 스트림)
+
+헤드리스 실행 (밤샘 페르소나 대진):
+    python -m autoplay --personas personas.json --size 2 --policy sample --seed 7 --output results.ndjson
+    python -m autoplay --games games.json --concurrency 32
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+
+AUTOPLAY_POLICIES = ("top", "sample")
+
+
+def choose_decisions(choices: dict, policy: str = "top", rng: random.Random = None) -> dict:
+    """{회사: 선택지 배열} -> execute_turn과 같은 형태의 {회사: 결정 + reasoning}"""
+    decisions = {}
+    for name, options in choices.items():
+        if policy == "sample" and len(options) > 1:
+            weights = [max(0.0, float(o.get("probability", 0))) for o in options]
+            pick = (rng or random).choices(options, weights=weights if sum(weights) > 0 else None)[0]
+        else:
+            pick = max(options, key=lambda o: o.get("probability", 0))
+        decisions[name] = {**pick["decision"], "reasoning": pick.get("reasoning", "")}
+    return decisions
+
+
+def game_summary(market) -> dict:
+    names = market.ai_company_names
+    profits = {n: market.companies[n]["accumulated_profit"] for n in names}
+    return {
+        "turns": market.turn,
+        "market_share": {n: market.companies[n]["market_share"] for n in names},
+        "accumulated_profit": profits,
+        "winner": max(profits, key=profits.get) if profits else None,
+    }
+
+
+async def run_game(market, make_jobs, policy: str = "top", seed: int = None):
+    """
+    한 게임을 total_turns까지 진행하며 턴마다 이벤트를 yield 합니다.
+    make_jobs(market) -> [(agent, coroutine)] 는 api_main의 선택지 작업 생성기입니다.
+    """
+    rng = random.Random(seed)
+    total_turns = market.config.get("total_turns", 30)
+    while market.turn < total_turns:
+        jobs = make_jobs(market)
+        results = await asyncio.gather(*(job for _, job in jobs))
+        choices = {agent.name: result for (agent, _), result in zip(jobs, results)}
+        decisions = choose_decisions(choices, policy, rng)
+        # 시뮬레이터 계산은 스레드에서 (다른 게임의 LLM 응답 처리를 막지 않도록)
+        await asyncio.to_thread(market.process_turn, decisions)
+        yield {"event": "turn", "turn": market.turn, "decisions": decisions, "turn_results": market.history[-1]}
+    yield {"event": "game_done", **game_summary(market)}
+
+
+async def run_games(games: list, policy: str = "top", seed: int = None, max_concurrent_games: int = 16,
+                    game_seeds: list = None):
+    """
+    games: [(game_id, market, make_jobs)]. 게임들을 동시에 진행하며 이벤트를 완료 순서대로 yield 합니다.
+    게임별 seed는 seed + 게임 순번이므로 같은 입력이면 같은 선택이 재현됩니다.
+    game_seeds를 주면 게임별 seed를 그대로 사용합니다. (토너먼트 재개처럼 게임 순번이 바뀌어도 재현)
+    """
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, max_concurrent_games))
+    finished = object()
+
+    async def play(index, game_id, market, make_jobs):
+        async with semaphore:
+            try:
+                if game_seeds is not None:
+                    game_seed = game_seeds[index]
+                else:
+                    game_seed = None if seed is None else seed + index
+                async for event in run_game(market, make_jobs, policy, game_seed):
+                    await queue.put({"game": game_id, **event})
+            except Exception as e:
+                await queue.put({"game": game_id, "event": "error", "error": str(e)})
+            finally:
+                await queue.put(finished)
+
+    tasks = [asyncio.ensure_future(play(i, game_id, market, make_jobs))
+             for i, (game_id, market, make_jobs) in enumerate(games)]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            event = await queue.get()
+            if event is finished:
+                remaining -= 1
+                continue
+            yield event
+    finally:
+        # 소비자가 스트림을 끊으면 남은 게임도 중단
+        for task in tasks:
+            task.cancel()
+
+
+def matchup_config(players: list, template: dict = None) -> dict:
+    """[(회사 이름, 페르소나)] 한 대진을 create_simulation 설정(dict)으로 만듭니다."""
+    template = template or {}
+    size = len(players)
+    companies = [{
+        "name": name,
+        "persona": persona,
+        "initial_unit_cost": template.get("initial_unit_cost", 100),
+        "initial_market_share": template.get("initial_market_share", 0.8 / size),
+        "initial_product_quality": template.get("initial_product_quality", 50.0),
+        "initial_brand_awareness": template.get("initial_brand_awareness", 50.0),
+        "agent_backend": template.get("agent_backend"),
+    } for name, persona in players]
+    return {**{k: v for k, v in template.items() if not k.startswith("initial_") and k != "agent_backend"},
+            "companies": companies}
+
+
+def persona_matchups(personas: list, size: int = 2, template: dict = None) -> list:
+    """페르소나 목록의 모든 size인 조합을 create_simulation 설정(dict)으로 만듭니다."""
+    return [matchup_config([(f"P{i}", personas[i]) for i in combo], template)
+            for combo in itertools.combinations(range(len(personas)), size)]
+
+
+async def _main_async(args, games: list):
+    import api_main
+
+    requests = api_main.AutoplayRequest(games=games, policy=args.policy, seed=args.seed,
+                                        max_concurrent_games=args.concurrency)
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    wins = {}
+    try:
+        async for event in api_main.autoplay_events(requests):
+            line = json.dumps(event, ensure_ascii=False, default=float)
+            if out:
+                out.write(line + "\n")
+                out.flush()
+            if event["event"] == "game_done":
+                wins[event["winner"]] = wins.get(event["winner"], 0) + 1
+                print(f"🏁 [Autoplay] game {event['game']} winner={event['winner']}")
+            elif event["event"] == "error":
+                print(f"!!! [Autoplay] game {event['game']} error: {event['error']}")
+    finally:
+        if out:
+            out.close()
+    return wins
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="헤드리스 자동 진행 (여러 게임 동시 실행)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--games", help="SimulationConfig dict 목록 JSON")
+    source.add_argument("--personas", help="페르소나 문자열 목록 JSON (모든 조합으로 대진 생성)")
+    parser.add_argument("--size", type=int, default=2, help="--personas 사용 시 게임당 회사 수")
+    parser.add_argument("--template", help="--personas 사용 시 공통 설정 JSON (total_turns, market_size, agent_backend ...)")
+    parser.add_argument("--policy", choices=AUTOPLAY_POLICIES, default="top")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=16, help="동시에 진행할 게임 수")
+    parser.add_argument("--output", help="이벤트를 NDJSON으로 저장할 경로")
+    args = parser.parse_args(argv)
+
+    if args.games:
+        with open(args.games, "r", encoding="utf-8") as f:
+            games = json.load(f)
+    else:
+        with open(args.personas, "r", encoding="utf-8") as f:
+            personas = json.load(f)
+        template = {}
+        if args.template:
+            with open(args.template, "r", encoding="utf-8") as f:
+                template = json.load(f)
+        games = persona_matchups(personas, args.size, template)
+
+    print(f"=== 🎮 [Autoplay] {len(games)} games, policy={args.policy}, concurrency={args.concurrency} ===")
+    wins = asyncio.run(_main_async(args, games))
+    print(f"=== 🏆 wins: {wins} ===")
+    return wins
+
+
+if __name__ == "__main__":
+    main()
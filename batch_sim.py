@@ -0,0 +1,329 @@
+# batch_sim.py
+"""
+MarketSimulator의 배열 기반 배치 fork.
+
+BatchMarket은 현재 시뮬레이터 상태를 [행, 회사] 배열로 한 번만 옮겨 담고(deepcopy/처음부터 재생 없음),
+행마다 다른 결정으로 process_turn과 같은 계산(더미 결정, 인플레이션/GDP, 이벤트, 감쇠, 파산, R&D/브랜드,
+로짓 점유율, 이익, 예산 갱신)을 한 번의 행렬 연산으로 진행합니다. 실제 시뮬레이터 상태는 건드리지 않습니다.
+
+project_choices는 get_choices 결과의 모든 선택지(에이전트 간 조합 포함)를 k턴 앞까지 배치로 진행해
+선택지마다 예상 점유율/이익/누적 이익 변화를 'lookahead'로 붙입니다.
+demand_curve는 한 회사의 가격/판촉비/브랜드비 격자를 다음 턴 한 step으로 평가합니다. (what-if 수요 곡선)
+"""
+
+import copy
+import itertools
+import os
+
+import numpy as np
+
+from best_response import LogitModel, newton_prices
+from speculation import DECISION_FIELDS
+
+LOOKAHEAD_MAX_COMBINATIONS = int(os.getenv("LOOKAHEAD_MAX_COMBINATIONS", "512"))
+
+
+class BatchMarket:
+    """
+    market의 현재 상태를 batch_size개 행으로 복제한 가벼운 fork.
+    step(decisions)의 decisions는 [행, AI 회사, DECISION_FIELDS] 배열입니다.
+    """
+
+    def __init__(self, market, batch_size: int):
+        self.config = market.config
+        self.ai_names = list(market.ai_company_names)
+        self.names = list(market.all_company_names)
+        self.n_ai = len(self.ai_names)
+        self.batch_size = batch_size
+        self.turn = market.turn
+        self.market_size = float(market.config.get("market_size", 10000))
+        self.model = LogitModel(market.config)
+        self.model.comp = np.array([self.model.others_comp if n == "Others" else 1.0 for n in self.names])
+        self.others = np.array([n in market.dummy_company_names for n in self.names])
+
+        def column(field, default=0.0):
+            row = np.array([float(market.companies[n].get(field, default)) for n in self.names])
+            return np.tile(row, (batch_size, 1))
+
+        self.quality = column("product_quality", 50.0)
+        self.brand = column("brand_awareness", 50.0)
+        self.unit_cost = column("unit_cost", 100.0)
+        self.accumulated_profit = column("accumulated_profit")
+        self.market_share = column("market_share")
+        self.max_marketing_budget = column("max_marketing_budget")
+        self.max_rd_budget = column("max_rd_budget")
+        self.rd_innovation_point = column("accumulated_rd_innovation_point")
+        self.rd_efficiency_point = column("accumulated_rd_efficiency_point")
+
+        # 더미 가격의 기준이 되는 지난 턴 AI 가격 (기록이 없으면 None)
+        self.last_ai_prices = None
+        if market.history:
+            last = market.history[-1]
+            self.last_ai_prices = np.tile([float(last.get(f"{n}_price", 0)) for n in self.ai_names], (batch_size, 1))
+
+        # 이벤트: (대상 마스크, 효과, 값, 적용 시작 step, 지속 턴). 대기 중인 이벤트는 다음 step부터 적용
+        self.events = []
+        for start, queue in ((0, market.active_effects), (1, market.pending_event_queue)):
+            for e in queue:
+                self.add_event(e, start)
+        self.steps = 0
+
+    def add_event(self, event, start: int):
+        """start번째 step(0부터)부터 event.duration 턴 동안 적용할 이벤트를 추가합니다."""
+        mask = np.array([event.target_company in ("All", n) for n in self.names])
+        self.events.append((mask, event.effect_type, event.impact_value, start, event.duration))
+
+    ARRAY_FIELDS = ("quality", "brand", "unit_cost", "accumulated_profit", "market_share", "max_marketing_budget",
+                    "max_rd_budget", "rd_innovation_point", "rd_efficiency_point", "last_ai_prices")
+
+    def take(self, rows) -> "BatchMarket":
+        """rows 행만 골라(중복 가능) 만든 새 fork. 설정/이벤트는 공유하고 상태 배열만 복사합니다."""
+        rows = np.asarray(rows)
+        fork = copy.copy(self)
+        for field in self.ARRAY_FIELDS:
+            values = getattr(self, field)
+            setattr(fork, field, None if values is None else values[rows])
+        fork.batch_size = len(rows)
+        return fork
+
+    def _dummy_prices(self) -> np.ndarray:
+        """MarketSimulator._get_dummy_decisions의 가격 (지난 AI 평균가의 95%)"""
+        avg_cost = self.unit_cost[:, :self.n_ai].mean(axis=1)
+        estimated = avg_cost * 1.2
+        if self.last_ai_prices is not None:
+            positive = self.last_ai_prices > 0
+            count = positive.sum(axis=1)
+            mean = np.where(positive, self.last_ai_prices, 0).sum(axis=1) / np.maximum(count, 1)
+            estimated = np.where(count > 0, mean, estimated)
+        return estimated * 0.95
+
+    def _apply_events(self):
+        for mask, effect, value, start, duration in self.events:
+            if not start <= self.steps < start + duration:
+                continue
+            if effect == "unit_cost_multiplier":
+                self.unit_cost = np.where(mask, self.unit_cost * value, self.unit_cost)
+            elif effect == "quality_shock":
+                self.quality = np.where(mask, np.maximum(0, self.quality + value), self.quality)
+            elif effect == "brand_shock":
+                self.brand = np.where(mask, np.maximum(0, self.brand + value), self.brand)
+
+    def step(self, decisions: np.ndarray) -> dict:
+        """한 턴 진행. 반환: 회사별 [행, 회사] 배열 (market_share, profit, price)"""
+        config = self.config
+        b, a = self.batch_size, self.n_ai
+        d = {field: decisions[:, :, i].astype(float) for i, field in enumerate(DECISION_FIELDS)}
+        dummy_price = self._dummy_prices()
+        dummy_budget = self.max_marketing_budget[:, a:]
+
+        self.turn += 1
+        self.market_size *= 1 + config.get("gdp_growth_rate", 0.0)
+        self.unit_cost = self.unit_cost * (1 + config.get("inflation_rate", 0.0))
+        self._apply_events()
+        self.steps += 1
+
+        self.quality = np.maximum(0, self.quality - config.get("quality_decay_rate", 0.05))
+        self.brand = np.maximum(0, self.brand - config.get("brand_decay_rate", 0.2))
+
+        limit = -(config.get("initial_capital", 0) * 0.5)
+        active = np.ones((b, len(self.names)), dtype=bool)
+        active[:, :a] = self.accumulated_profit[:, :a] >= limit
+        live = active[:, :a]
+
+        # R&D / 브랜드 (활성 AI 회사만)
+        inno = np.where(live, d["rd_innovation_spend"], 0.0)
+        self.rd_innovation_point[:, :a] += inno
+        hit = live & (self.rd_innovation_point[:, :a] >= config.get("rd_innovation_threshold", 50000))
+        self.quality[:, :a] += np.where(hit, config.get("rd_innovation_impact", 5.0), 0.0)
+        self.rd_innovation_point[:, :a] -= np.where(hit, config.get("rd_innovation_threshold", 50000), 0.0)
+
+        eff = np.where(live, d["rd_efficiency_spend"], 0.0)
+        self.rd_efficiency_point[:, :a] += eff
+        hit = live & (self.rd_efficiency_point[:, :a] >= config.get("rd_efficiency_threshold", 50000))
+        self.unit_cost[:, :a] *= np.where(hit, 1.0 - config.get("rd_efficiency_impact", 0.03), 1.0)
+        self.rd_efficiency_point[:, :a] -= np.where(hit, config.get("rd_efficiency_threshold", 50000), 0.0)
+
+        brand = self.brand[:, :a]
+        cost_per_point = self.model.mkt_base * self.model.mkt_mult ** (brand / 10)
+        points = d["marketing_brand_spend"] / np.maximum(cost_per_point, 1) * self.model.mkt_efficiency
+        self.quality[:, :a] = np.where(live, np.minimum(100, self.quality[:, :a]), self.quality[:, :a])
+        self.brand[:, :a] = np.where(live, np.minimum(100, brand + points), brand)
+
+        # 이번 턴 가격/판촉 (더미는 지난 AI 평균가 기반 또는 최적 대응)
+        prices = np.concatenate([d["price"], np.repeat(dummy_price[:, None], len(self.names) - a, axis=1)], axis=1)
+        promo = np.concatenate([d["marketing_promo_spend"], np.zeros((b, len(self.names) - a))], axis=1)
+        marketing = np.concatenate([d["marketing_brand_spend"] + d["marketing_promo_spend"], dummy_budget], axis=1)
+        rd = np.concatenate([d["rd_innovation_spend"] + d["rd_efficiency_spend"], np.zeros((b, len(self.names) - a))], axis=1)
+        if config.get("dummy_policy", "fixed") == "best_response":
+            prices, marketing = self._best_response_dummies(prices, promo, active, marketing)
+
+        # 로짓 점유율 (MarketSimulator._calculate_utility_scores와 같은 식)
+        count = active.sum(axis=1, keepdims=True)
+        avg = np.where(active, prices, 0).sum(axis=1, keepdims=True) / count
+        avg = np.where(avg == 0, 1, avg)
+        safe = np.where(prices <= 0, avg, prices)
+        effective = safe * np.maximum(0.9, 1.0 - promo / (self.model.mkt_base * 2000))
+        physics = config.get("physics", {}) or {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            price_score = np.where(effective > 0, np.log(avg / effective) * (physics.get("price_sensitivity", 50.0) / 5.0), 0.0)
+        utility = (self.quality / 10.0 * self.model.w_q + self.brand / 10.0 * self.model.w_b
+                   + price_score * physics.get("weight_price", 0.2))
+        utility = np.where(self.others, utility * self.model.others_comp, utility)
+        utility = np.where(active, utility, -np.inf)
+        share = LogitModel.shares(utility)
+
+        # 이익 (파산한 회사는 지출 0, 누적 이익은 AI만)
+        marketing = np.where(active, marketing, 0.0)
+        rd = np.where(active, rd, 0.0)
+        volume = self.market_size * share
+        profit = volume * prices - marketing - rd - volume * self.unit_cost
+        self.market_share = share
+        self.accumulated_profit[:, :a] += profit[:, :a]
+        self.last_ai_prices = prices[:, :a]
+
+        capital = self.accumulated_profit[:, :a]
+        budget = np.where(capital > 0, np.maximum(100, capital * 0.01), 100)
+        self.max_rd_budget[:, :a] = budget
+        self.max_marketing_budget[:, :a] = budget * 2
+        return {"market_share": share, "profit": profit, "price": prices}
+
+    def _best_response_dummies(self, prices, promo, active, marketing):
+        """simulator의 dummy_policy=best_response와 같은 계산 (활성 회사만, 행마다 Others 가격 최적화)"""
+        a = self.n_ai
+        prices, marketing = prices.copy(), marketing.copy()
+        for others in range(a, len(self.names)):
+            for mask in {tuple(row) for row in active}:
+                rows = np.all(active == np.array(mask), axis=1)
+                cols = np.flatnonzero(mask)
+                model = LogitModel(self.config)
+                model.comp = self.model.comp[cols]
+                model.base = (self.quality[rows][:, cols] / 10.0 * model.w_q + self.brand[rows][:, cols] / 10.0 * model.w_b)
+                model.cost = self.unit_cost[rows][:, cols]
+                model.promo_factor = model.promo_discount(promo[rows][:, cols])
+                model.market_size = self.market_size
+                grid = prices[rows][:, cols]
+                positive = grid > 0
+                fallback = np.where(positive, grid, 0).sum(axis=1, keepdims=True) / np.maximum(positive.sum(axis=1, keepdims=True), 1)
+                grid = np.where(positive, grid, np.where(positive.any(axis=1, keepdims=True), fallback, 1.0))
+                target = np.full(rows.sum(), int(np.flatnonzero(cols == others)[0]))
+                chosen = prices[rows]
+                chosen[:, others] = newton_prices(model, grid, target)
+                prices[rows] = chosen
+                spend = marketing[rows]
+                spend[:, others] = 0.0
+                marketing[rows] = spend
+        return prices, marketing
+
+
+def _held_decision(market, name: str) -> list:
+    """선택지가 없는 AI 회사는 지난 턴 결정을 유지한다고 가정 (기록이 없으면 원가의 1.2배, 지출 0)"""
+    last = market.history[-1] if market.history else {}
+    decision = [float(last.get(f"{name}_{field}", 0) or 0) for field in DECISION_FIELDS]
+    if decision[0] <= 0:
+        decision[0] = market.companies[name]["unit_cost"] * 1.2
+    return decision
+
+
+def _probabilities(options: list) -> np.ndarray:
+    p = np.array([max(0.0, float(o.get("probability", 0) or 0)) for o in options])
+    return p / p.sum() if p.sum() > 0 else np.full(len(options), 1.0 / len(options))
+
+
+def project_choices(market, choices: dict, turns: int = 3, max_combinations: int = None) -> dict:
+    """
+    choices({회사: 선택지 배열})의 선택지마다 'lookahead'를 붙인 새 dict를 돌려줍니다.
+    선택지 조합 수가 max_combinations 이하이면 모든 조합을, 넘으면 다른 회사는 확률 최대 선택지로 고정한 행만
+    BatchMarket 한 개로 turns턴 진행합니다. 선택한 결정은 그 기간 동안 매 턴 유지한다고 가정합니다.
+
+    lookahead는 다른 회사 선택지의 확률로 가중한 기대값입니다.
+        market_share / market_share_delta: turns턴 뒤 점유율과 현재 대비 변화
+        profit: 다음 턴 이익,  accumulated_profit_delta: turns턴 동안의 이익 합
+    """
+    max_combinations = LOOKAHEAD_MAX_COMBINATIONS if max_combinations is None else max_combinations
+    turns = min(turns, market.config.get("total_turns", 30) - market.turn)
+    agents = [n for n in market.ai_company_names if choices.get(n)]
+    if turns <= 0 or not agents:
+        return choices
+
+    options = [choices[n] for n in agents]
+    probs = [_probabilities(o) for o in options]
+    sizes = [len(o) for o in options]
+    if int(np.prod(sizes)) <= max_combinations:
+        rows = np.array(list(itertools.product(*(range(s) for s in sizes))))
+    else:
+        top = [int(np.argmax(p)) for p in probs]
+        rows = np.array([[j if k == i else top[k] for k in range(len(agents))]
+                         for i in range(len(agents)) for j in range(sizes[i])])
+
+    values = [[[float(o["decision"].get(field, 0) or 0) for field in DECISION_FIELDS] for o in opts] for opts in options]
+    decisions = np.array([[values[agents.index(n)][row[agents.index(n)]] if n in agents else _held_decision(market, n)
+                           for n in market.ai_company_names] for row in rows])
+
+    batch = BatchMarket(market, len(rows))
+    first_profit, total_profit = None, 0.0
+    for _ in range(turns):
+        out = batch.step(decisions)
+        total_profit = total_profit + out["profit"]
+        if first_profit is None:
+            first_profit = out["profit"]
+    final_share = batch.market_share
+
+    # 행 가중치: 회사 i 기준으로 다른 회사 선택지 확률의 곱
+    chosen = np.stack([probs[i][rows[:, i]] for i in range(len(agents))], axis=1)
+    result = dict(choices)
+    for i, name in enumerate(agents):
+        col = market.all_company_names.index(name)
+        current = market.companies[name]["market_share"]
+        weights = np.prod(np.delete(chosen, i, axis=1), axis=1) if len(agents) > 1 else np.ones(len(rows))
+        projected = []
+        for j, option in enumerate(options[i]):
+            mask = rows[:, i] == j
+            if not mask.any():
+                projected.append(option)
+                continue
+            w = weights[mask] if weights[mask].sum() > 0 else np.ones(mask.sum())
+            expect = lambda v: float(np.average(v[mask, col], weights=w))
+            share = expect(final_share)
+            projected.append({**option, "lookahead": {
+                "turns": turns,
+                "market_share": round(share, 4),
+                "market_share_delta": round(share - current, 4),
+                "profit": round(expect(first_profit), 2),
+                "accumulated_profit_delta": round(expect(total_profit), 2),
+            }})
+        result[name] = projected
+    return result
+
+
+def demand_curve(market, company: str, prices, promo_spends=(0.0,), brand_spends=(0.0,)) -> dict:
+    """
+    company의 다음 턴 (가격 x 판촉비 x 브랜드비) 격자를 한 번의 배치 step으로 평가합니다. (시장 상태는 그대로)
+    다른 회사와 company의 나머지 결정(R&D)은 지난 턴 값으로 유지합니다.
+    반환: 가격별로 이익이 가장 큰 지출 조합의 curve와 전체 격자의 이익 극대화 지점 best
+    """
+    prices = np.asarray(prices, dtype=float)
+    grid = np.array(list(itertools.product(prices, promo_spends, brand_spends)), dtype=float)
+    held = np.array([_held_decision(market, n) for n in market.ai_company_names])
+    decisions = np.repeat(held[None, :, :], len(grid), axis=0)
+    idx = market.ai_company_names.index(company)
+    decisions[:, idx, DECISION_FIELDS.index("price")] = grid[:, 0]
+    decisions[:, idx, DECISION_FIELDS.index("marketing_promo_spend")] = grid[:, 1]
+    decisions[:, idx, DECISION_FIELDS.index("marketing_brand_spend")] = grid[:, 2]
+
+    out = BatchMarket(market, len(grid)).step(decisions)
+    share, profit = out["market_share"][:, idx], out["profit"][:, idx]
+
+    per_price = profit.reshape(len(prices), -1)
+    best_in_price = per_price.argmax(axis=1) + np.arange(len(prices)) * per_price.shape[1]
+
+    def point(row):
+        return {"price": float(grid[row, 0]), "marketing_promo_spend": float(grid[row, 1]),
+                "marketing_brand_spend": float(grid[row, 2]), "market_share": float(share[row]), "profit": float(profit[row])}
+
+    return {
+        "company": company,
+        "turn": market.turn + 1,
+        "points": len(grid),
+        "curve": [point(row) for row in best_in_price],
+        "best": point(int(profit.argmax())),
+    }
@@ -0,0 +1,130 @@
+# benchmark_cache.py
+"""
+벤치마크 증분 재개(Incremental Resume) 캐시.
+
+실데이터 시나리오는 매주 새 분기(turn)가 뒤에 덧붙는 식으로 자랍니다.
+'턴 0부터 전부 다시 돌리기' 대신, (설정+파라미터)별로 이미 계산한 턴 접두사(prefix)의
+종료 시점 시뮬레이터 상태(턴별 오차가 담긴 history 포함)를 저장해 두고,
+turns_data가 늘어나면 가장 긴 캐시 접두사에서 이어서 실행합니다.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+
+# 시뮬레이터 물리 로직이 바뀌면 이 값을 올려서 예전 캐시를 무효화합니다.
+CACHE_VERSION = 1
+
+
+def _stable_dumps(obj) -> str:
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def params_key(config: dict, override_params: dict = None) -> str:
+    """
+    시나리오 설정(config)과 물리 파라미터 오버라이드를 합친 '유효 설정'의 해시.
+    physics는 오버라이드가 병합된 결과 기준으로 해시하므로, 같은 물리 조건이면 같은 키가 나옵니다.
+    """
+    cfg = dict(config or {})
+    override = dict(override_params or {})
+    cfg["physics"] = {**(cfg.get("physics") or {}), **override}
+    payload = {"version": CACHE_VERSION, "config": cfg, "override": override}
+    return hashlib.sha256(_stable_dumps(payload).encode("utf-8")).hexdigest()
+
+
+def prefix_hashes(turns_data: list) -> list:
+    """
+    turns_data의 각 접두사(1턴, 2턴, ...)에 대한 체인 해시 목록.
+    hashes[i]는 turns_data[:i+1] 전체를 대표합니다.
+    """
+    hashes = []
+    running = hashlib.sha256()
+    for turn_data in turns_data:
+        running.update(_stable_dumps(turn_data).encode("utf-8"))
+        hashes.append(running.copy().hexdigest())
+    return hashes
+
+
+class BenchmarkPrefixCache:
+    """
+    (params_key, prefix_hash) -> 해당 접두사까지 실행을 마친 MarketSimulator.
+    메모리에서는 LRU로 개수를 제한하고, cache_dir가 주어지면 pickle로 디스크에도 남깁니다.
+    """
+
+    def __init__(self, max_entries: int = 2048, cache_dir: str = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.resumed_turns = 0
+
+    def _disk_path(self, key: str, prefix_hash: str) -> str:
+        return os.path.join(self.cache_dir, key[:16], f"{prefix_hash}.pkl")
+
+    def _load(self, key: str, prefix_hash: str):
+        entry = self._entries.get((key, prefix_hash))
+        if entry is not None:
+            self._entries.move_to_end((key, prefix_hash))
+            return entry
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key, prefix_hash)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️ [BenchmarkCache] 손상된 캐시 파일 무시: {path} ({e})")
+            return None
+        self._remember(key, prefix_hash, entry)
+        return entry
+
+    def _remember(self, key: str, prefix_hash: str, entry):
+        self._entries[(key, prefix_hash)] = entry
+        self._entries.move_to_end((key, prefix_hash))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, key: str, hashes: list):
+        """
+        가장 긴 캐시 접두사를 찾아 (재사용한 턴 수, 복제된 시뮬레이터)를 반환합니다.
+        캐시가 없으면 (0, None).
+        """
+        for n in range(len(hashes), 0, -1):
+            market = self._load(key, hashes[n - 1])
+            if market is not None:
+                self.hits += 1
+                self.resumed_turns += n
+                # 캐시 원본이 이어지는 실행에 오염되지 않도록 복제본을 넘깁니다.
+                return n, copy.deepcopy(market)
+        self.misses += 1
+        return 0, None
+
+    def reserve(self, entries: int):
+        """최소 entries개를 메모리에 둘 수 있게 LRU 한도를 늘립니다. (auto_tune 그리드가 한 바퀴 도는 동안 밀려나지 않게)"""
+        self.max_entries = max(self.max_entries, entries)
+
+    def store(self, key: str, prefix_hash: str, market):
+        snapshot = copy.deepcopy(market)
+        self._remember(key, prefix_hash, snapshot)
+        if self.cache_dir:
+            path = self._disk_path(key, prefix_hash)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "resumed_turns": self.resumed_turns,
+            "cache_dir": self.cache_dir,
+        }
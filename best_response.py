@@ -0,0 +1,254 @@
+# best_response.py
+"""
+로짓 점유율 모델(MarketSimulator._calculate_utility_scores)에 대한 해석적 최적 대응(best response).
+
+효용  u_i = c_i * (w_q*q_i/10 + w_b*b_i/10 + k*log(avg_price / (p_i*f_i))),  k = w_p*sensitivity/5
+점유율 s_i = softmax(u)_i,  이번 턴 이익 π_i = M*s_i*(p_i - m_i) - 지출
+(c_i: Others의 경쟁력 배수, f_i: 판촉 할인 계수, avg_price: 이번 턴 전체 가격 평균)
+
+x = log p 에 대한 이익의 기울기는 닫힌 형태로 계산하고, 2계 도함수는 그 기울기의 차분으로 구해
+대상 회사 전체를 행렬 한 번으로 몇 번의 뉴턴 스텝만에 갱신합니다. (다른 회사 가격은 고정, Jacobi 방식)
+
+- 시뮬레이터: config["dummy_policy"] = "best_response"이면 Others가 이번 턴 AI 결정에 최적 대응
+- BestResponseAgent: 어느 회사에나 붙일 수 있는 LLM 없는 기준(baseline) 에이전트 (agent_backend="best_response")
+"""
+
+import math
+
+import numpy as np
+
+DUMMY_POLICIES = ("fixed", "best_response")
+BR_NEWTON_STEPS = 6
+BR_MAX_MARKUP = 3.0
+BR_MIN_MARKUP = 1.01
+_FD_STEP = 1e-4
+
+
+def _physics(config: dict):
+    physics = config.get("physics", {}) or {}
+    k = physics.get("weight_price", 0.2) * physics.get("price_sensitivity", 50.0) / 5.0
+    return physics.get("weight_quality", 0.4), physics.get("weight_brand", 0.4), k, \
+        physics.get("others_overall_competitiveness", 1.0)
+
+
+class LogitModel:
+    """
+    decisions에 있는 회사들의 이번 턴 점유율/이익을 배열로 계산하는 모델.
+    base/cost/promo_factor는 [회사] 또는 [행, 회사] 배열이며, 행마다 다른 상태(배치 fork)를 담을 수 있습니다.
+    """
+
+    def __init__(self, config: dict, companies: dict = None, decisions: dict = None):
+        w_q, w_b, self.k, self.others_comp = _physics(config)
+        self.w_q, self.w_b = w_q, w_b
+        self.market_size = config.get("market_size", 10000)
+        self.mkt_base = config.get("marketing_cost_base", 1000) or 1000
+        self.mkt_mult = config.get("marketing_cost_multiplier", 1.12)
+        self.mkt_efficiency = (config.get("physics", {}) or {}).get("marketing_efficiency", 1.0)
+        if decisions is None:
+            return
+
+        self.names = list(decisions)
+        comps = [companies[n] for n in self.names]
+        self.quality = np.array([c.get("product_quality", 50.0) for c in comps])
+        self.brand = np.array([c.get("brand_awareness", 50.0) for c in comps])
+        self.cost = np.array([c.get("unit_cost", 100.0) for c in comps], dtype=float)
+        self.base = self.quality / 10.0 * w_q + self.brand / 10.0 * w_b
+        self.comp = np.array([self.others_comp if n == "Others" else 1.0 for n in self.names])
+
+        prices = np.array([float(decisions[n].get("price", 0) or 0) for n in self.names])
+        fallback = prices[prices > 0].mean() if (prices > 0).any() else 1.0
+        self.prices = np.where(prices > 0, prices, fallback)
+        promo = np.array([float(decisions[n].get("marketing_promo_spend", 0) or 0) for n in self.names])
+        self.promo_factor = self.promo_discount(promo)
+
+    def promo_discount(self, promo):
+        return np.maximum(0.9, 1.0 - promo / (self.mkt_base * 2000))
+
+    def utilities(self, prices: np.ndarray, base: np.ndarray = None) -> np.ndarray:
+        """prices: [행, 회사]. 행마다 독립된 가격 시나리오의 효용."""
+        base = self.base if base is None else base
+        avg = np.maximum(prices.mean(axis=-1, keepdims=True), 1e-9)
+        return self.comp * (base + self.k * np.log(avg / (prices * self.promo_factor)))
+
+    @staticmethod
+    def shares(utilities: np.ndarray) -> np.ndarray:
+        z = np.exp(utilities - utilities.max(axis=-1, keepdims=True))
+        return z / z.sum(axis=-1, keepdims=True)
+
+    def _pick(self, values, rows, targets):
+        values = np.asarray(values)
+        return values[rows, targets] if values.ndim == 2 else values[targets]
+
+    def price_gradient(self, prices: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """행 r의 대상 회사 targets[r]에 대한 dπ/dlog(p) (닫힌 형태)."""
+        rows = np.arange(len(targets))
+        s = self.shares(self.utilities(prices))
+        n = prices.shape[-1]
+        p = prices[rows, targets]
+        avg = prices.mean(axis=-1)
+        s_i, c_i = s[rows, targets], self.comp[targets]
+        # d log s_i / d log p_i = c_i k (s_i - 1) + k p_i/(N avg) (c_i - Σ_j s_j c_j)
+        dlog_s = c_i * self.k * (s_i - 1.0) + self.k * p / (n * avg) * (c_i - (s * self.comp).sum(axis=-1))
+        return self.market_size * s_i * (p + (p - self._pick(self.cost, rows, targets)) * dlog_s)
+
+
+def newton_prices(model: LogitModel, prices: np.ndarray, targets: np.ndarray, steps: int = BR_NEWTON_STEPS,
+                  max_markup: float = BR_MAX_MARKUP) -> np.ndarray:
+    """
+    prices: [행, 회사]. 행 r에서 targets[r] 회사의 가격만 움직여 이익을 극대화한 가격 [행].
+    모든 행을 한 번의 행렬 계산으로 동시에 뉴턴 갱신합니다.
+    """
+    rows = np.arange(len(targets))
+    cost = model._pick(model.cost, rows, targets)
+    lo = np.log(cost * BR_MIN_MARKUP)
+    hi = np.log(cost * max_markup)
+    prices = prices.copy()
+    x = np.clip(np.log(prices[rows, targets]), lo, hi)
+
+    for _ in range(steps):
+        prices[rows, targets] = np.exp(x)
+        g0 = model.price_gradient(prices, targets)
+        prices[rows, targets] *= math.exp(_FD_STEP)
+        g1 = model.price_gradient(prices, targets)
+        h = (g1 - g0) / _FD_STEP
+        # 오목한 구간이면 뉴턴 스텝, 아니면 기울기 방향으로 최대 보폭 (비탄력적이면 상한까지 빠르게 이동)
+        step = np.where(h < 0, -g0 / np.where(h < 0, h, -1.0), 0.5 * np.sign(g0))
+        x = np.clip(x + np.clip(step, -0.5, 0.5), lo, hi)
+    return np.exp(x)
+
+
+def best_response_prices(model: LogitModel, targets: list, steps: int = BR_NEWTON_STEPS,
+                         max_markup: float = BR_MAX_MARKUP) -> np.ndarray:
+    """대상 회사들의 이익 극대화 가격. 대상마다 다른 회사 가격은 현재 결정으로 고정합니다 (동시 최적 대응)."""
+    idx = np.array([model.names.index(t) for t in targets])
+    grid = np.tile(model.prices, (len(idx), 1))       # 행 r: 대상 r만 움직이는 시나리오
+    return newton_prices(model, grid, idx, steps, max_markup)
+
+
+def best_response_brand_spend(model: LogitModel, targets: list, budgets: np.ndarray, steps: int = BR_NEWTON_STEPS) -> np.ndarray:
+    """
+    브랜드 마케팅 지출 S에 대한 이번 턴 이익 극대화 (브랜드 갱신은 점유율 계산 전에 적용됨).
+    u_i(S) = u_i + a_i*S,  dπ/dS = M(p-m) s(1-s) a - 1,  d²π/dS² = M(p-m) a² s(1-s)(1-2s)
+    """
+    idx = np.array([model.names.index(t) for t in targets])
+    cost_per_point = np.maximum(model.mkt_base * model.mkt_mult ** (model.brand[idx] / 10.0), 1.0)
+    a = model.comp[idx] * model.w_b / 10.0 * model.mkt_efficiency / cost_per_point
+    cap = np.minimum(budgets, np.maximum(0.0, 100.0 - model.brand[idx]) * cost_per_point / model.mkt_efficiency)
+    u = model.utilities(model.prices[None, :])[0]
+    z = np.exp(u - u.max())
+    others = z.sum() - z[idx]                       # 대상별 나머지 회사의 exp 합
+    margin = model.market_size * (model.prices[idx] - model.cost[idx])
+
+    spend = np.zeros(len(idx))
+    for _ in range(steps):
+        mine = z[idx] * np.exp(np.minimum(a * spend, 50.0))
+        s = mine / (mine + others)
+        g = margin * s * (1 - s) * a - 1.0
+        h = margin * a * a * s * (1 - s) * (1 - 2 * s)
+        step = np.where(h < 0, -g / np.where(h < 0, h, -1.0), np.where(g > 0, cap, -spend))
+        spend = np.clip(spend + step, 0.0, cap)
+    return np.where(margin > 0, spend, 0.0)
+
+
+def best_response_decisions(config: dict, companies: dict, decisions: dict, targets: list,
+                            brand_budgets: dict = None) -> dict:
+    """
+    targets 회사의 최적 대응 결정. brand_budgets가 주어진 회사만 브랜드 지출도 최적화합니다.
+    (Others는 시뮬레이터에서 브랜드 갱신을 받지 않으므로 가격만 조정)
+    """
+    model = LogitModel(config, companies, decisions)
+    prices = best_response_prices(model, targets)
+    for target, price in zip(targets, prices):
+        model.prices[model.names.index(target)] = price
+
+    spend = np.zeros(len(targets))
+    budgeted = [t for t in targets if brand_budgets and t in brand_budgets]
+    if budgeted:
+        spent = best_response_brand_spend(model, budgeted, np.array([brand_budgets[t] for t in budgeted], dtype=float))
+        for t, s in zip(budgeted, spent):
+            spend[targets.index(t)] = s
+
+    return {
+        target: {
+            "price": float(price),
+            "marketing_brand_spend": float(s),
+            "marketing_promo_spend": 0,
+            "rd_innovation_spend": 0,
+            "rd_efficiency_spend": 0,
+        }
+        for target, price, s in zip(targets, prices, spend)
+    }
+
+
+class BestResponseAgent:
+    """
+    LLM 없는 기준(baseline) 에이전트. decide_action 계약은 AIAgent와 같습니다.
+    상대 AI는 지난 턴 가격을 유지하고 Others는 지난 AI 평균가의 95%로 가정한 뒤 가격/브랜드 지출을 최적화하고,
+    R&D는 남은 턴 동안의 회수액이 임계값보다 클 때만 투자합니다.
+    """
+
+    def __init__(self, name: str, persona: str = "", sim_id: str = None):
+        self.name = name
+        self.persona = persona
+        self.sim_id = sim_id
+        self.backend = "best_response"
+        self.use_mock = False
+
+    def _expected_decisions(self, market_state: dict) -> dict:
+        companies = market_state["companies"]
+        last = market_state.get("last_turn_results") or {}
+        ai_names = [n for n in companies if n != "Others"]
+        expected = {}
+        for n in ai_names:
+            price = last.get(f"{n}_price") or companies[n].get("unit_cost", 100.0) * 1.2
+            expected[n] = {"price": price, "marketing_promo_spend": last.get(f"{n}_marketing_promo_spend", 0)}
+        if "Others" in companies:
+            ai_avg = sum(d["price"] for d in expected.values()) / max(1, len(expected))
+            expected["Others"] = {"price": ai_avg * 0.95}
+        return expected
+
+    def _rd_plan(self, market_state: dict, decision: dict, share: float) -> dict:
+        config = market_state.get("config", {})
+        me = market_state["companies"][self.name]
+        remaining = max(0, config.get("total_turns", 30) - market_state.get("turn", 0))
+        budget = me.get("max_rd_budget", 0)
+        volume = config.get("market_size", 10000) * share
+        margin = decision["price"] - me.get("unit_cost", 100.0)
+        w_q, _, _, _ = _physics(config)
+
+        plans = {}
+        eff_threshold = config.get("rd_efficiency_threshold", 50000)
+        eff_gap = max(0.0, eff_threshold - me.get("accumulated_rd_efficiency_point", 0.0))
+        eff_turns = math.ceil(eff_gap / budget) if budget > 0 else remaining + 1
+        savings = config.get("rd_efficiency_impact", 0.03) * me.get("unit_cost", 100.0) * volume * (remaining - eff_turns)
+        if eff_turns < remaining and savings > eff_gap:
+            plans["rd_efficiency_spend"] = min(budget, eff_gap)
+
+        inno_threshold = config.get("rd_innovation_threshold", 50000)
+        inno_gap = max(0.0, inno_threshold - me.get("accumulated_rd_innovation_point", 0.0))
+        inno_turns = math.ceil(inno_gap / budget) if budget > 0 else remaining + 1
+        gain = volume * margin * (1 - share) * w_q * config.get("rd_innovation_impact", 5.0) / 10.0 * (remaining - inno_turns)
+        left = budget - plans.get("rd_efficiency_spend", 0)
+        if inno_turns < remaining and gain > inno_gap and left > 0:
+            plans["rd_innovation_spend"] = min(left, inno_gap)
+        return plans
+
+    async def decide_action(self, market_state: dict, deadline: float = None, projection=None,
+                            deferred=None) -> list:
+        config = market_state.get("config", {})
+        companies = market_state["companies"]
+        me = companies[self.name]
+        decisions = self._expected_decisions(market_state)
+        best = best_response_decisions(config, companies, decisions, [self.name],
+                                       brand_budgets={self.name: me.get("max_marketing_budget", 0)})[self.name]
+
+        decisions[self.name] = best
+        model = LogitModel(config, companies, decisions)
+        share = float(model.shares(model.utilities(model.prices[None, :]))[0][model.names.index(self.name)])
+        best.update(self._rd_plan(market_state, best, share))
+        decision = {k: int(v) for k, v in best.items()}
+        return [{
+            "reasoning": f"Best response: 예상 점유율 {share:.1%}에서 이번 턴 이익을 최대화하는 가격/마케팅",
+            "probability": 1.0,
+            "decision": decision,
+        }]
@@ -0,0 +1,136 @@
+# choice_flight.py
+"""
+get_choices 단일 비행(single-flight) 병합과 시뮬레이션별 직렬화.
+
+탭 두 개나 더블클릭으로 같은 시뮬레이션에 get_choices가 동시에 들어오면 같은 턴의 LLM 호출이 중복됩니다.
+    - (시뮬레이션, 턴)마다 선택지 계산은 하나만 돌고, 동시에 들어온 요청은 그 계산을 함께 기다립니다 (joined)
+    - 끝난 결과는 턴이 넘어갈 때까지 보관해 같은 턴의 재요청에 그대로 돌려줍니다 (cached)
+    - 이벤트 주입/페르소나 변경이 있으면 보관한 결과를 버립니다 (invalidated)
+    - 기다리는 요청이 모두 끊기거나, 계산이 끝나기 전에 그 턴이 실행되면 진행 중인 계산도 취소합니다 (cancelled)
+
+시장 상태를 바꾸는 작업(execute_turn, 자동 진행)과 선택지 계산 시작은 sim_lock으로 시뮬레이션마다 직렬화합니다.
+"""
+
+import asyncio
+import contextlib
+
+
+def sim_lock(sim_data: dict) -> asyncio.Lock:
+    """시뮬레이션별 asyncio.Lock (처음 쓸 때 생성)"""
+    lock = sim_data.get("lock")
+    if lock is None:
+        lock = sim_data["lock"] = asyncio.Lock()
+    return lock
+
+
+class StaleChoices(Exception):
+    """기다리던 선택지 계산이 그 턴이 이미 실행되어 취소됨"""
+
+
+class ChoiceFlight:
+    def __init__(self, turn: int, agent_tasks: dict, result: asyncio.Future):
+        self.turn = turn                # 선택지를 계산한 턴 (market.turn)
+        self.agent_tasks = agent_tasks  # {회사: 에이전트별 decide_action task} (스트림이 도착 순서대로 사용)
+        self.result = result            # get_choices 응답과 같은 형태의 전체 결과
+        self.waiters = 0
+
+    def tasks(self) -> list:
+        return [*self.agent_tasks.values(), self.result]
+
+    def stale(self) -> StaleChoices:
+        return StaleChoices(f"Stale turn: turn {self.turn} was executed before its choices were ready")
+
+
+class ChoiceCoalescer:
+    def __init__(self):
+        self.started = 0
+        self.joined = 0
+        self.cached = 0
+        self.invalidated = 0
+        self.cancelled = 0
+
+    def get(self, sim_data: dict, make_jobs, finish) -> ChoiceFlight:
+        """
+        현재 턴의 선택지 계산을 돌려줍니다. 같은 턴의 계산이 이미 있으면 그것을 공유하고, 없으면 시작합니다.
+        make_jobs() -> (market, [(agent, coroutine)]), finish(market, {회사: 선택지}) -> 최종 결과
+        """
+        market = sim_data["market"]
+        flight = sim_data.get("choice_flight")
+        if flight is not None and flight.turn == market.turn and not flight.result.cancelled():
+            if flight.result.done():
+                self.cached += 1
+            else:
+                self.joined += 1
+                print(f"🤝 [Choices] 턴 {flight.turn} 진행 중인 선택지 계산에 합류")
+            return flight
+
+        market, jobs = make_jobs()
+        agent_tasks = {agent.name: asyncio.ensure_future(job) for agent, job in jobs}
+
+        async def run():
+            results = await asyncio.gather(*agent_tasks.values())
+            return finish(market, dict(zip(agent_tasks, results)))
+
+        flight = ChoiceFlight(market.turn, agent_tasks, asyncio.ensure_future(run()))
+
+        def _done(t):
+            if t.cancelled() or t.exception() is not None:
+                # 실패한 계산은 보관하지 않음 -> 다음 요청이 다시 시작
+                if sim_data.get("choice_flight") is flight:
+                    sim_data["choice_flight"] = None
+
+        flight.result.add_done_callback(_done)
+        sim_data["choice_flight"] = flight
+        self.started += 1
+        return flight
+
+    @contextlib.contextmanager
+    def waiting(self, flight: ChoiceFlight):
+        """요청 하나가 flight를 기다리는 구간. 마지막 대기자가 끊기면 끝나지 않은 계산을 취소합니다."""
+        flight.waiters += 1
+        try:
+            yield flight
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.result.done():
+                for task in flight.tasks():
+                    task.cancel()
+                self.cancelled += 1
+
+    async def wait(self, flight: ChoiceFlight):
+        with self.waiting(flight):
+            # 한 요청이 취소되어도 공유 계산은 다른 대기자를 위해 계속 진행 (asyncio.wait는 대상을 취소하지 않음)
+            await asyncio.wait([flight.result])
+            if flight.result.cancelled():
+                raise flight.stale()
+            return flight.result.result()
+
+    def discard(self, sim_data: dict, cancel: bool = False):
+        """
+        상태가 바뀌어 보관한 선택지가 더 이상 맞지 않을 때 호출 (진행 중이면 기존 대기자는 그대로 받음)
+        cancel=True는 턴이 실행되었을 때: 아직 진행 중인 계산은 취소하고 대기자는 StaleChoices를 받음
+        """
+        flight = sim_data.get("choice_flight")
+        if flight is None:
+            return
+        sim_data["choice_flight"] = None
+        if not cancel:
+            self.invalidated += 1
+        elif not flight.result.done():
+            for task in flight.tasks():
+                task.cancel()
+            self.cancelled += 1
+
+    def stats(self) -> dict:
+        requests = self.started + self.joined + self.cached
+        return {
+            "started": self.started,
+            "joined": self.joined,
+            "cached": self.cached,
+            "invalidated": self.invalidated,
+            "cancelled": self.cancelled,
+            "dedup_rate": (self.joined + self.cached) / requests if requests else 0.0,
+        }
+
+
+CHOICE_FLIGHTS = ChoiceCoalescer()
@@ -0,0 +1,267 @@
+# decision_schema.py
+"""
+에이전트 결정 응답(선택지 배열)의 pydantic 스키마와 빠른 검증/복구.
+
+- Gemini 호출에는 response_mime_type="application/json" + response_schema=CHOICES_SCHEMA를 넘겨
+  모델이 처음부터 스키마에 맞는 순수 JSON을 내도록 합니다.
+- 파싱은 json.loads + 스키마 검증 한 번이 기본 경로입니다.
+- 실패하면 다시 묻지 않고 로컬에서 흔한 실수만 고칩니다:
+  코드 블록/앞뒤 설명 텍스트, 끝의 쉼표, 잘린 닫는 괄호, {"choices": [...]} 같은 감싸기,
+  "1,200,000" 같은 문자열 숫자, 음수 지출, 합이 1이 아닌 확률, 구버전 키(marketing_spend, rd_spend).
+- DECISION_STATS에 직접 성공/복구/실패 수, 파싱 시간, Fallback 비율을 모읍니다. (/admin/decision_stats)
+"""
+
+import json
+import re
+import threading
+import time
+
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator, model_validator
+
+import llm_trace
+from llm_pool import LatencyStats
+
+SPEND_FIELDS = ("marketing_brand_spend", "marketing_promo_spend", "rd_innovation_spend", "rd_efficiency_spend")
+LEGACY_KEYS = {"marketing_spend": "marketing_brand_spend", "rd_spend": "rd_innovation_spend"}
+
+_FENCE_RE = re.compile(r"```(?:json)?(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([\]}])")
+
+
+class DecisionParseError(ValueError):
+    """스키마 검증과 로컬 복구가 모두 실패한 응답."""
+
+
+def _to_number(value):
+    if isinstance(value, str):
+        cleaned = value.replace(",", "").replace("원", "").strip()
+        try:
+            return float(cleaned)
+        except ValueError:
+            return value
+    return value
+
+
+class DecisionModel(BaseModel):
+    price: int = Field(description="제품 가격 (정수, 원가보다 높게)")
+    marketing_brand_spend: int = Field(0, description="브랜드 마케팅 지출")
+    marketing_promo_spend: int = Field(0, description="판촉 마케팅 지출")
+    rd_innovation_spend: int = Field(0, description="혁신 R&D 지출")
+    rd_efficiency_spend: int = Field(0, description="효율 R&D 지출")
+
+    @model_validator(mode="before")
+    @classmethod
+    def _map_legacy_keys(cls, data):
+        if isinstance(data, dict):
+            data = dict(data)
+            for old, new in LEGACY_KEYS.items():
+                if old in data and new not in data:
+                    data[new] = data.pop(old)
+        return data
+
+    @field_validator("price", *SPEND_FIELDS, mode="before")
+    @classmethod
+    def _coerce_amount(cls, value):
+        value = _to_number(value)
+        if isinstance(value, float):
+            return max(0, int(round(value)))
+        if isinstance(value, int) and not isinstance(value, bool):
+            return max(0, value)
+        return value
+
+
+class ChoiceModel(BaseModel):
+    reasoning: str = Field("", description="전략적 근거")
+    probability: float = Field(1.0, description="이 선택지를 고를 확률 (합계 1.0)")
+    decision: DecisionModel
+
+    @field_validator("probability", mode="before")
+    @classmethod
+    def _coerce_probability(cls, value):
+        value = _to_number(value.rstrip("%")) if isinstance(value, str) else value
+        if isinstance(value, (int, float)) and value > 1.0:
+            value = value / 100.0  # "40" -> 0.4
+        return value
+
+
+# Gemini response_schema로 그대로 넘길 수 있는 타입
+CHOICES_SCHEMA = list[ChoiceModel]
+_choices_adapter = TypeAdapter(CHOICES_SCHEMA)
+
+
+class DecisionStats:
+    """파싱 경로(직접/복구/실패)별 횟수, 파싱 시간, 결정 대비 Fallback 비율."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parse_time = LatencyStats()
+        self.counts = {"direct": 0, "repaired": 0, "failed": 0}
+        self.decisions = 0
+        self.fallbacks = 0
+
+    def record_parse(self, outcome: str, seconds: float):
+        llm_trace.annotate(parse=outcome, parse_sec=seconds)
+        self._add_parse(outcome, seconds)
+
+    def _add_parse(self, outcome: str, seconds: float):
+        with self._lock:
+            self.counts[outcome] += 1
+            self.parse_time.add(seconds)
+
+    def record_decision(self, fallback: bool):
+        with self._lock:
+            self.decisions += 1
+            self.fallbacks += int(fallback)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "parse": dict(self.counts),
+                "parse_time": self.parse_time.summary(),
+                "decisions": self.decisions,
+                "fallbacks": self.fallbacks,
+                "fallback_rate": self.fallbacks / self.decisions if self.decisions else 0.0,
+            }
+
+
+DECISION_STATS = DecisionStats()
+
+
+class DeferredDecisions:
+    """
+    선행 계산(speculative) 결정의 파싱/결정 통계와 결정 로그를 바로 반영하지 않고 모아 둡니다.
+    실제 턴에 채택(hit)되면 commit()으로 DECISION_STATS/결정 로그에 반영하고, miss/폐기면 그냥 버립니다.
+    """
+
+    def __init__(self, target: DecisionStats = None):
+        self.target = target or DECISION_STATS
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def record_parse(self, outcome: str, seconds: float):
+        llm_trace.annotate(parse=outcome, parse_sec=seconds)  # 추적 로그(kind="speculative")에는 바로 기록
+        with self._lock:
+            self._pending.append((self.target._add_parse, (outcome, seconds)))
+
+    def record_decision(self, fallback: bool):
+        with self._lock:
+            self._pending.append((self.target.record_decision, (fallback,)))
+
+    def defer(self, fn, *args):
+        """결정 로그처럼 채택될 때만 실행할 호출"""
+        with self._lock:
+            self._pending.append((fn, args))
+
+    def commit(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for fn, args in pending:
+            fn(*args)
+        return len(pending)
+
+
+def _close_truncated(text: str) -> str:
+    """max_output_tokens 등으로 잘린 JSON에 빠진 닫는 괄호를 채웁니다. (문자열 중간에서 잘린 경우는 포기)"""
+    stack, in_string, escaped = [], False, False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "[{":
+            stack.append("]" if ch == "[" else "}")
+        elif ch in "]}" and stack:
+            stack.pop()
+    if in_string:
+        return text
+    return text.rstrip().rstrip(",") + "".join(reversed(stack))
+
+
+def _repair_text(text: str) -> str:
+    raw = (text or "").strip()
+    fence = _FENCE_RE.search(raw)
+    if fence:
+        raw = fence.group(1).strip()
+    starts = [i for i in (raw.find("["), raw.find("{")) if i != -1]
+    if not starts:
+        raise DecisionParseError(f"JSON 배열/객체가 없습니다: {raw[:80]}")
+    raw = raw[min(starts):]
+    end = max(raw.rfind("]"), raw.rfind("}"))
+    try:
+        json.loads(raw[:end + 1])
+        raw = raw[:end + 1]  # 뒤쪽 설명 텍스트 제거
+    except json.JSONDecodeError:
+        raw = _close_truncated(raw)
+    return _TRAILING_COMMA_RE.sub(r"\1", raw)
+
+
+def _reshape(data):
+    """스키마와 모양만 다른 흔한 응답을 선택지 배열로 바꿉니다."""
+    if isinstance(data, dict):
+        if "decision" in data:
+            return [data]
+        if "price" in data:
+            return [{"decision": data}]
+        lists = [v for v in data.values() if isinstance(v, list)]
+        if len(lists) == 1:
+            return lists[0]
+    return data
+
+
+def _normalize_probabilities(choices: list) -> list:
+    total = sum(c["probability"] for c in choices)
+    if total <= 0:
+        for c in choices:
+            c["probability"] = 1.0 / len(choices)
+    elif abs(total - 1.0) > 1e-6:
+        for c in choices:
+            c["probability"] = c["probability"] / total
+    return choices
+
+
+def validate_choices(data) -> list:
+    """이미 파싱된 값을 스키마로 검증해 dict 선택지 목록으로 돌려줍니다. (배치 응답의 회사별 값에도 사용)"""
+    data = _reshape(data)
+    try:
+        models = _choices_adapter.validate_python(data)
+    except ValidationError as e:
+        raise DecisionParseError(str(e)) from e
+    if not models:
+        raise DecisionParseError("선택지가 비어 있습니다.")
+    return _normalize_probabilities([m.model_dump() for m in models])
+
+
+def _loads_with_repair(text: str, validate, stats: DecisionStats):
+    started = time.perf_counter()
+    try:
+        result = validate(json.loads(text))
+        stats.record_parse("direct", time.perf_counter() - started)
+        return result
+    except (json.JSONDecodeError, DecisionParseError, TypeError):
+        pass
+    try:
+        result = validate(json.loads(_repair_text(text)))
+        stats.record_parse("repaired", time.perf_counter() - started)
+        return result
+    except (json.JSONDecodeError, DecisionParseError, TypeError) as e:
+        stats.record_parse("failed", time.perf_counter() - started)
+        raise DecisionParseError(f"응답 파싱 실패: {e}") from e
+
+
+def parse_choices(text: str, stats: DecisionStats = None) -> list:
+    """단일 에이전트 응답 텍스트 -> 검증된 선택지 목록. 실패하면 DecisionParseError."""
+    return _loads_with_repair(text, validate_choices, stats or DECISION_STATS)
+
+
+def parse_batch(text: str, stats: DecisionStats = None) -> dict:
+    """배치 응답 텍스트 -> {회사: 원시 값} (회사별 검증은 validate_choices로 따로)."""
+    def as_object(data):
+        if not isinstance(data, dict):
+            raise DecisionParseError("배치 응답이 회사별 JSON 객체가 아님")
+        return data
+    return _loads_with_repair(text, as_object, stats or DECISION_STATS)
@@ -0,0 +1,279 @@
+# distributed.py
+"""
+여러 머신에 auto_tune 후보 평가를 나눠 돌리는 코디네이터/워커 프로토콜.
+
+외부 브로커 없이 multiprocessing.connection(TCP + authkey)만 사용합니다.
+    # 코디네이터 (시나리오 JSON으로 auto_tune과 같은 후보 격자를 분산 평가)
+    export TUNING_AUTHKEY=<임의의 긴 비밀 문자열>   # 코디네이터/워커 모두 같은 값 (기본값 없음)
+    python -m distributed coordinator --scenario scenarios/console2.json --bind 10.0.0.5:7070
+    # 워커 (머신마다 원하는 만큼 실행)
+    python -m distributed worker --connect 10.0.0.5:7070
+
+워커는 api_main의 _evaluate_benchmark_params(= _initialize_market_for_benchmark + run_benchmark_turn)를
+그대로 호출하므로 단일 노드 auto_tune과 결과가 동일합니다.
+인증키는 --authkey 또는 TUNING_AUTHKEY 환경 변수로 반드시 지정해야 합니다.
+multiprocessing.connection은 받은 메시지를 unpickle하므로 인증키를 아는 쪽은 코디네이터에서 코드를 실행할 수 있습니다.
+그래서 공개된 기본 인증키는 두지 않고, --bind 기본값도 127.0.0.1입니다. (다른 머신의 워커를 받으려면 사설망 주소로 명시)
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+def _require_authkey(authkey: str) -> bytes:
+    if not authkey:
+        raise ValueError("authkey가 필요합니다 (--authkey 또는 TUNING_AUTHKEY)")
+    return authkey.encode("utf-8")
+
+
+def _parse_address(text: str):
+    host, _, port = text.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+class TuningCoordinator:
+    """
+    후보 배치를 워커에게 나눠주고, 끊기거나 시간 초과된 배치는 다시 큐에 넣어 재시도합니다.
+    워커는 언제든 붙었다 떨어질 수 있고, 하나의 코디네이터로 여러 작업(evaluate 호출)을 연속 처리할 수 있습니다.
+    """
+
+    def __init__(self, address=("127.0.0.1", 0), authkey: str = None,
+                 batch_size: int = 64, batch_timeout: float = 300.0, max_retries: int = 3):
+        self.listener = Listener(address, authkey=_require_authkey(authkey))
+        self.address = self.listener.address
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._closed = False
+        self._job_id = None
+        self._scenario_payload = None
+        self._pending = deque()
+        self._in_flight = {}
+        self._results = []
+        self._remaining = 0
+        self.stats = {"workers_connected": 0, "batches_sent": 0, "batches_retried": 0, "batches_failed": 0}
+
+        self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._accept_thread.start()
+
+    # --- 연결 관리 ---
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                if self._closed:
+                    return
+                continue
+            with self._cond:
+                self.stats["workers_connected"] += 1
+            threading.Thread(target=self._serve_worker, args=(conn,), daemon=True).start()
+
+    def _next_batch(self):
+        """보낼 배치가 생길 때까지 대기. 코디네이터가 닫히면 None."""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            batch = self._pending.popleft()
+            self._in_flight[(batch["job_id"], batch["batch_id"])] = batch
+            self.stats["batches_sent"] += 1
+            return batch
+
+    def _complete(self, batch, results):
+        with self._cond:
+            key = (batch["job_id"], batch["batch_id"])
+            # 재시도로 이미 처리된 배치의 늦은 응답은 무시
+            if key not in self._in_flight or batch["job_id"] != self._job_id:
+                return
+            del self._in_flight[key]
+            for idx, mae in results:
+                self._results[idx] = mae
+            self._remaining -= 1
+            self._cond.notify_all()
+
+    def _requeue(self, batch, reason: str):
+        with self._cond:
+            key = (batch["job_id"], batch["batch_id"])
+            if key not in self._in_flight or batch["job_id"] != self._job_id:
+                return
+            del self._in_flight[key]
+            batch["attempts"] += 1
+            if batch["attempts"] > self.max_retries:
+                print(f"!!! [Coordinator] 배치 {batch['batch_id']} 최종 실패 ({reason}) -> 결과 없음 처리")
+                self.stats["batches_failed"] += 1
+                self._remaining -= 1
+            else:
+                print(f"⚠️ [Coordinator] 배치 {batch['batch_id']} 재시도 {batch['attempts']}/{self.max_retries} ({reason})")
+                self.stats["batches_retried"] += 1
+                self._pending.appendleft(batch)
+            self._cond.notify_all()
+
+    def _serve_worker(self, conn):
+        sent_job_id = None
+        batch = None
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    conn.send(("stop",))
+                    return
+                if sent_job_id != batch["job_id"]:
+                    conn.send(("scenario", batch["job_id"], self._scenario_payload))
+                    sent_job_id = batch["job_id"]
+                conn.send(("batch", batch["job_id"], batch["batch_id"], batch["items"]))
+                if not conn.poll(self.batch_timeout):
+                    raise TimeoutError(f"{self.batch_timeout}s 내 응답 없음")
+                message = conn.recv()
+                if message[0] != "result":
+                    raise ValueError(f"알 수 없는 메시지: {message[0]}")
+                self._complete(batch, message[3])
+                batch = None
+        except Exception as e:
+            if batch is not None:
+                self._requeue(batch, f"{type(e).__name__}: {e}")
+        finally:
+            conn.close()
+
+    # --- 작업 실행 ---
+    def evaluate(self, scenario_payload: dict, candidates: list, timeout: float = None) -> list:
+        """
+        후보 파라미터 리스트를 분산 평가해 같은 순서의 평균 MAE 리스트(실패는 None)를 반환합니다.
+        scenario_payload는 BenchmarkData.model_dump() 결과입니다.
+        """
+        deadline = time.time() + timeout if timeout else None
+        with self._cond:
+            self._job_id = uuid.uuid4().hex
+            self._scenario_payload = scenario_payload
+            self._results = [None] * len(candidates)
+            self._in_flight = {}
+            self._pending = deque()
+            for batch_id, start in enumerate(range(0, len(candidates), self.batch_size)):
+                items = [(idx, candidates[idx]) for idx in range(start, min(start + self.batch_size, len(candidates)))]
+                self._pending.append({"job_id": self._job_id, "batch_id": batch_id, "items": items, "attempts": 0})
+            self._remaining = len(self._pending)
+            self._cond.notify_all()
+
+            while self._remaining > 0:
+                wait = None if deadline is None else deadline - time.time()
+                if wait is not None and wait <= 0:
+                    raise TimeoutError(f"분산 평가 시간 초과 (남은 배치 {self._remaining}개)")
+                self._cond.wait(wait)
+            return list(self._results)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.listener.close()
+
+
+def distributed_auto_tune(data, coordinator: TuningCoordinator, timeout: float = None) -> dict:
+    """api_main.auto_tune_parameters와 같은 후보/같은 평가로, 평가만 워커들에 분산합니다."""
+    from api_main import _build_tuning_candidates
+
+    start_time = time.time()
+    candidates, estimate = _build_tuning_candidates(data)
+    print(f"🧪 [Coordinator] {len(candidates)}개 후보를 워커들에 분배합니다. (주소: {coordinator.address})")
+    maes = coordinator.evaluate(data.model_dump(), candidates, timeout=timeout)
+
+    best_mae = float("inf")
+    best_params = {}
+    # 단일 노드와 동일하게 '먼저 나온 조합'이 동점 우선
+    for params, mae in zip(candidates, maes):
+        if mae is not None and mae < best_mae:
+            best_mae = mae
+            best_params = dict(params)
+
+    elapsed = time.time() - start_time
+    return {
+        "best_params": best_params,
+        "lowest_mae": best_mae,
+        "seed_estimate": estimate,
+        "coordinator_stats": dict(coordinator.stats),
+        "message": f"Tested {len(candidates)} scenarios in {elapsed:.1f}s (distributed). Best MAE: {best_mae*100:.2f}%",
+    }
+
+
+def run_worker(address, authkey: str):
+    """코디네이터에 붙어서 stop 메시지를 받을 때까지 배치를 평가합니다."""
+    from api_main import BenchmarkData, _evaluate_benchmark_params
+
+    conn = Client(address, authkey=_require_authkey(authkey))
+    print(f"🔌 [Worker {os.getpid()}] 코디네이터 연결: {address}")
+    scenarios = {}
+    evaluated = 0
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            kind = message[0]
+            if kind == "stop":
+                break
+            if kind == "scenario":
+                _, job_id, payload = message
+                scenarios = {job_id: BenchmarkData(**payload)}
+            elif kind == "batch":
+                _, job_id, batch_id, items = message
+                data = scenarios[job_id]
+                results = [(idx, _evaluate_benchmark_params(data, params)) for idx, params in items]
+                conn.send(("result", job_id, batch_id, results))
+                evaluated += len(items)
+    finally:
+        conn.close()
+    print(f"🏁 [Worker {os.getpid()}] 종료 (평가한 후보 {evaluated}개)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="auto_tune 분산 코디네이터/워커")
+    sub = parser.add_subparsers(dest="role", required=True)
+
+    worker = sub.add_parser("worker")
+    worker.add_argument("--connect", required=True, help="host:port")
+    worker.add_argument("--authkey", default=os.getenv("TUNING_AUTHKEY"), help="기본값: TUNING_AUTHKEY")
+
+    coord = sub.add_parser("coordinator")
+    coord.add_argument("--scenario", required=True, help="BenchmarkData 형식의 시나리오 JSON")
+    coord.add_argument("--bind", default="127.0.0.1:7070", help="host:port (다른 머신의 워커를 받으려면 사설망 주소)")
+    coord.add_argument("--authkey", default=os.getenv("TUNING_AUTHKEY"), help="기본값: TUNING_AUTHKEY")
+    coord.add_argument("--batch-size", type=int, default=64)
+    coord.add_argument("--batch-timeout", type=float, default=300.0)
+    coord.add_argument("--max-retries", type=int, default=3)
+    coord.add_argument("--output", help="결과를 저장할 JSON 경로")
+
+    args = parser.parse_args(argv)
+    if not args.authkey:
+        parser.error("--authkey 또는 TUNING_AUTHKEY 환경 변수가 필요합니다")
+    if args.role == "worker":
+        run_worker(_parse_address(args.connect), authkey=args.authkey)
+        return
+
+    from api_main import BenchmarkData
+
+    with open(args.scenario, "r", encoding="utf-8") as f:
+        data = BenchmarkData(**json.load(f))
+    coordinator = TuningCoordinator(_parse_address(args.bind), authkey=args.authkey, batch_size=args.batch_size,
+                                    batch_timeout=args.batch_timeout, max_retries=args.max_retries)
+    try:
+        result = distributed_auto_tune(data, coordinator)
+    finally:
+        coordinator.close()
+    print(f"=== 🏆 {result['message']} ===")
+    print(json.dumps(result["best_params"], indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# estimator.py
+"""
+벤치마크 turns_data에서 물리 파라미터(physics) 초기값을 회귀로 바로 추정합니다.
+
+simulator._calculate_utility_scores의 로짓 점유율 모델에서 두 회사 i, j의 점유율 비율은
+    log(s_i / s_j) = w_q * (q_i - q_j) / 10 + w_b * (b_i - b_j) / 10 - beta_p * (log p_i - log p_j)
+    (beta_p = weight_price * price_sensitivity / 5)
+이므로, 턴마다 기준 회사 대비 로그 점유율 비율을 OLS로 회귀하면 가중치와 가격 민감도를 얻을 수 있습니다.
+auto_tune은 이 값과 신뢰구간을 중심으로 탐색 공간을 좁힙니다.
+"""
+
+import math
+
+import numpy as np
+
+# 추정값이 폭주하지 않도록 auto_tune 탐색 범위와 비슷한 수준으로 제한
+PARAM_BOUNDS = {
+    "price_sensitivity": (0.5, 200.0),
+    "weight_quality": (0.0, 1.5),
+    "weight_brand": (0.0, 1.5),
+}
+Z_95 = 1.96
+
+
+def _companies_dict(turn_data: dict) -> dict:
+    companies = turn_data.get("companies", {})
+    if isinstance(companies, list):
+        return {c.get("name", "Unknown"): c for c in companies}
+    return companies
+
+
+def _observations(turns_data: list):
+    """턴별 (회사, 로그가격, 품질, 브랜드, 로그점유율) 관측치를 모읍니다."""
+    first = _companies_dict(turns_data[0]) if turns_data else {}
+    rows_by_turn = []
+    for turn_data in turns_data:
+        rows = []
+        for name, comp in _companies_dict(turn_data).items():
+            inputs = comp.get("inputs", {})
+            outputs = comp.get("outputs", {})
+            price = inputs.get("price", 0) or 0
+            share = outputs.get("actual_market_share", 0) or 0
+            if price <= 0 or share <= 0:
+                continue
+            # 턴별 품질/브랜드가 없으면 첫 턴 값(시뮬레이터 초기값)을 사용
+            first_inputs = first.get(name, {}).get("inputs", {})
+            quality = inputs.get("initial_quality", first_inputs.get("initial_quality", 50.0))
+            brand = inputs.get("initial_brand", first_inputs.get("initial_brand", 50.0))
+            rows.append((name, math.log(price), quality / 10.0, brand / 10.0, math.log(share)))
+        if len(rows) >= 2:
+            rows_by_turn.append(rows)
+    return rows_by_turn
+
+
+def _clip(name: str, value: float) -> float:
+    lo, hi = PARAM_BOUNDS[name]
+    return min(hi, max(lo, value))
+
+
+def estimate_physics(turns_data: list, weight_price: float = None):
+    """
+    turns_data에서 price_sensitivity / weight_quality / weight_brand를 추정합니다.
+
+    weight_price가 주어지지 않으면 auto_tune과 같은 규칙(1 - (품질+브랜드 가중치), 최소 0.05)으로 정합니다.
+    관측치가 부족하거나 회귀가 불가능하면 None을 반환합니다.
+    """
+    rows_by_turn = _observations(turns_data)
+
+    # 회사 쌍(기준 회사, 비교 회사)별로 묶어서 고정효과(within) 회귀를 합니다.
+    # 턴별 품질/브랜드 데이터가 없는 시나리오에서는 회사 간 고정된 격차가 여기서 흡수되고,
+    # 가격 민감도는 회사 내 가격 변화만으로 추정됩니다.
+    groups = {}
+    for rows in rows_by_turn:
+        ref_name, ref_logp, ref_q, ref_b, ref_logs = rows[0]
+        for name, logp, q, b, logs in rows[1:]:
+            groups.setdefault((ref_name, name), []).append(
+                ([q - ref_q, b - ref_b, -(logp - ref_logp)], logs - ref_logs)
+            )
+
+    X, y = [], []
+    n_groups = 0
+    for obs in groups.values():
+        if len(obs) < 2:
+            continue
+        n_groups += 1
+        gx = np.asarray([o[0] for o in obs], dtype=float)
+        gy = np.asarray([o[1] for o in obs], dtype=float)
+        X.append(gx - gx.mean(axis=0))
+        y.append(gy - gy.mean())
+    if not X:
+        return None
+
+    X = np.vstack(X)
+    y = np.concatenate(y)
+
+    # 변동이 없는 설명변수(예: 품질/브랜드가 턴별로 주어지지 않은 경우)는 식별 불가 -> 제외
+    names = ["weight_quality", "weight_brand", "beta_price"]
+    usable = [k for k in range(X.shape[1]) if np.ptp(X[:, k]) > 1e-9]
+    dof = len(y) - len(usable) - n_groups
+    if "beta_price" not in [names[k] for k in usable] or dof <= 0:
+        return None
+
+    Xu = X[:, usable]
+    coef, _, rank, _ = np.linalg.lstsq(Xu, y, rcond=None)
+    if rank < len(usable):
+        return None
+
+    residuals = y - Xu @ coef
+    sigma2 = float(residuals @ residuals) / dof
+    cov = sigma2 * np.linalg.pinv(Xu.T @ Xu)
+    stderr = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+    ss_tot = float((y ** 2).sum())
+    r2 = 1.0 - float(residuals @ residuals) / ss_tot if ss_tot > 0 else 1.0
+
+    fitted = {names[k]: (float(coef[i]), float(stderr[i])) for i, k in enumerate(usable)}
+
+    # 추정치가 허용 범위 밖(예: 가격이 오를수록 점유율이 오르는 데이터)이면 시드로 쓰지 않습니다.
+    physics, ranges, seeded = {}, {}, []
+    for name in ("weight_quality", "weight_brand"):
+        if name in fitted:
+            value, se = fitted[name]
+            physics[name] = _clip(name, value)
+            ranges[name] = [_clip(name, value - Z_95 * se), _clip(name, value + Z_95 * se)]
+            if physics[name] == value:
+                seeded.append(name)
+
+    if weight_price is None:
+        weight_sum = physics.get("weight_quality", 0.0) + physics.get("weight_brand", 0.0)
+        weight_price = max(0.05, round(1.0 - min(1.0, weight_sum), 2))
+    physics["weight_price"] = weight_price
+
+    # beta_price = weight_price * price_sensitivity / 5
+    beta, beta_se = fitted["beta_price"]
+    to_sensitivity = 5.0 / weight_price
+    sensitivity = beta * to_sensitivity
+    physics["price_sensitivity"] = _clip("price_sensitivity", sensitivity)
+    ranges["price_sensitivity"] = [
+        _clip("price_sensitivity", (beta - Z_95 * beta_se) * to_sensitivity),
+        _clip("price_sensitivity", (beta + Z_95 * beta_se) * to_sensitivity),
+    ]
+    if physics["price_sensitivity"] == sensitivity:
+        seeded.append("price_sensitivity")
+
+    return {
+        "physics": physics,
+        "ranges": ranges,
+        # 가격 효과는 weight_price * price_sensitivity의 곱으로만 식별되므로,
+        # 가중치를 같이 탐색할 때는 이 값에서 price_sensitivity를 역산합니다.
+        "beta_price": {"value": beta, "range": [beta - Z_95 * beta_se, beta + Z_95 * beta_se]},
+        "seeded": seeded,
+        "n_obs": int(len(y)),
+        "r2": r2,
+    }
+
+
+def local_search_values(center: float, lo: float, hi: float, points: int = 3, min_rel_width: float = 0.05) -> list:
+    """
+    추정값(center)과 신뢰구간(lo~hi)으로 좁은 탐색 격자를 만듭니다.
+    신뢰구간이 충분히 좁으면 중심값 하나만 사용합니다.
+    """
+    lo, hi = min(lo, center), max(hi, center)
+    if hi - lo <= abs(center) * min_rel_width or points <= 1:
+        return [round(center, 4)]
+    values = np.linspace(lo, hi, points).tolist()
+    values.append(center)
+    return sorted({round(v, 4) for v in values})
@@ -0,0 +1,167 @@
+# llm_cache.py
+"""
+AIAgent용 LLM 응답 캐시 (내용 주소 기반, 로컬 파일 저장).
+
+키 = sha256(모델명 + 정규화된 system_instruction + 정규화된 프롬프트). 같은 페르소나/같은 상태로 시나리오를 다시 돌리면
+Gemini를 부르지 않고 저장된 응답을 그대로 재생합니다.
+
+모드 (LLM_CACHE_MODE 환경 변수):
+    off         - 캐시 사용 안 함 (기본값)
+    read_write  - 캐시에 있으면 재사용, 없으면 호출 후 저장
+    replay      - 캐시에 있는 응답만 사용, 없으면 CacheMissError (네트워크 호출 절대 없음)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_MODES = ("off", "read_write", "replay")
+
+
+class CacheMissError(RuntimeError):
+    """replay 모드에서 캐시에 없는 프롬프트를 요청한 경우."""
+
+
+def normalize_prompt(text: str) -> str:
+    """들여쓰기/끝 공백/연속 빈 줄 차이로 키가 달라지지 않도록 프롬프트를 정규화합니다."""
+    lines = [line.strip() for line in (text or "").strip().splitlines()]
+    normalized = []
+    for line in lines:
+        if not line and normalized and not normalized[-1]:
+            continue
+        normalized.append(line)
+    return "\n".join(normalized)
+
+
+def cache_key(model_name: str, prompt: str, system_instruction: str = None) -> str:
+    # 규칙/페르소나가 system_instruction으로 분리되어 있으므로 키에 반드시 포함
+    payload = f"{model_name}\x00{normalize_prompt(system_instruction or '')}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite 파일 하나에 응답을 저장하고, 총 크기가 max_bytes를 넘으면 가장 오래 안 쓴 항목부터 지웁니다."""
+
+    def __init__(self, path: str = "llm_cache.sqlite3", max_bytes: int = 256 * 1024 * 1024, mode: str = "read_write"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"알 수 없는 캐시 모드: {mode} (가능: {CACHE_MODES})")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._total_bytes = 0
+        if self.enabled:
+            self._open()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay_only(self) -> bool:
+        return self.mode == "replay"
+
+    def _open(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER,"
+            " created REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, model_name: str, prompt: str, system_instruction: str = None):
+        if not self.enabled:
+            return None
+        key = cache_key(model_name, prompt, system_instruction)
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, model_name: str, prompt: str, response: str, system_instruction: str = None):
+        if not self.enabled or self.replay_only or response is None:
+            return
+        key = cache_key(model_name, prompt, system_instruction)
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self.stores += 1
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes:
+            row = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 1").fetchone()
+            if row is None:
+                self._total_bytes = 0
+                return
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._total_bytes -= row[1]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        entries = 0
+        if self.enabled:
+            with self._lock:
+                entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "mode": self.mode,
+            "path": self.path if self.enabled else None,
+            "entries": entries,
+            "total_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+_default_cache = None
+
+
+def response_cache_from_env(mode: str = None) -> LLMResponseCache:
+    """LLM_CACHE_PATH / LLM_CACHE_MAX_MB 설정으로 새 캐시를 만듭니다. mode를 주면 LLM_CACHE_MODE 대신 사용."""
+    return LLMResponseCache(
+        path=os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3"),
+        max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024),
+        mode=mode or os.getenv("LLM_CACHE_MODE", "off"),
+    )
+
+
+def get_response_cache() -> LLMResponseCache:
+    """환경 변수(LLM_CACHE_MODE / LLM_CACHE_PATH / LLM_CACHE_MAX_MB)로 설정되는 프로세스 공용 캐시."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = response_cache_from_env()
+    return _default_cache
@@ -0,0 +1,347 @@
+# llm_pool.py
+"""
+프로세스 전체가 공유하는 Gemini 클라이언트 풀.
+
+호출마다 `async with genai.Client().aio`로 클라이언트/커넥션을 새로 만들던 것을
+이벤트 루프당 하나의 장수(long-lived) 클라이언트로 바꾸고, 그 앞에 다음을 둡니다.
+    - 동시 호출 수 상한 (LLM_MAX_CONCURRENCY)
+    - 토큰 버킷 속도 제한 (LLM_REQUESTS_PER_MINUTE, LLM_BURST)
+    - 시뮬레이션(sim_id)별 라운드 로빈 공정 큐잉: 한 시뮬레이션의 대량 요청이 다른 시뮬레이션을 굶기지 않음
+    - 대기 시간(queue wait)과 실제 호출 시간(call time) 분리 측정
+
+백엔드(LLM_BACKEND)가 "http"이면 genai 대신 로컬 스탠드인 서버(llm_standin.py, LLM_HTTP_URL)를
+같은 인터페이스(client.aio.models.generate_content)로 호출합니다.
+
+call_with_retries / hedged는 호출 하나를 감싸는 지연 제어용 도우미입니다.
+    - 일시적 오류(429/5xx/타임아웃/연결 오류)는 마감 시간 안에서 지수 백오프로 재시도
+    - LLM_HEDGE=1이면 호출 시간 p95가 지나도 응답이 없을 때 같은 요청을 하나 더 보내고, 먼저 끝난 쪽만 사용
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from google import genai
+
+import llm_trace
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+LLM_BACKENDS = ("gemini", "http", "mock")
+
+
+class LLMHTTPError(RuntimeError):
+    """HTTP 백엔드가 오류 상태 코드를 돌려준 경우. status_code로 재시도 여부를 판단합니다."""
+
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+
+
+class HTTPStandInClient:
+    """genai.Client와 같은 모양(client.aio.models.generate_content)으로 HTTP 스탠드인 서버를 호출합니다."""
+
+    def __init__(self, base_url: str, timeout: float = 300.0):
+        import httpx
+        self._http = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self._generate_content))
+
+    async def _generate_content(self, model: str, contents, config=None):
+        payload = {
+            "model": model,
+            "contents": contents,
+            "system_instruction": getattr(config, "system_instruction", None),
+            "response_mime_type": getattr(config, "response_mime_type", None),
+        }
+        response = await self._http.post("/generate", json=payload)
+        if response.status_code >= 400:
+            raise LLMHTTPError(response.status_code, response.text[:200])
+        return SimpleNamespace(text=response.json()["text"])
+
+
+def percentile(samples, q: float) -> float:
+    """최근접 순위(nearest-rank) 백분위수. 표본이 없으면 0.0"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class LatencyStats:
+    """최근 window개 표본으로 p50/p95를 내는 지연 통계 (llm_pool, decision_schema 공용)"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        return percentile(self.samples, q)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_sec": (self.total / self.count) if self.count else 0.0,
+            "p50_sec": self.percentile(0.50),
+            "p95_sec": self.percentile(0.95),
+            "max_sec": self.max,
+        }
+
+
+class TokenBucket:
+    """초당 rate개씩 채워지고 최대 capacity개까지 쌓이는 토큰 버킷."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # 토큰을 먼저 기다린 요청이 먼저 가져가도록 직렬화
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+class LLMClientPool:
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: float = 60.0, burst: float = None,
+                 backend: str = "gemini"):
+        self.backend = backend
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst if burst is not None else max(1.0, requests_per_minute / 6.0))
+
+        self._loop = None
+        self._client = None
+        self._active = 0
+        self._queues = {}        # sim_id -> deque[Future]
+        self._order = deque()    # 대기 중인 sim_id 라운드 로빈 순서
+
+        self.queue_wait = LatencyStats()
+        self.call_time = LatencyStats()
+        self.calls = 0
+        self.errors = 0
+
+    # --- 이벤트 루프별 자원 ---
+    def _bind_loop(self):
+        """asyncio 객체(Future, Lock)와 aio 클라이언트는 루프에 묶이므로, 루프가 바뀌면 새로 만듭니다."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._client = None
+            self._active = 0
+            self._queues = {}
+            self._order = deque()
+            self.bucket._lock = asyncio.Lock()
+        return loop
+
+    @property
+    def client(self):
+        if self._client is None:
+            if self.backend == "http":
+                self._client = HTTPStandInClient(os.getenv("LLM_HTTP_URL", "http://127.0.0.1:8765"))
+            else:
+                self._client = genai.Client()
+        return self._client
+
+    # --- 공정 큐잉 ---
+    def _dispatch(self):
+        while self._active < self.max_concurrency and self._order:
+            sim_id = self._order.popleft()
+            queue = self._queues[sim_id]
+            fut = queue.popleft()
+            if queue:
+                self._order.append(sim_id)
+            else:
+                del self._queues[sim_id]
+            if fut.cancelled():
+                continue
+            self._active += 1
+            fut.set_result(None)
+
+    def _release(self):
+        self._active -= 1
+        self._dispatch()
+
+    async def _acquire_slot(self, sim_id: str):
+        loop = self._bind_loop()
+        fut = loop.create_future()
+        if sim_id not in self._queues:
+            self._queues[sim_id] = deque()
+            self._order.append(sim_id)
+        self._queues[sim_id].append(fut)
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # 슬롯을 받은 직후 취소된 경우 슬롯을 돌려줌
+            if fut.done() and not fut.cancelled():
+                self._release()
+            raise
+
+    # --- 호출 ---
+    async def generate_content(self, model: str, contents, config=None, sim_id: str = None):
+        """풀을 거쳐 client.aio.models.generate_content를 호출합니다."""
+        sim_id = sim_id or "default"
+        queued_at = time.monotonic()
+        await self._acquire_slot(sim_id)
+        try:
+            await self.bucket.acquire()
+            started_at = time.monotonic()
+            self.queue_wait.add(started_at - queued_at)
+            try:
+                response = await self.client.aio.models.generate_content(model=model, contents=contents, config=config)
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                elapsed = time.monotonic() - started_at
+                self.calls += 1
+                self.call_time.add(elapsed)
+                llm_trace.increment("llm_calls")
+                # 비스트리밍 호출이라 첫 바이트 시간 = 응답 수신 시간
+                llm_trace.annotate(queue_wait_sec=started_at - queued_at, ttfb_sec=elapsed, call_sec=elapsed)
+            llm_trace.record_usage(response)
+            return response
+        finally:
+            self._release()
+
+    def hedge_delay(self):
+        """헤지 요청을 보낼 대기 시간(호출 시간 p95). 헤지가 꺼져 있거나 표본이 부족하면 None."""
+        if os.getenv("LLM_HEDGE", "0") != "1":
+            return None
+        if self.call_time.count < int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")):
+            return None
+        return self.call_time.percentile(0.95)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "max_concurrency": self.max_concurrency,
+            "requests_per_minute": self.requests_per_minute,
+            "active": self._active,
+            "queued": sum(len(q) for q in self._queues.values()),
+            "queued_by_sim": {sim_id: len(q) for sim_id, q in self._queues.items()},
+            "calls": self.calls,
+            "errors": self.errors,
+            "queue_wait": self.queue_wait.summary(),
+            "call_time": self.call_time.summary(),
+        }
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """재시도할 가치가 있는 오류인지 판단합니다. (google.genai APIError는 .code에 HTTP 상태를 담음)"""
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(code, int) and code in TRANSIENT_STATUS_CODES:
+        return True
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    try:
+        import httpx
+        return isinstance(exc, httpx.TransportError)
+    except ImportError:
+        return False
+
+
+async def call_with_retries(make_call, deadline: float = None, max_retries: int = None, base_delay: float = None):
+    """
+    make_call()을 실행하고, 일시적 오류면 지수 백오프(+지터)로 재시도합니다.
+    deadline(이벤트 루프 시간) 안에 다음 시도를 시작할 수 없으면 마지막 오류를 그대로 던집니다.
+    """
+    loop = asyncio.get_running_loop()
+    max_retries = int(os.getenv("LLM_MAX_RETRIES", "2")) if max_retries is None else max_retries
+    base_delay = float(os.getenv("LLM_RETRY_BASE_SEC", "1.0")) if base_delay is None else base_delay
+    attempt = 0
+    while True:
+        try:
+            return await make_call()
+        except Exception as e:
+            if attempt >= max_retries or not is_transient_error(e):
+                raise
+            delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.0)
+            if deadline is not None and loop.time() + delay >= deadline:
+                raise
+            attempt += 1
+            print(f"⚠️ [LLM] 일시적 오류 재시도 {attempt}/{max_retries} ({delay:.1f}s 후): {e}")
+            await asyncio.sleep(delay)
+
+
+async def hedged(make_call, hedge_delay: float = None):
+    """
+    hedge_delay 안에 첫 요청이 끝나지 않으면 두 번째 요청을 보내고, 먼저 성공한 결과를 반환합니다.
+    진 쪽 요청은 취소합니다. 둘 다 실패하면 마지막 오류를 던집니다.
+    """
+    if hedge_delay is None:
+        return await make_call()
+
+    tasks = [asyncio.ensure_future(make_call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if not done:
+            print(f"🪁 [LLM] {hedge_delay:.1f}s 내 응답 없음 -> 헤지 요청 발송")
+            tasks.append(asyncio.ensure_future(make_call()))
+        pending = set(tasks)
+        last_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+_pools = {}
+
+
+def default_backend() -> str:
+    backend = os.getenv("LLM_BACKEND", "gemini")
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"알 수 없는 LLM_BACKEND: {backend} (가능: {LLM_BACKENDS})")
+    return backend
+
+
+def get_llm_pool(backend: str = None) -> LLMClientPool:
+    """
+    백엔드별 프로세스 공용 풀. 환경 변수(LLM_MAX_CONCURRENCY / LLM_REQUESTS_PER_MINUTE / LLM_BURST)로 설정됩니다.
+    backend를 생략하면 LLM_BACKEND(기본 gemini)를 사용합니다.
+    """
+    backend = backend or default_backend()
+    if backend not in _pools:
+        burst = os.getenv("LLM_BURST")
+        _pools[backend] = LLMClientPool(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60")),
+            burst=float(burst) if burst else None,
+            backend=backend,
+        )
+    return _pools[backend]
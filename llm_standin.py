@@ -0,0 +1,192 @@
+# llm_standin.py
+"""
+Gemini 대신 쓰는 로컬 HTTP 스탠드인(stand-in) LLM 서버. (오프라인 부하 테스트용)
+
+    python -m llm_standin --port 8765 --latency-median 2.0 --latency-p99 8.0 --error-rate 0.02
+    LLM_BACKEND=http LLM_HTTP_URL=http://127.0.0.1:8765 uvicorn api_main:app
+
+POST /generate  {"model", "contents", "system_instruction", "response_mime_type"} -> {"text": "..."}
+- 지연 시간은 중앙값/99퍼센타일로 정하는 로그정규 분포에서 뽑습니다.
+- error_rate 확률로 503/429를 돌려줘 재시도/헤지/Fallback 경로도 함께 부하를 받게 합니다.
+- 응답은 프롬프트 안의 내 원가/예산을 읽어 만든 '그럴듯한' 3개 선택지 JSON 배열입니다.
+  배치 프롬프트("## [회사: X]" 섹션)면 회사별로 같은 방식의 선택지를 담은 JSON 객체를 돌려줍니다.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+Z_99 = 2.326
+
+_UNIT_COST_RE = re.compile(r'"unit_cost":\s*([0-9.]+)')
+_RD_BUDGET_RE = re.compile(r"최대 R&D 예산[^:]*:\s*([0-9,]+)")
+_MKT_BUDGET_RE = re.compile(r"최대 마케팅 예산[^:]*:\s*([0-9,]+)")
+_BATCH_SECTION_RE = re.compile(r"^## \[회사: (.+?)\]$", re.MULTILINE)
+
+STRATEGIES = (
+    ("품질 격차를 벌리기 위해 혁신 R&D에 집중 투자합니다.", 1.35, (0.3, 0.0), (0.9, 0.0)),
+    ("가격을 낮추고 판촉으로 점유율을 방어합니다.", 1.12, (0.5, 0.4), (0.3, 0.2)),
+    ("원가 절감에 투자해 이익률을 개선합니다.", 1.25, (0.3, 0.0), (0.2, 0.7)),
+)
+
+
+def _number(pattern, text: str, default: float) -> float:
+    match = pattern.search(text or "")
+    if not match:
+        return default
+    try:
+        return float(match.group(1).replace(",", ""))
+    except ValueError:
+        return default
+
+
+def build_choices(prompt: str, rng: random.Random) -> list:
+    """프롬프트에서 내 원가와 예산 한도를 읽어 예산을 지키는 선택지 3개를 만듭니다."""
+    unit_cost = _number(_UNIT_COST_RE, prompt, 100.0)
+    rd_budget = _number(_RD_BUDGET_RE, prompt, 500000.0)
+    mkt_budget = _number(_MKT_BUDGET_RE, prompt, 1000000.0)
+
+    weights = [rng.uniform(0.5, 1.5) for _ in STRATEGIES]
+    total = sum(weights)
+    choices = []
+    for (reasoning, markup, (brand, promo), (inno, eff)), weight in zip(STRATEGIES, weights):
+        jitter = rng.uniform(0.9, 1.1)
+        choices.append({
+            "reasoning": reasoning,
+            "probability": round(weight / total, 3),
+            "decision": {
+                "price": int(unit_cost * markup * jitter),
+                "marketing_brand_spend": int(mkt_budget * brand * jitter),
+                "marketing_promo_spend": int(mkt_budget * promo * jitter),
+                "rd_innovation_spend": int(rd_budget * inno * jitter),
+                "rd_efficiency_spend": int(rd_budget * eff * jitter),
+            },
+        })
+    # 확률 총합을 정확히 1.0으로 맞춤
+    choices[0]["probability"] = round(1.0 - sum(c["probability"] for c in choices[1:]), 3)
+    return choices
+
+
+def build_response(prompt: str, rng: random.Random):
+    """단일 프롬프트면 선택지 배열, 배치 프롬프트면 {회사: 선택지 배열}."""
+    sections = list(_BATCH_SECTION_RE.finditer(prompt))
+    if not sections:
+        return build_choices(prompt, rng)
+    batch = {}
+    for i, match in enumerate(sections):
+        end = sections[i + 1].start() if i + 1 < len(sections) else len(prompt)
+        batch[match.group(1)] = build_choices(prompt[match.end():end], rng)
+    return batch
+
+
+class StandInConfig:
+    def __init__(self, latency_median: float = 1.0, latency_p99: float = 4.0, error_rate: float = 0.0, seed: int = None):
+        self.latency_median = latency_median
+        self.latency_p99 = latency_p99
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def sample_latency(self) -> float:
+        if self.latency_median <= 0:
+            return 0.0
+        if self.latency_p99 <= self.latency_median:
+            return self.latency_median
+        sigma = math.log(self.latency_p99 / self.latency_median) / Z_99
+        with self._lock:
+            return self._rng.lognormvariate(math.log(self.latency_median), sigma)
+
+    def sample_error(self):
+        with self._lock:
+            self.requests += 1
+            if self._rng.random() >= self.error_rate:
+                return None
+            self.errors += 1
+            return self._rng.choice((503, 429))
+
+
+def _make_handler(config: StandInConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send_json(200, {"requests": config.requests, "errors": config.errors})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/generate":
+                self._send_json(404, {"error": "not found"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(config.sample_latency())
+
+            status = config.sample_error()
+            if status is not None:
+                self._send_json(status, {"error": "stand-in injected error"})
+                return
+
+            prompt = request.get("contents") or ""
+            # 같은 프롬프트에는 같은 응답 (LLM 응답 캐시/재현성 테스트용)
+            rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+            self._send_json(200, {"text": json.dumps(build_response(prompt, rng), ensure_ascii=False)})
+
+    return Handler
+
+
+def start_standin(host: str = "127.0.0.1", port: int = 0, config: StandInConfig = None):
+    """백그라운드 스레드로 서버를 띄우고 (server, base_url)을 반환합니다. 끝낼 때는 server.shutdown()."""
+    config = config or StandInConfig()
+    server = ThreadingHTTPServer((host, port), _make_handler(config))
+    server.daemon_threads = True
+    server.standin_config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="로컬 스탠드인 LLM 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-median", type=float, default=1.0, help="응답 지연 중앙값(초)")
+    parser.add_argument("--latency-p99", type=float, default=4.0, help="응답 지연 99퍼센타일(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503/429를 돌려줄 확률")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = StandInConfig(args.latency_median, args.latency_p99, args.error_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(config))
+    server.daemon_threads = True
+    print(f"🧪 [StandIn] http://{args.host}:{args.port}/generate (median {args.latency_median}s, "
+          f"p99 {args.latency_p99}s, error {args.error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# llm_trace.py
+"""
+LLM 호출 단위 추적 로그 (append-only, 크기 기준으로 회전하는 JSONL 세그먼트).
+
+LLM_TRACE_DIR이 설정되어 있으면 에이전트 결정 호출마다 한 줄을 남깁니다.
+    sim_id, turn, agent, backend, model, kind(decision|batch)
+    prompt_hash, prompt_chars, prompt_tokens_est, cache_hit
+    llm_calls(재시도/헤지 포함 실제 호출 수), queue_wait_sec, ttfb_sec, call_sec, latency_sec
+    input_tokens, output_tokens, cached_tokens (usage_metadata가 없으면 None)
+    parse(direct|repaired|failed), parse_sec, fallbacks, error
+
+호출 경로(llm_pool, decision_schema, agent)는 annotate()로 현재 호출의 기록에 값을 채웁니다.
+기록은 contextvar로 전달되므로 asyncio.wait_for/hedged가 만든 하위 태스크에서도 같은 기록을 채웁니다.
+ttfb_sec는 스트리밍을 쓰지 않으므로 응답 객체를 받기까지의 시간(= call_sec)입니다.
+
+요약:
+    python -m llm_trace --dir traces --by agent
+    python -m llm_trace --dir traces --by prompt_hash --sort latency_sec --top 20
+"""
+
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from prompt_builder import estimate_tokens
+
+DEFAULT_METRICS = ("latency_sec", "queue_wait_sec", "call_sec", "input_tokens", "output_tokens", "parse_sec")
+DEFAULT_PERCENTILES = (0.5, 0.95, 0.99)
+
+_current = ContextVar("llm_trace_record", default=None)
+
+
+class TraceWriter:
+    """세그먼트 파일이 max_segment_bytes를 넘으면 새 파일로 넘어가는 append-only 기록기."""
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._seq = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        self._seq += 1
+        name = f"llm_trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._seq:04d}.jsonl"
+        self._file = open(os.path.join(self.directory, name), "a", encoding="utf-8")
+        self._size = 0
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None or self._size >= self.max_segment_bytes:
+                self._open_segment()
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line.encode("utf-8"))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_writer = None
+
+
+def get_trace_writer():
+    """LLM_TRACE_DIR이 없으면 None (추적 꺼짐). LLM_TRACE_SEGMENT_MB로 세그먼트 크기 조정."""
+    global _writer
+    directory = os.getenv("LLM_TRACE_DIR")
+    if not directory:
+        return None
+    if _writer is None or _writer.directory != directory:
+        _writer = TraceWriter(directory, int(float(os.getenv("LLM_TRACE_SEGMENT_MB", "64")) * 1024 * 1024))
+    return _writer
+
+
+def prompt_hash(prompt: str, system_instruction: str = None) -> str:
+    digest = hashlib.sha256()
+    digest.update((system_instruction or "").encode("utf-8"))
+    digest.update(b"\0")
+    digest.update((prompt or "").encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+@contextlib.contextmanager
+def traced_call(prompt: str = "", system_instruction: str = None, **fields):
+    """
+    with traced_call(...) 블록 안의 LLM 호출 하나를 기록합니다. 추적이 꺼져 있으면 아무것도 하지 않습니다.
+    블록을 빠져나갈 때 전체 지연(latency_sec)을 채워 한 줄로 씁니다.
+    """
+    writer = get_trace_writer()
+    if writer is None:
+        yield None
+        return
+    text = f"{system_instruction or ''}{prompt or ''}"
+    record = {
+        "ts": time.time(),
+        **fields,
+        "prompt_hash": prompt_hash(prompt, system_instruction),
+        "prompt_chars": len(text),
+        "prompt_tokens_est": estimate_tokens(text),
+        "cache_hit": False,
+        "llm_calls": 0,
+        "queue_wait_sec": None,
+        "ttfb_sec": None,
+        "call_sec": None,
+        "input_tokens": None,
+        "output_tokens": None,
+        "cached_tokens": None,
+        "parse": None,
+        "parse_sec": None,
+        "fallbacks": 0,
+        "error": None,
+    }
+    token = _current.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["latency_sec"] = time.perf_counter() - started
+        _current.reset(token)
+        writer.write(record)
+
+
+def annotate(**fields):
+    """현재 추적 중인 호출 기록에 값을 덮어씁니다. (추적 중이 아니면 무시)"""
+    record = _current.get()
+    if record is not None:
+        record.update(fields)
+
+
+def increment(field: str, amount=1):
+    record = _current.get()
+    if record is not None:
+        record[field] = (record.get(field) or 0) + amount
+
+
+def record_usage(response):
+    """genai 응답의 usage_metadata에서 토큰 수를 옮깁니다. (HTTP 스탠드인 등 없는 경우 None 유지)"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    annotate(
+        input_tokens=getattr(usage, "prompt_token_count", None),
+        output_tokens=getattr(usage, "candidates_token_count", None),
+        cached_tokens=getattr(usage, "cached_content_token_count", None),
+    )
+
+
+# --- 조회 ---
+def load_traces(directory: str, since: float = None) -> list:
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory, "llm_trace-*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if since is None or record.get("ts", 0) >= since:
+                    records.append(record)
+    return records
+
+
+def summarize(records: list, by=("agent",), metrics=DEFAULT_METRICS, percentiles=DEFAULT_PERCENTILES,
+              sort: str = "latency_sec") -> dict:
+    """
+    by 필드 조합별로 지표의 합계/퍼센타일과 호출 수, Fallback/캐시 적중 비율을 계산합니다.
+    결과는 sort 지표의 합계가 큰 그룹부터 정렬된 dict입니다. (지연/비용을 주도하는 에이전트/프롬프트 찾기)
+    """
+    from llm_pool import percentile  # llm_pool이 이 모듈을 import하므로 순환 import를 피해 지연 import
+
+    if isinstance(by, str):
+        by = (by,)
+    groups = {}
+    for record in records:
+        key = "|".join(str(record.get(field)) for field in by)
+        groups.setdefault(key, []).append(record)
+
+    summary = {}
+    for key, rows in groups.items():
+        row_summary = {
+            "count": len(rows),
+            "fallback_rate": sum(1 for r in rows if r.get("fallbacks")) / len(rows),
+            "cache_hit_rate": sum(1 for r in rows if r.get("cache_hit")) / len(rows),
+            "llm_calls": sum(r.get("llm_calls") or 0 for r in rows),
+        }
+        for metric in metrics:
+            values = [r[metric] for r in rows if isinstance(r.get(metric), (int, float))]
+            row_summary[metric] = {"sum": sum(values), **{f"p{int(q * 100)}": percentile(values, q) for q in percentiles}}
+        summary[key] = row_summary
+    return dict(sorted(summary.items(), key=lambda item: -item[1].get(sort, {}).get("sum", 0)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM 호출 추적 로그 퍼센타일 요약")
+    parser.add_argument("--dir", default=os.getenv("LLM_TRACE_DIR", "llm_traces"))
+    parser.add_argument("--by", default="agent", help="쉼표로 구분한 그룹 필드 (예: sim_id,agent / prompt_hash)")
+    parser.add_argument("--sort", default="latency_sec")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    result = summarize(load_traces(args.dir), by=tuple(args.by.split(",")), sort=args.sort)
+    for key, row in list(result.items())[:args.top]:
+        latency = row["latency_sec"]
+        print(f"{key:<30} n={row['count']:<6} p50={latency['p50']:.2f}s p95={latency['p95']:.2f}s "
+              f"p99={latency['p99']:.2f}s in_tok={row['input_tokens']['sum']:<8} out_tok={row['output_tokens']['sum']:<8} "
+              f"fallback={row['fallback_rate']:.1%} cache={row['cache_hit_rate']:.1%}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
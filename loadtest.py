@@ -0,0 +1,171 @@
+# loadtest.py
+"""
+api_main 종단 간 부하 테스트: 시뮬레이션 생성 -> (get_choices -> execute_turn) x 턴 수 를
+여러 시뮬레이션이 동시에 반복하고, 엔드포인트별 처리량과 p50/p99 지연을 보고합니다.
+
+한 대의 오프라인 리눅스 머신에서 바로 돌릴 수 있습니다.
+    # 스탠드인 LLM 서버를 같이 띄우고, api_main은 프로세스 내(ASGI)로 호출
+    python -m loadtest --sims 50 --turns 5 --standin --latency-median 2 --latency-p99 8 --error-rate 0.02
+    # 이미 떠 있는 서버(uvicorn api_main:app)를 대상으로
+    python -m loadtest --base-url http://127.0.0.1:8000 --sims 20
+
+get_choices 지연에는 llm_pool의 동시성/속도 제한 대기도 포함됩니다.
+스탠드인 서버 자체의 한계를 보려면 LLM_REQUESTS_PER_MINUTE / LLM_MAX_CONCURRENCY를 함께 조정하세요.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from llm_pool import percentile
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed: float, turns_completed: int) -> dict:
+        endpoints = {}
+        for endpoint, samples in self.latencies.items():
+            endpoints[endpoint] = {
+                "count": len(samples),
+                "errors": self.errors.get(endpoint, 0),
+                "throughput_per_sec": len(samples) / elapsed if elapsed > 0 else 0.0,
+                "p50_sec": percentile(samples, 0.50),
+                "p99_sec": percentile(samples, 0.99),
+                "max_sec": max(samples),
+            }
+        return {
+            "elapsed_sec": elapsed,
+            "turns_completed": turns_completed,
+            "turns_per_sec": turns_completed / elapsed if elapsed > 0 else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+def _simulation_config(sim_index: int, n_companies: int, turns: int, batched: bool = False) -> dict:
+    companies = [{
+        "name": f"C{i}",
+        "persona": "수익 극대화" if i % 2 == 0 else "점유율 우선",
+        "initial_unit_cost": 100,
+        "initial_market_share": 0.8 / n_companies,
+        "initial_product_quality": 50.0 + i,
+        "initial_brand_awareness": 50.0,
+    } for i in range(n_companies)]
+    return {"companies": companies, "total_turns": turns, "batched_prompting": batched,
+            "market_size": 10000, "initial_capital": 1000000}
+
+
+async def _timed(stats: LoadStats, endpoint: str, request):
+    started = time.perf_counter()
+    ok = False
+    try:
+        response = await request
+        ok = response.status_code < 400
+        return response if ok else None
+    except Exception:
+        return None
+    finally:
+        stats.record(endpoint, time.perf_counter() - started, ok)
+
+
+async def _run_simulation(client, stats: LoadStats, sim_index: int, n_companies: int, turns: int,
+                          batched: bool = False) -> int:
+    config = _simulation_config(sim_index, n_companies, turns, batched)
+    response = await _timed(stats, "create", client.post("/simulations", json=config))
+    if response is None:
+        return 0
+    sim_id = response.json()["simulation_id"]
+
+    completed = 0
+    for _ in range(turns):
+        response = await _timed(stats, "get_choices", client.post(f"/simulations/{sim_id}/get_choices", json={}))
+        if response is None:
+            break
+        decisions = {}
+        for name, choices in response.json().items():
+            best = max(choices, key=lambda c: c.get("probability", 0))
+            decisions[name] = {**best["decision"], "reasoning": best.get("reasoning", "")}
+        response = await _timed(stats, "execute_turn",
+                                client.post(f"/simulations/{sim_id}/execute_turn", json={"decisions": decisions}))
+        if response is None:
+            break
+        completed += 1
+    return completed
+
+
+async def run_load_test(client, sims: int, turns: int, n_companies: int, batched: bool = False) -> dict:
+    stats = LoadStats()
+    started = time.perf_counter()
+    completed = await asyncio.gather(*(_run_simulation(client, stats, i, n_companies, turns, batched)
+                                       for i in range(sims)))
+    return stats.report(time.perf_counter() - started, sum(completed))
+
+
+async def _main_async(args) -> dict:
+    import httpx
+
+    timeout = httpx.Timeout(args.timeout)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+            return await run_load_test(client, args.sims, args.turns, args.companies, args.batched)
+
+    # 프로세스 내 실행: api_main을 ASGI로 직접 호출 (네트워크/uvicorn 불필요)
+    import api_main
+    transport = httpx.ASGITransport(app=api_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+        return await run_load_test(client, args.sims, args.turns, args.companies, args.batched)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="api_main 종단 간 부하 테스트")
+    parser.add_argument("--base-url", help="대상 서버 주소. 생략하면 api_main을 프로세스 내에서 호출")
+    parser.add_argument("--sims", type=int, default=10, help="동시에 진행할 시뮬레이션 수")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--companies", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--batched", action="store_true", help="batched_prompting 시뮬레이션으로 실행 (턴당 LLM 호출 1회)")
+    parser.add_argument("--standin", action="store_true", help="로컬 스탠드인 LLM 서버를 띄우고 LLM_BACKEND=http로 실행")
+    parser.add_argument("--latency-median", type=float, default=1.0)
+    parser.add_argument("--latency-p99", type=float, default=4.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="결과를 저장할 JSON 경로")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.standin:
+        from llm_standin import StandInConfig, start_standin
+        server, url = start_standin(config=StandInConfig(args.latency_median, args.latency_p99, args.error_rate))
+        # 프로세스 내 실행일 때만 의미가 있음 (외부 서버는 자체 환경 변수를 사용)
+        os.environ["LLM_BACKEND"] = "http"
+        os.environ["LLM_HTTP_URL"] = url
+        print(f"🧪 [LoadTest] 스탠드인 LLM 서버: {url}")
+
+    try:
+        result = asyncio.run(_main_async(args))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print(f"=== 📈 {args.sims} sims x {args.turns} turns: {result['turns_completed']} turns in "
+          f"{result['elapsed_sec']:.1f}s ({result['turns_per_sec']:.2f} turns/s) ===")
+    for endpoint, row in result["endpoints"].items():
+        print(f"  {endpoint:<13} n={row['count']:<5} err={row['errors']:<4} "
+              f"p50={row['p50_sec'] * 1000:8.1f}ms  p99={row['p99_sec'] * 1000:8.1f}ms  "
+              f"({row['throughput_per_sec']:.2f}/s)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return result
+
+
+if __name__ == "__main__":
+    main()
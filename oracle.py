@@ -0,0 +1,196 @@
+# oracle.py
+"""
+한 회사의 최적 제어(oracle) 플래너: 에이전트 전략이 달성 가능한 이익에서 얼마나 떨어져 있는지(regret) 측정.
+
+다른 회사의 정책은 고정하고, 한 회사의 결정 시퀀스(가격, 브랜드/판촉 배분, 혁신/효율 R&D 배분)를
+BatchMarket 위에서 빔 서치로 찾습니다.
+    - 후보 행동은 예산 대비 비율(마케팅/R&D)과 원가 대비 가격 배수로 정의되므로 매 턴 그 행의
+      max_marketing_budget / max_rd_budget 을 넘지 않습니다.
+    - 후보마다 같은 행동을 남은 턴 동안 유지하는 롤아웃(MPC식 평가)으로 점수를 매기고, 상위 beam_width개만 남깁니다.
+    - 모든 후보/롤아웃은 턴마다 배치 step 몇 번으로 평가합니다.
+
+모드
+    hindsight: 생성 시점 스냅샷에서 다시 재생. 다른 회사는 실제로 내린 결정을, 주입된 이벤트는 같은 턴에 재현.
+               실제 에이전트 경로를 빔에 항상 남겨 두므로 oracle 이익 >= 에이전트 이익 (regret >= 0)
+    forward:   현재 상태에서 남은 턴. 다른 회사는 지난 턴 결정을 유지
+"""
+
+import itertools
+import time
+
+import numpy as np
+
+from batch_sim import BatchMarket, _held_decision
+from speculation import DECISION_FIELDS
+
+ORACLE_MODES = ("hindsight", "forward")
+PRICE_MARKUPS = (1.05, 1.15, 1.3, 1.5, 1.8, 2.2, 2.8)
+# (예산 사용 비율, 브랜드 비중) / (예산 사용 비율, 혁신 비중)
+MARKETING_SPLITS = ((0.0, 0.0), (0.5, 1.0), (0.5, 0.0), (1.0, 1.0), (1.0, 0.0), (1.0, 0.5))
+RD_SPLITS = ((0.0, 0.0), (1.0, 1.0), (1.0, 0.0), (1.0, 0.5))
+
+
+def action_grid(markups=PRICE_MARKUPS, marketing=MARKETING_SPLITS, rd=RD_SPLITS) -> np.ndarray:
+    """[행동, 5] = (가격 배수, 마케팅 비율, 브랜드 비중, R&D 비율, 혁신 비중)"""
+    return np.array([(m, mk, mb, r, ri) for m, (mk, mb), (r, ri) in itertools.product(markups, marketing, rd)])
+
+
+def _company_decisions(batch: BatchMarket, idx: int, actions: np.ndarray) -> np.ndarray:
+    """행동(비율) -> 그 행의 현재 원가/예산 기준 절대 결정 [행, 5]"""
+    price = np.round(actions[:, 0] * batch.unit_cost[:, idx])
+    marketing = np.floor(actions[:, 1] * batch.max_marketing_budget[:, idx])
+    rd = np.floor(actions[:, 3] * batch.max_rd_budget[:, idx])
+    brand = np.floor(marketing * actions[:, 2])
+    inno = np.floor(rd * actions[:, 4])
+    return np.stack([price, brand, marketing - brand, inno, rd - inno], axis=1)
+
+
+def _history_decision(row: dict, name: str) -> list:
+    return [float(row.get(f"{name}_{field}", 0) or 0) for field in DECISION_FIELDS]
+
+
+class OraclePlanner:
+    def __init__(self, start_market, company: str, turns: int, others_decisions, reference=None,
+                 extra_events=(), beam_width: int = 8, actions: np.ndarray = None):
+        """
+        start_market: 계획을 시작할 MarketSimulator (읽기만 함)
+        others_decisions(t) -> [AI 회사, 5] 배열 (t번째 턴의 모든 AI 결정, company 칸은 덮어씀)
+        reference: 빔에 항상 남겨 둘 company의 결정 시퀀스 [turns, 5] (hindsight의 실제 경로)
+        extra_events: [(start_step, Event)] 스냅샷 이후 주입된 이벤트
+        """
+        self.market = start_market
+        self.company = company
+        self.idx = start_market.ai_company_names.index(company)
+        self.col = start_market.all_company_names.index(company)
+        self.turns = turns
+        self.others_decisions = others_decisions
+        self.reference = None if reference is None else np.asarray(reference, dtype=float)
+        self.extra_events = list(extra_events)
+        self.beam_width = beam_width
+        self.actions = action_grid() if actions is None else actions
+        self.rollouts = 0
+
+    def _fork(self, rows: int) -> BatchMarket:
+        batch = BatchMarket(self.market, rows)
+        for start, event in self.extra_events:
+            batch.add_event(event, start)
+        return batch
+
+    def _step(self, batch: BatchMarket, t: int, company_decisions: np.ndarray) -> dict:
+        decisions = np.repeat(self.others_decisions(t)[None, :, :], batch.batch_size, axis=0)
+        decisions[:, self.idx, :] = company_decisions
+        return batch.step(decisions)
+
+    def _rollout_scores(self, batch: BatchMarket, t: int, action_idx: np.ndarray) -> np.ndarray:
+        """t턴까지 진행된 후보들을 같은 행동으로 끝까지 진행했을 때의 누적 이익"""
+        rollout = batch.take(np.arange(batch.batch_size))
+        for future in range(t + 1, self.turns):
+            self._step(rollout, future, _company_decisions(rollout, self.idx, self.actions[action_idx]))
+        self.rollouts += batch.batch_size
+        return rollout.accumulated_profit[:, self.col]
+
+    def _reference_path(self) -> dict:
+        batch = self._fork(1)
+        path = []
+        for t in range(self.turns):
+            out = self._step(batch, t, self.reference[t][None, :])
+            path.append(self._entry(batch, out, 0, self.reference[t]))
+        return {"accumulated_profit": float(batch.accumulated_profit[0, self.col]), "trajectory": path}
+
+    def _entry(self, batch, out, row, decision) -> dict:
+        return {
+            "turn": batch.turn,
+            "decision": {field: int(v) for field, v in zip(DECISION_FIELDS, decision)},
+            "market_share": float(out["market_share"][row, self.col]),
+            "profit": float(out["profit"][row, self.col]),
+            "accumulated_profit": float(batch.accumulated_profit[row, self.col]),
+        }
+
+    def plan(self) -> dict:
+        started = time.perf_counter()
+        n_actions = len(self.actions)
+        beam = self._fork(1)
+        paths = [[]]
+        on_reference = np.array([self.reference is not None])  # 빔 행이 실제 에이전트 경로인지
+
+        for t in range(self.turns):
+            parents = np.repeat(np.arange(beam.batch_size), n_actions)
+            action_idx = np.tile(np.arange(n_actions), beam.batch_size)
+            # 실제 경로 행에서는 실제 결정 후보 하나를 추가
+            ref_parents = np.flatnonzero(on_reference)
+            parents = np.concatenate([parents, ref_parents])
+            action_idx = np.concatenate([action_idx, np.zeros(len(ref_parents), dtype=int)])
+            ref_rows = np.arange(len(parents) - len(ref_parents), len(parents))
+
+            candidates = beam.take(parents)
+            decisions = _company_decisions(candidates, self.idx, self.actions[action_idx])
+            if len(ref_rows):
+                decisions[ref_rows] = self.reference[t]
+            out = self._step(candidates, t, decisions)
+            scores = self._rollout_scores(candidates, t, action_idx)
+
+            keep = np.argsort(-scores)[:self.beam_width]
+            missing = np.setdiff1d(ref_rows, keep)
+            if len(missing):
+                keep = np.concatenate([keep[:self.beam_width - len(missing)], missing])
+            is_ref = np.zeros(len(parents), dtype=bool)
+            is_ref[ref_rows] = True
+            paths = [paths[parents[row]] + [self._entry(candidates, out, row, decisions[row])] for row in keep]
+            on_reference = is_ref[keep]
+            beam = candidates.take(keep)
+
+        best = int(np.argmax(beam.accumulated_profit[:, self.col]))
+        elapsed = time.perf_counter() - started
+        return {
+            "accumulated_profit": float(beam.accumulated_profit[best, self.col]),
+            "trajectory": paths[best],
+            "rollouts": self.rollouts,
+            "elapsed_sec": round(elapsed, 3),
+            "rollouts_per_sec": round(self.rollouts / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+def hindsight_oracle(initial_market, market, company: str, beam_width: int = 8) -> dict:
+    """
+    initial_market(생성 시점 스냅샷)에서 market의 실제 진행 턴 수만큼 다시 재생하며 company만 최적화합니다.
+    regret = oracle 누적 이익 - 에이전트 누적 이익 (둘 다 같은 재생 위에서 계산)
+    """
+    history = market.history[len(initial_market.history):]
+    turns = len(history)
+    if turns == 0:
+        raise ValueError("No turns played yet")
+    names = market.ai_company_names
+    played = np.array([[_history_decision(row, n) for n in names] for row in history])
+    reference = played[:, names.index(company), :]
+    # 스냅샷 이후 주입된 이벤트: turn τ에 주입 -> (τ - 시작 turn + 1)번째 step부터 적용
+    events = [(injected - initial_market.turn + 1, event)
+              for injected, event in market.event_log[len(initial_market.event_log):]]
+
+    planner = OraclePlanner(initial_market, company, turns, lambda t: played[t], reference=reference,
+                            extra_events=events, beam_width=beam_width)
+    oracle = planner.plan()
+    agent = planner._reference_path()
+    agent["actual_accumulated_profit"] = market.companies[company]["accumulated_profit"]
+    return _report(company, "hindsight", turns, oracle, agent)
+
+
+def forward_oracle(market, company: str, beam_width: int = 8) -> dict:
+    """현재 상태에서 남은 턴 동안의 최적 계획. 다른 회사는 지난 턴 결정을 유지합니다."""
+    turns = market.config.get("total_turns", 30) - market.turn
+    if turns <= 0:
+        raise ValueError("Simulation has ended")
+    held = np.array([_held_decision(market, n) for n in market.ai_company_names])
+    planner = OraclePlanner(market, company, turns, lambda t: held, beam_width=beam_width)
+    oracle = planner.plan()
+    return _report(company, "forward", turns, oracle, None)
+
+
+def _report(company: str, mode: str, turns: int, oracle: dict, agent: dict) -> dict:
+    report = {"company": company, "mode": mode, "turns": turns, "oracle": oracle}
+    if agent is not None:
+        regret = oracle["accumulated_profit"] - agent["accumulated_profit"]
+        base = abs(oracle["accumulated_profit"]) or 1.0
+        report.update({"agent": agent, "regret": regret, "regret_pct": regret / base})
+    print(f"🧭 [Oracle] {company} {mode} {turns}턴: oracle={oracle['accumulated_profit']:,.0f} "
+          f"({oracle['rollouts']} rollouts, {oracle['rollouts_per_sec']}/s)")
+    return report
@@ -0,0 +1,435 @@
+# prompt_builder.py
+"""
+AIAgent.decide_action용 프롬프트 빌더.
+
+- 정적 부분(목표/물리 법칙/응답 형식 + 페르소나)은 system_instruction으로 분리합니다.
+  매 턴 바이트 단위로 같은 접두사가 되므로 Gemini의 암시적 컨텍스트 캐시에 걸리고,
+  LLM 응답 캐시 키에도 그대로 포함됩니다.
+- 턴마다 바뀌는 시장 정보는 TurnProjection으로 시뮬레이션당 한 번만 계산하고,
+  에이전트별로는 '내 비공개 정보'만 덧붙입니다. (전쟁 안개 규칙을 last_turn_results에도 적용)
+- JSON은 들여쓰기 없이 직렬화하고, PROMPT_TOKEN_BUDGET을 넘으면 덜 중요한 정보부터 줄입니다.
+"""
+
+import json
+import os
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+
+# 경쟁사에게는 숨기는 정보 (예산, 원가, 누적 이익, 비밀 R&D 진행 상황)
+HIDDEN_OPPONENT_FIELDS = (
+    "max_marketing_budget",
+    "max_rd_budget",
+    "unit_cost",
+    "accumulated_profit",
+    "profit",
+    "accumulated_rd_innovation_point",
+    "accumulated_rd_efficiency_point",
+)
+# 에이전트가 참고할 필요가 있는 설정값만 공개 (physics, initial_configs 등은 제외)
+PUBLIC_CONFIG_KEYS = ("total_turns", "market_size")
+# 토큰 예산이 부족할 때 경쟁사 지난 턴 결과에서 끝까지 남길 항목
+ESSENTIAL_RESULT_FIELDS = ("price", "market_share")
+# 레벨 2로도 예산을 넘을 때 내 회사 스냅샷에서 빼는 순서 (모두 D/E 리포트에 같은 값이 있음)
+OWN_FIELD_DROP_ORDER = ("accumulated_rd_efficiency_point", "accumulated_rd_innovation_point",
+                        "accumulated_profit", "max_rd_budget", "max_marketing_budget")
+# 그다음 리포트 섹션을 빼는 순서 (D. 예산 제약은 끝까지 남김)
+SECTION_DROP_ORDER = ("# [A.", "# [C.", "# [B.", "# [E.")
+# 최후 수단: CFO/예산 섹션은 앞의 몇 줄(경고 제목, 예산 한도)만 남김
+BRIEF_LINES = {"cfo": 2, "budget": 4}
+
+GAME_RULES = """
+# [1. 당신의 최종 목표]
+당신의 목표는 경쟁사를 이기고 시뮬레이션 종료 시 **'누적 이익(accumulated_profit)'을 극대화**하는 것입니다.
+
+# [5. 새로운 시장 물리 법칙 (Phase 1: 축적과 물리 엔진)]
+당신은 불확실한 도박이 아닌, **'축적의 시간'**을 보내고 있습니다.
+
+* **법칙 1: 자산 감가상각 (Asset Decay)**
+    * 품질(Quality)과 브랜드(Brand)는 가만히 있으면 매 턴 하락(Decay)합니다.
+    * 현상 유지를 위해서라도 꾸준한 투자가 필요합니다.
+
+* **법칙 2: R&D 누적 (Accumulation System)**
+    * R&D는 마일스톤(목표 금액)을 달성할 때까지 투자를 '누적'해야 합니다.**
+    * [E. R&D 프로젝트 진행 현황]을 참고하여, 조금씩 꾸준히 투자할지, 아니면 한 번에 큰돈을 부어 기술 격차를 벌릴지 결정하십시오.
+    * `rd_innovation_spend`: 품질 향상 프로젝트에 누적됩니다. (제품 경쟁력 상승)
+    * `rd_efficiency_spend`: 원가 절감 프로젝트에 누적됩니다. (이익률 개선)
+
+* **법칙 3: 마케팅 효율 (Marketing Physics)**
+    * 마케팅은 브랜드 자산을 쌓습니다.
+    * `marketing_brand_spend`: 장기적인 브랜드 인지도를 높입니다.
+    * `marketing_promo_spend`: 이번 턴에만 적용되는 가격 할인(판촉) 효과를 냅니다.
+
+* **법칙 4: 하이브리드 예산**
+    * R&D 예산은 '총자본'에서 나오므로 장기적인 계획이 가능합니다.
+    * 마케팅 예산은 '분기 이익'에서 나오므로 실적이 나쁘면 예산이 삭감됩니다.
+
+매 턴 주어지는 [3. 시장 상황]과 [4. 성과 및 제약 리포트]를 바탕으로, [2. 페르소나]에 맞춰 4가지 지출 항목에 예산을 현명하게 배분하십시오.
+""".strip()
+
+RESPONSE_FORMAT = """
+# [6. 응답 형식]
+반드시 3가지의 논리적인 전략적 선택지를 포함한 JSON 배열 형식으로 응답해야 합니다.
+각 선택지는 'reasoning', 'probability', 'decision' 키를 포함해야 합니다.
+'probability'의 총합은 1.0이어야 합니다.
+예시는 다음과 같습니다.
+[
+    {
+        "reasoning": "경쟁사의 기술 추격을 따돌리기 위해 혁신 R&D에 집중 투자하여 마일스톤을 달성합니다.",
+        "probability": 0.6,
+        "decision": {"price": 20000, "marketing_brand_spend": 1000000, "marketing_promo_spend": 0, "rd_innovation_spend": 3000000, "rd_efficiency_spend": 0}
+    },
+    {
+        "reasoning": "R&D 투자를 잠시 줄이고 마케팅 판촉에 집중하여 단기 점유율을 방어합니다.",
+        "probability": 0.4,
+        "decision": {"price": 19000, "marketing_brand_spend": 2000000, "marketing_promo_spend": 1500000, "rd_innovation_spend": 500000, "rd_efficiency_spend": 0}
+    }
+]
+""".strip()
+
+STATIC_RULES = f"{GAME_RULES}\n\n{RESPONSE_FORMAT}"
+
+# 배치 모드: 한 번의 호출로 여러 회사의 CEO 역할을 각각 수행
+BATCH_RESPONSE_FORMAT = """
+# [6. 응답 형식 (여러 회사 동시 결정)]
+당신은 아래 [2. 페르소나]에 나온 각 회사의 CEO 역할을 **회사별로 독립적으로** 수행합니다.
+다른 회사의 비공개 정보([회사: X] 섹션)는 그 회사의 결정에만 사용하고, 다른 회사의 결정에 활용하지 마십시오.
+반드시 회사 이름을 키로 하는 하나의 JSON 객체로 응답하십시오. 각 값은 단일 회사 응답과 같은 형식의 선택지 3개 배열입니다.
+{
+    "회사이름": [
+        {"reasoning": "...", "probability": 0.6, "decision": {"price": 20000, "marketing_brand_spend": 1000000, "marketing_promo_spend": 0, "rd_innovation_spend": 3000000, "rd_efficiency_spend": 0}},
+        ...
+    ],
+    ...
+}
+""".strip()
+
+
+def _round_value(value):
+    if isinstance(value, bool) or not isinstance(value, float):
+        return value
+    if abs(value) >= 1000:
+        return int(round(value))
+    if abs(value) >= 1:
+        return round(value, 2)
+    return round(value, 4)
+
+
+def _rounded(obj):
+    if isinstance(obj, dict):
+        return {k: _rounded(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_rounded(v) for v in obj]
+    return _round_value(obj)
+
+
+def compact_json(obj) -> str:
+    """들여쓰기/공백 없이, 숫자는 의미 있는 자릿수만 남겨 직렬화합니다."""
+    return json.dumps(_rounded(obj), ensure_ascii=False, separators=(",", ":"))
+
+
+def estimate_tokens(text: str) -> int:
+    """토크나이저 없이 쓰는 보수적 추정치: ASCII는 4글자당 1토큰, 한글 등 비ASCII는 글자당 1토큰."""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def build_system_instruction(persona: str) -> str:
+    """에이전트별로 턴이 바뀌어도 변하지 않는 접두사 (규칙 + 페르소나)."""
+    return f"{STATIC_RULES}\n\n# [2. 당신의 전략적 성향 (페르소나)]\n**{persona}**"
+
+
+def build_batch_system_instruction(personas: dict) -> str:
+    """배치 모드용 접두사. 회사 목록과 페르소나가 바뀌지 않는 한 턴마다 동일합니다."""
+    persona_lines = "\n".join(f"* **{name}**: {persona}" for name, persona in personas.items())
+    return f"{GAME_RULES}\n\n{BATCH_RESPONSE_FORMAT}\n\n# [2. 회사별 전략적 성향 (페르소나)]\n{persona_lines}"
+
+
+class TurnProjection:
+    """
+    한 턴의 시장 상태를 에이전트 공통 '공개 정보'로 한 번만 투영합니다.
+    last_turn_results의 "회사명_항목" 평면 키도 회사별로 묶어 둡니다.
+    """
+
+    def __init__(self, market_state: dict):
+        self.turn = market_state.get("turn")
+        config = market_state.get("config", {}) or {}
+        self.config = {k: config[k] for k in PUBLIC_CONFIG_KEYS if k in config}
+        self.events = list(market_state.get("active_events", []))
+
+        companies = market_state.get("companies", {})
+        self.private_companies = {name: dict(data) for name, data in companies.items()}
+        self.public_companies = {
+            name: {k: v for k, v in data.items() if k not in HIDDEN_OPPONENT_FIELDS and k != "market_share"}
+            for name, data in companies.items()
+        }
+
+        self.private_results = {}
+        last = market_state.get("last_turn_results") or {}
+        # 이름이 다른 이름의 접두사일 수 있으므로 긴 이름부터 매칭
+        names = sorted(companies.keys(), key=len, reverse=True)
+        for key, value in last.items():
+            for name in names:
+                if key.startswith(name + "_"):
+                    self.private_results.setdefault(name, {})[key[len(name) + 1:]] = value
+                    break
+        self.public_results = {
+            name: {k: v for k, v in fields.items() if k not in HIDDEN_OPPONENT_FIELDS and k != "unit_cost"}
+            for name, fields in self.private_results.items()
+        }
+
+    def private_for(self, agent_name: str) -> dict:
+        """배치 모드에서 회사별 섹션에 붙이는 비공개 정보 (내 회사 상태 + 내 지난 턴 결과)."""
+        mine = dict(self.private_companies.get(agent_name, {}))
+        mine.pop("market_share", None)
+        return {"company": mine, "last_turn": self.private_results.get(agent_name, {})}
+
+    def snapshot_for(self, agent_name: str, level: int = 0) -> dict:
+        """
+        agent_name 시점의 시장 스냅샷. level이 올라갈수록 덜 중요한 정보를 줄입니다.
+        agent_name이 None이면 모든 회사를 공개 정보로만 보여 줍니다. (배치 모드의 공통 부분)
+            0: 전체 / 1: 경쟁사 지난 턴 결과는 가격·점유율만 / 2: 이벤트 생략, 지난 턴 결과는 가격·점유율만
+        """
+        companies = {}
+        for name in self.public_companies:
+            if name == agent_name:
+                mine = dict(self.private_companies[name])
+                # 내 정보에서는 점유율만 제거 (결과로 확인하므로)
+                mine.pop("market_share", None)
+                companies[name] = mine
+            else:
+                companies[name] = self.public_companies[name]
+
+        results = {}
+        for name, fields in self.private_results.items():
+            if name == agent_name and level < 2:
+                results[name] = fields
+            elif level == 0:
+                results[name] = self.public_results[name]
+            else:
+                results[name] = {k: fields[k] for k in ESSENTIAL_RESULT_FIELDS if k in fields}
+
+        snapshot = {"turn": self.turn, "config": self.config, "companies": companies}
+        if self.events and level < 2:
+            snapshot["active_events"] = self.events
+        if results:
+            snapshot["last_turn_results"] = results
+        return snapshot
+
+
+def _drop_order(entries: dict, keep: str = None) -> list:
+    """뒤쪽(Others 등)부터, keep은 맨 마지막"""
+    names = [name for name in reversed(list(entries)) if name != keep]
+    return names + ([keep] if keep in entries else [])
+
+
+def _budget_reductions(snapshot: dict, keep: str = None):
+    """
+    레벨 2로도 예산을 넘을 때 쓸 (스냅샷 JSON, 뺄 섹션 접두사, 요약 여부) 후보를 덜 중요한 정보부터 줄여 가며 만듭니다.
+    스냅샷은 항목(키/회사) 단위로만 빼므로 항상 올바른 JSON입니다. keep은 끝까지 남길 내 회사 (배치 공통 스냅샷은 None)
+    """
+    snapshot = json.loads(json.dumps(snapshot))
+    for key in ("config", "active_events"):
+        if snapshot.pop(key, None) is not None:
+            yield compact_json(snapshot), (), False
+    results = snapshot.get("last_turn_results", {})
+    for name in _drop_order(results, keep):
+        del results[name]
+        yield compact_json(snapshot), (), False
+    snapshot.pop("last_turn_results", None)
+    companies = snapshot.get("companies", {})
+    for name in _drop_order(companies, keep):
+        if name != keep:
+            del companies[name]
+            yield compact_json(snapshot), (), False
+            continue
+        for field in OWN_FIELD_DROP_ORDER:
+            if companies[name].pop(field, None) is not None:
+                yield compact_json(snapshot), (), False
+    minimal = compact_json(snapshot)
+    for i in range(len(SECTION_DROP_ORDER)):
+        yield minimal, SECTION_DROP_ORDER[:i + 1], False
+    yield minimal, SECTION_DROP_ORDER, True
+
+
+def _brief(text: str, lines: int) -> str:
+    return "\n".join(text.split("\n")[:lines])
+
+
+def _fitted_sections(sections: list, dropped: tuple, brief: bool) -> list:
+    kept = [s for s in sections if not s.startswith(dropped)] if dropped else list(sections)
+    if brief:
+        kept = [_brief(s, BRIEF_LINES["budget"]) if s.startswith("# [D.") else s for s in kept]
+    return kept
+
+
+def _report_sections(agent_name: str, market_state: dict, compact_report: bool) -> list:
+    sections = []
+
+    # --- A. 분기 보고서 ---
+    report = market_state.get("quarterly_report")
+    if report:
+        data = report["data"]
+        if compact_report and isinstance(data, dict):
+            data = {name: values for name, values in data.items() if name != "Others"}
+        sections.append(
+            f"# [A. 지난 분기({report['turn_range'][0]}~{report['turn_range'][1]}턴) 재무제표 (공개 정보)]\n"
+            f"{compact_json(data)}"
+        )
+    else:
+        sections.append("# [A. 지난 분기 재무제표]\n(이번 턴에는 분기 보고서가 없습니다. '전쟁 안개' 상태입니다.)")
+
+    # --- B/C. 단기·중기 성과 ---
+    comp = market_state.get("last_turn_comparison")
+    if comp:
+        lines = [f"* 나의 이익: {comp['my_profit']:,.0f}"]
+        if comp.get("my_profit_change") is not None:
+            lines[0] += f" (전 턴 대비 {comp['my_profit_change']:+,.0f})"
+        if comp.get("my_market_share") is not None:
+            change = comp.get("my_market_share_change")
+            lines.append(f"* 나의 점유율: {comp['my_market_share']:.1%}"
+                         + (f" (전 턴 대비 {change * 100:+.1f}%p)" if change is not None else ""))
+        sections.append("# [B. 지난 턴 나의 성과 (단기)]\n" + "\n".join(lines))
+    summary = market_state.get("historical_summary")
+    if summary:
+        sections.append(
+            f"# [C. 최근 {summary['window_size']}턴 나의 평균 이익 (중기 추세)]\n"
+            f"* 나의 평균 이익: {summary['my_avg_profit_4turn']:,.0f}"
+        )
+
+    # --- D. 예산 제약 (하이브리드 예산) ---
+    my_data = market_state.get("companies", {}).get(agent_name, {})
+    sections.append(
+        "# [D. 기업 생존 및 예산 제약 (현실)]\n"
+        f"* (참고) 현재 총 누적 이익(자본): {my_data.get('accumulated_profit', 0):,.0f} 원\n"
+        f"* **최대 R&D 예산 (전략): {my_data.get('max_rd_budget', 500000):,.0f} 원** (매 턴 '총 누적 이익'에 비례해 갱신)\n"
+        f"* **최대 마케팅 예산 (운영): {my_data.get('max_marketing_budget', 1000000):,.0f} 원** (4턴마다 '지난 분기 이익' 기준 갱신)\n"
+        "* 'rd_...' 지출 총합은 '최대 R&D 예산', 'marketing_...' 지출 총합은 '최대 마케팅 예산'을 초과할 수 없습니다.\n"
+        "* 파산(누적 이익 < 0)은 CEO로서 최악의 실패입니다."
+    )
+
+    # --- E. R&D 누적 현황 ---
+    config = market_state.get("config", {}) or {}
+    acc_inno = my_data.get("accumulated_rd_innovation_point", 0)
+    acc_eff = my_data.get("accumulated_rd_efficiency_point", 0)
+    thresh_inno = config.get("rd_innovation_threshold", 5000000)
+    thresh_eff = config.get("rd_efficiency_threshold", 5000000)
+    percent_inno = (acc_inno / thresh_inno * 100) if thresh_inno > 0 else 0
+    percent_eff = (acc_eff / thresh_eff * 100) if thresh_eff > 0 else 0
+    sections.append(
+        "# [E. R&D 프로젝트 진행 현황 (누적 시스템)]\n"
+        f"* 혁신(품질): 누적 {acc_inno:,.0f} / 목표 {thresh_inno:,.0f} ({percent_inno:.1f}%)\n"
+        f"* 효율(원가): 누적 {acc_eff:,.0f} / 목표 {thresh_eff:,.0f} ({percent_eff:.1f}%)\n"
+        "* (목표 금액을 채우면 즉시 품질 향상 또는 원가 절감이 발생하고, 누적 포인트는 차감됩니다.)"
+    )
+    return sections
+
+
+def _cfo_section(agent_name: str, market_state: dict) -> str:
+    my_data = market_state.get("companies", {}).get(agent_name, {})
+    unit_cost = my_data.get("unit_cost", 0)
+    last_results = market_state.get("last_turn_results", {}) or {}
+    last_price = last_results.get(f"{agent_name}_price", unit_cost * 1.1)
+    unit_margin = last_price - unit_cost
+    margin_rate = (unit_margin / last_price * 100) if last_price > 0 else 0
+
+    if unit_margin < 0:
+        return (
+            "🚨 [CFO 긴급 경고: 역마진(Negative Margin) 발생 중!] 🚨\n"
+            f"* 물건을 하나 팔 때마다 {abs(unit_margin):,.0f}원씩 손해입니다. 원가({unit_cost:,.0f}원) > 판매가({last_price:,.0f}원).\n"
+            "* 이 상태가 지속되면 점유율이 높을수록 더 빨리 파산합니다.\n"
+            f"* 즉시 가격을 원가 이상(최소 {unit_cost * 1.05:,.0f}원 권장)으로 인상하십시오."
+        )
+    if margin_rate < 5.0:
+        return (
+            "⚠️ [CFO 경고: 이익률 위험 수준]\n"
+            f"* 현재 대당 마진이 {unit_margin:,.0f}원 ({margin_rate:.1f}%)에 불과합니다.\n"
+            "* 마케팅/R&D 비용을 감당하기에 턱없이 부족합니다. 가격 인상을 고려하십시오."
+        )
+    return (
+        "✅ [CFO 보고: 재무 건전성 양호]\n"
+        f"* 현재 대당 마진: {unit_margin:,.0f}원 ({margin_rate:.1f}%)"
+    )
+
+
+def build_decision_prompt(agent_name: str, persona: str, market_state: dict,
+                          projection: TurnProjection = None, token_budget: int = None):
+    """
+    (system_instruction, prompt)를 반환합니다.
+    projection을 넘기면 시장 스냅샷은 그 공유 투영에서 만들고, market_state에서는 내 정보만 읽습니다.
+    """
+    projection = projection or TurnProjection(market_state)
+    token_budget = token_budget or PROMPT_TOKEN_BUDGET
+    system_instruction = build_system_instruction(persona)
+    fixed_tokens = estimate_tokens(system_instruction)
+    cfo = _cfo_section(agent_name, market_state)
+
+    def assemble(snapshot: str, sections: list, brief: bool = False) -> str:
+        return "\n\n".join([
+            f"# [3. 현재 시장 상황 (실시간 공개 정보)]\n{snapshot}",
+            f"# [3-1. CFO의 재무 분석 리포트 (가장 중요)]\n{_brief(cfo, BRIEF_LINES['cfo']) if brief else cfo}",
+            "# [4. 성과 및 제약 리포트]",
+            *sections,
+        ])
+
+    for level in (0, 1, 2):
+        snapshot = projection.snapshot_for(agent_name, level=level)
+        sections = _report_sections(agent_name, market_state, compact_report=level > 0)
+        prompt = assemble(compact_json(snapshot), sections)
+        if fixed_tokens + estimate_tokens(prompt) <= token_budget:
+            return system_instruction, prompt
+
+    # 최후 수단: 스냅샷 항목 -> 리포트 섹션 순으로 통째로 빼서 예산을 맞춤 (JSON은 자르지 않음)
+    print(f"⚠️ [Prompt] {agent_name} 프롬프트가 토큰 예산({token_budget})을 넘어 시장 스냅샷/리포트를 줄였습니다.")
+    for snapshot_json, dropped, brief in _budget_reductions(snapshot, keep=agent_name):
+        prompt = assemble(snapshot_json, _fitted_sections(sections, dropped, brief), brief)
+        if fixed_tokens + estimate_tokens(prompt) <= token_budget:
+            break
+    else:
+        print(f"⚠️ [Prompt] {agent_name} 최소 프롬프트도 토큰 예산({token_budget})을 넘습니다. (규칙/페르소나만 {fixed_tokens} 토큰)")
+    return system_instruction, prompt
+
+
+def build_batch_prompt(market_states: dict, personas: dict, projection: TurnProjection,
+                       token_budget: int = None):
+    """
+    여러 회사의 결정을 한 번에 요청하는 (system_instruction, prompt).
+    공개 시장 스냅샷은 한 번만 넣고, 회사별로 비공개 정보/CFO/성과 리포트 섹션을 덧붙입니다.
+    토큰 예산은 회사 수만큼 늘어나며(회사당 PROMPT_TOKEN_BUDGET), 넘치면 공통 스냅샷부터 줄입니다.
+    """
+    token_budget = token_budget or PROMPT_TOKEN_BUDGET * max(1, len(personas))
+    system_instruction = build_batch_system_instruction(personas)
+    fixed_tokens = estimate_tokens(system_instruction)
+
+    def company_blocks(compact_report: bool, dropped: tuple = (), brief: bool = False) -> list:
+        blocks = []
+        for name, state in market_states.items():
+            cfo = _cfo_section(name, state)
+            private = projection.private_for(name)
+            if brief:
+                # 지난 턴 결과는 빼고, 리포트에 같은 값이 있는 항목도 뺌
+                private = {"company": {k: v for k, v in private["company"].items() if k not in OWN_FIELD_DROP_ORDER}}
+            blocks.append("\n\n".join([
+                f"## [회사: {name}]",
+                f"### [{name}의 비공개 정보]\n{compact_json(private)}",
+                f"### [3-1. {name} CFO의 재무 분석 리포트]\n{_brief(cfo, BRIEF_LINES['cfo']) if brief else cfo}",
+                *_fitted_sections(_report_sections(name, state, compact_report=compact_report), dropped, brief),
+            ]))
+        return blocks
+
+    def assemble(snapshot: str, blocks: list) -> str:
+        return "\n\n".join([f"# [3. 현재 시장 상황 (공통 공개 정보)]\n{snapshot}", "# [4. 회사별 정보]", *blocks])
+
+    for level in (0, 1, 2):
+        snapshot = projection.snapshot_for(None, level=level)
+        prompt = assemble(compact_json(snapshot), company_blocks(compact_report=level > 0))
+        if fixed_tokens + estimate_tokens(prompt) <= token_budget:
+            return system_instruction, prompt
+
+    print(f"⚠️ [Prompt] 배치 프롬프트가 토큰 예산({token_budget})을 넘어 공통 스냅샷/리포트를 줄였습니다.")
+    for snapshot_json, dropped, brief in _budget_reductions(snapshot):
+        prompt = assemble(snapshot_json, company_blocks(True, dropped, brief))
+        if fixed_tokens + estimate_tokens(prompt) <= token_budget:
+            break
+    else:
+        print(f"⚠️ [Prompt] 최소 배치 프롬프트도 토큰 예산({token_budget})을 넘습니다. (규칙/페르소나만 {fixed_tokens} 토큰)")
+    return system_instruction, prompt
@@ -0,0 +1,207 @@
+# shared_scenario.py
+"""
+벤치마크 시나리오의 숫자 데이터를 공유 메모리(SharedMemory)에 한 번만 올려두고
+프로세스 풀 워커들이 이름으로 붙어서(attach) 읽기 전용으로 쓰게 합니다.
+
+BenchmarkData 전체(turns_data dict, persona, 설명 텍스트)를 작업마다 pickle하던 대신,
+워커에는 작은 spec(공유 메모리 이름, 배열 모양, 회사 이름, config)만 한 번 넘기고
+작업 단위로는 파라미터 배치만 오갑니다.
+"""
+
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
+import numpy as np
+
+# (필드 이름, 위치, 원본 키) - 값이 없으면 NaN으로 저장하고, 되살릴 때 키 자체를 생략합니다.
+COMPANY_FIELDS = (
+    ("price", "inputs", "price"),
+    ("marketing_spend_ratio", "inputs", "marketing_spend_ratio"),
+    ("rd_spend_ratio", "inputs", "rd_spend_ratio"),
+    ("unit_cost", "inputs", "unit_cost"),
+    ("initial_quality", "inputs", "initial_quality"),
+    ("initial_brand", "inputs", "initial_brand"),
+    ("actual_market_share", "outputs", "actual_market_share"),
+    ("actual_profit_margin", "outputs", "actual_profit_margin"),
+    ("actual_accumulated_profit", "outputs", "actual_accumulated_profit"),
+    ("market_share", "company", "market_share"),
+)
+TURN_FIELDS = ("turn", "gdp_growth", "inflation")
+
+
+def _companies_dict(turn_data: dict) -> dict:
+    companies = turn_data.get("companies", {})
+    if isinstance(companies, list):
+        return {c.get("name", "Unknown"): c for c in companies}
+    return companies
+
+
+def _as_float(value) -> float:
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class SharedScenario:
+    """
+    company_values: [필드, 턴, 회사] / present: [턴, 회사] / turn_values: [필드, 턴]
+    세 배열을 하나의 SharedMemory 블록에 연속으로 배치합니다.
+    """
+
+    def __init__(self, shm, spec: dict, owner: bool):
+        self._shm = shm
+        self._owner = owner
+        self.spec = spec
+        self.company_names = spec["company_names"]
+        self.config = spec["config"]
+
+        n_fields, n_turns, n_companies = len(COMPANY_FIELDS), spec["n_turns"], len(self.company_names)
+        offset = 0
+        self.company_values = np.ndarray((n_fields, n_turns, n_companies), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self.company_values.nbytes
+        self.present = np.ndarray((n_turns, n_companies), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self.present.nbytes
+        self.turn_values = np.ndarray((len(TURN_FIELDS), n_turns), dtype=np.float64, buffer=shm.buf, offset=offset)
+        if not owner:
+            for arr in (self.company_values, self.present, self.turn_values):
+                arr.flags.writeable = False
+
+    @staticmethod
+    def _nbytes(n_turns: int, n_companies: int) -> int:
+        cells = len(COMPANY_FIELDS) * n_turns * n_companies + n_turns * n_companies + len(TURN_FIELDS) * n_turns
+        return cells * np.dtype(np.float64).itemsize
+
+    @classmethod
+    def create(cls, data) -> "SharedScenario":
+        """BenchmarkData에서 숫자 부분만 컴파일해 공유 메모리에 올립니다."""
+        turns = data.turns_data
+        company_names = list(_companies_dict(turns[0]).keys())
+        spec = {
+            "company_names": company_names,
+            "n_turns": len(turns),
+            "config": dict(data.config or {}),
+        }
+        shm = shared_memory.SharedMemory(create=True, size=max(1, cls._nbytes(len(turns), len(company_names))))
+        spec["shm_name"] = shm.name
+        scenario = cls(shm, spec, owner=True)
+
+        scenario.company_values[:] = math.nan
+        scenario.present[:] = 0.0
+        scenario.turn_values[:] = math.nan
+        for t, turn_data in enumerate(turns):
+            macro = turn_data.get("macro", {}) or {}
+            scenario.turn_values[0, t] = _as_float(turn_data.get("turn"))
+            scenario.turn_values[1, t] = _as_float(macro.get("gdp_growth"))
+            scenario.turn_values[2, t] = _as_float(macro.get("inflation"))
+            companies = _companies_dict(turn_data)
+            for c, name in enumerate(company_names):
+                if name not in companies:
+                    continue
+                comp = companies[name]
+                scenario.present[t, c] = 1.0
+                sources = {"inputs": comp.get("inputs", {}), "outputs": comp.get("outputs", {}), "company": comp}
+                for f, (_, where, key) in enumerate(COMPANY_FIELDS):
+                    scenario.company_values[f, t, c] = _as_float(sources[where].get(key))
+        return scenario
+
+    @classmethod
+    def attach(cls, spec: dict) -> "SharedScenario":
+        shm = shared_memory.SharedMemory(name=spec["shm_name"])
+        return cls(shm, spec, owner=False)
+
+    @property
+    def n_turns(self) -> int:
+        return self.spec["n_turns"]
+
+    def turn(self, t: int) -> dict:
+        """run_benchmark_turn이 읽는 형태의 턴 dict를 공유 배열에서 즉석으로 만듭니다."""
+        turn_data = {"turn": int(self.turn_values[0, t]), "companies": {}}
+        macro = {}
+        for key, value in (("gdp_growth", self.turn_values[1, t]), ("inflation", self.turn_values[2, t])):
+            if not math.isnan(value):
+                macro[key] = float(value)
+        if macro:
+            turn_data["macro"] = macro
+
+        for c, name in enumerate(self.company_names):
+            if not self.present[t, c]:
+                continue
+            comp = {"inputs": {}, "outputs": {}}
+            for f, (_, where, key) in enumerate(COMPANY_FIELDS):
+                value = self.company_values[f, t, c]
+                if math.isnan(value):
+                    continue
+                target = comp if where == "company" else comp[where]
+                target[key] = float(value)
+            turn_data["companies"][name] = comp
+        return turn_data
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        if self._owner:
+            self._shm.unlink()
+
+
+def evaluate_shared(scenario: SharedScenario, params: dict):
+    """api_main._evaluate_benchmark_params와 같은 계산을 공유 배열에서 바로 수행합니다."""
+    from api_main import _initialize_market_for_benchmark
+
+    # 첫 턴 뷰는 시나리오당 한 번만 만들어 두어, 불변 base config도 후보들 사이에서 공유되게 합니다.
+    view = getattr(scenario, "_benchmark_view", None)
+    if view is None:
+        view = SimpleNamespace(config=scenario.config, turns_data=[scenario.turn(0)])
+        scenario._benchmark_view = view
+    try:
+        market = _initialize_market_for_benchmark(view, override_params=params)
+        for t in range(scenario.n_turns):
+            market.run_benchmark_turn(scenario.turn(t))
+    except Exception:
+        return None
+
+    total_mae = 0.0
+    for result in market.history:
+        if "total_error_mae" not in result:
+            return None
+        total_mae += result["total_error_mae"]
+    return total_mae / scenario.n_turns
+
+
+# --- 워커 프로세스 측 ---
+_worker_scenario = None
+
+
+def _init_worker(spec: dict):
+    global _worker_scenario
+    _worker_scenario = SharedScenario.attach(spec)
+
+
+def _evaluate_batch(batch: list) -> list:
+    return [evaluate_shared(_worker_scenario, params) for params in batch]
+
+
+def evaluate_candidates_shared(data, candidates: list, workers: int = None, batch_size: int = 64) -> list:
+    """
+    후보 파라미터들을 프로세스 풀로 평가합니다. 시나리오는 공유 메모리에 한 번만 올라가고,
+    작업마다 전달되는 것은 파라미터 배치뿐입니다. 반환 순서는 candidates와 같습니다.
+    """
+    scenario = SharedScenario.create(data)
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(scenario.spec,)) as pool:
+            batches = [candidates[i:i + batch_size] for i in range(0, len(candidates), batch_size)]
+            maes = []
+            for batch_result in pool.map(_evaluate_batch, batches):
+                maes.extend(batch_result)
+        return maes
+    finally:
+        scenario.close()
+        scenario.unlink()
@@ -1,7 +1,98 @@
 import math
+from collections import deque
+from collections.abc import MutableMapping
 import pandas as pd
 
+from best_response import best_response_decisions
+
 QUARTERLY_REPORT_INTERVAL = 4
+HISTORY_WINDOW = 4
+QUARTER_FIELDS = ("revenue", "profit", "marketing_spend", "rd_spend")
+
+
+class FrozenConfig(dict):
+    """
+    여러 시뮬레이션이 공유하는 읽기 전용 설정(dict).
+    json 직렬화/읽기는 일반 dict와 같고, 수정하려 하면 TypeError가 납니다.
+    copy()는 수정 가능한 일반 dict를 돌려주고, deepcopy는 자기 자신을 공유합니다.
+    """
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("FrozenConfig는 수정할 수 없습니다. 시뮬레이션별 값은 overlay에 쓰세요.")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce_ex__(self, protocol):
+        return (FrozenConfig, (dict(self),))
+
+
+def freeze_config(config) -> FrozenConfig:
+    """설정을 재귀적으로 얼립니다 (dict -> FrozenConfig, list -> tuple)."""
+    if isinstance(config, FrozenConfig):
+        return config
+    if isinstance(config, dict):
+        return FrozenConfig({k: freeze_config(v) for k, v in config.items()})
+    if isinstance(config, (list, tuple)):
+        return tuple(freeze_config(v) for v in config)
+    return config
+
+
+class OverlayConfig(MutableMapping):
+    """
+    공유 base(FrozenConfig) 위에 시뮬레이션별 overlay(dict)를 얹은 설정 뷰.
+    읽기는 overlay -> base 순서, 쓰기(예: market_size 성장)는 항상 overlay에만 기록됩니다.
+    """
+    __slots__ = ("base", "overlay")
+
+    def __init__(self, base: FrozenConfig, overlay: dict = None):
+        self.base = base
+        self.overlay = dict(overlay or {})
+
+    def get(self, key, default=None):
+        overlay = self.overlay
+        if key in overlay:
+            return overlay[key]
+        return self.base.get(key, default)
+
+    def __getitem__(self, key):
+        overlay = self.overlay
+        if key in overlay:
+            return overlay[key]
+        return self.base[key]
+
+    def __contains__(self, key):
+        return key in self.overlay or key in self.base
+
+    def __setitem__(self, key, value):
+        self.overlay[key] = value
+
+    def __delitem__(self, key):
+        del self.overlay[key]
+
+    def __iter__(self):
+        yield from self.overlay
+        for key in self.base:
+            if key not in self.overlay:
+                yield key
+
+    def __len__(self):
+        return len(self.base.keys() | self.overlay.keys())
+
+    def to_dict(self) -> dict:
+        return {**self.base, **self.overlay}
+
+    def __deepcopy__(self, memo):
+        import copy
+        return OverlayConfig(self.base, copy.deepcopy(self.overlay, memo))
+
+    def __reduce__(self):
+        return (OverlayConfig, (self.base, self.overlay))
 
 class Event:
     def __init__(self, description, target_company, effect_type, impact_value, duration):
@@ -25,9 +116,36 @@ class Event:
         return self.duration > 0
 
 
+class RollingWindow:
+    """최근 size개 값의 합/평균을 턴마다 O(1)로 갱신하는 창."""
+    __slots__ = ("size", "values", "total")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = deque()
+        self.total = 0.0
+
+    def push(self, value: float):
+        self.values.append(value)
+        self.total += value
+        if len(self.values) > self.size:
+            self.total -= self.values.popleft()
+
+    @property
+    def last(self):
+        return self.values[-1] if self.values else None
+
+    @property
+    def mean(self) -> float:
+        return self.total / len(self.values) if self.values else 0.0
+
+
 class MarketSimulator:
-    def __init__(self, company_names, config):
-        self.config = config
+    def __init__(self, company_names, config, overlay: dict = None):
+        # config는 여러 시뮬레이션이 공유하는 불변 base로 쓰고, 이 시뮬레이션에서 바뀌는 값
+        # (market_size 성장, 자동 산정된 임계값 등)은 overlay에만 기록합니다.
+        self.base_config = freeze_config(config)
+        self.config = OverlayConfig(self.base_config, overlay)
         self.ai_company_names = company_names
         self.dummy_company_names = ["Others"]
         self.all_company_names = self.ai_company_names + self.dummy_company_names
@@ -35,8 +153,8 @@ class MarketSimulator:
         self.companies = {}
         
         # 1. 초기 자본금 및 시장 규모 가져오기
-        initial_capital = config.get("initial_capital", 0)
-        market_size = config.get("market_size", 10000)
+        initial_capital = self.config.get("initial_capital", 0)
+        market_size = self.config.get("market_size", 10000)
         
         # 2. [핵심 수정] 하드코딩 제거 & 동적 스케일링
         # Config에 값이 없으면, 자본금의 일정 비율로 '물리 상수'를 자동 설정합니다.
@@ -50,10 +168,10 @@ class MarketSimulator:
             self.config["rd_efficiency_threshold"] = initial_capital * 0.005 if initial_capital > 0 else 50000
 
         # 초기 예산 설정 (자본금 비례)
-        initial_marketing_budget = initial_capital * config.get("initial_marketing_budget_ratio", 0.02)
-        initial_rd_budget = initial_capital * config.get("initial_rd_budget_ratio", 0.01)
+        initial_marketing_budget = initial_capital * self.config.get("initial_marketing_budget_ratio", 0.02)
+        initial_rd_budget = initial_capital * self.config.get("initial_rd_budget_ratio", 0.01)
         
-        initial_configs = config.get("initial_configs", {})
+        initial_configs = self.config.get("initial_configs", {})
 
         # 1) 원시 합계 계산
         raw_total_share = sum(cfg.get("market_share", 0.0) for cfg in initial_configs.values())
@@ -125,10 +243,21 @@ class MarketSimulator:
         self.history = []
         self.pending_event_queue = [] 
         self.active_effects = []
+        self.event_log = [] # (주입 시점 turn, Event) - 스냅샷에서 게임을 다시 재생할 때 사용
+
+        # 프롬프트용 집계는 턴마다 증분 갱신 (history를 다시 훑지 않음)
+        window = int(self.config.get("history_window", HISTORY_WINDOW))
+        self.rolling = {name: {"profit": RollingWindow(window), "market_share": RollingWindow(window)}
+                        for name in self.all_company_names}
+        self.last_turn_delta = {}
+        self.quarter_totals = {}
+        self.quarter_start = None
+        self.quarterly_report = None
 
     def inject_event(self, description, target_company, effect_type, impact_value, duration):
         event = Event(description, target_company, effect_type, impact_value, duration)
         self.pending_event_queue.append(event)
+        self.event_log.append((self.turn, Event(description, target_company, effect_type, impact_value, duration)))
 
     def _apply_events(self):
         next_active_effects = []
@@ -332,6 +461,13 @@ class MarketSimulator:
             self.companies[name]['product_quality'] = min(100, self.companies[name]['product_quality'])
             self.companies[name]['brand_awareness'] = min(100, current_brand + points_gained_mkt)
 
+        if not is_benchmark and self.config.get("dummy_policy", "fixed") == "best_response":
+            # Others가 이번 턴 AI 결정(R&D/브랜드 반영 후 상태)에 이익 극대화 가격으로 대응
+            targets = [n for n in self.dummy_company_names if n in active_decisions]
+            best = best_response_decisions(self.config, self.companies, active_decisions, targets)
+            active_decisions.update(best)
+            all_decisions = {**all_decisions, **best}
+
         utility_scores = self._calculate_utility_scores(active_decisions)
         if utility_scores:
             max_util = max(utility_scores.values())
@@ -412,6 +548,7 @@ class MarketSimulator:
             current_turn_results["total_error_mae"] = total_composite_error / len(sim_ranks)
 
         self.history.append(current_turn_results)
+        self._update_aggregates(current_turn_results)
 
         # 예산 갱신
         for name in self.ai_company_names:
@@ -421,11 +558,42 @@ class MarketSimulator:
             self.companies[name]['max_rd_budget'] = base_budget
             self.companies[name]['max_marketing_budget'] = base_budget * 2
 
-        if self.turn > 0 and self.turn % QUARTERLY_REPORT_INTERVAL == 0:
-            pass 
-
         return self.get_market_state()
 
+    def _update_aggregates(self, results: dict):
+        """이번 턴 결과로 롤링 창 / 분기 합계 / 지난 턴 대비 변화를 회사 수에 비례하는 시간에 갱신합니다."""
+        if self.quarter_start is None:
+            self.quarter_start = self.turn
+        for name in self.all_company_names:
+            if f"{name}_profit" not in results:
+                continue
+            profit, share = results[f"{name}_profit"], results[f"{name}_market_share"]
+            window = self.rolling[name]
+            prev_profit, prev_share = window["profit"].last, window["market_share"].last
+            self.last_turn_delta[name] = {
+                "profit": profit,
+                "profit_change": None if prev_profit is None else profit - prev_profit,
+                "market_share": share,
+                "market_share_change": None if prev_share is None else share - prev_share,
+            }
+            window["profit"].push(profit)
+            window["market_share"].push(share)
+
+            totals = self.quarter_totals.setdefault(name, {**dict.fromkeys(QUARTER_FIELDS, 0.0), "market_share": 0.0, "turns": 0})
+            for field in QUARTER_FIELDS:
+                totals[field] += results.get(f"{name}_{field}", 0)
+            totals["market_share"] += share
+            totals["turns"] += 1
+
+        if self.turn > 0 and self.turn % QUARTERLY_REPORT_INTERVAL == 0:
+            data = {}
+            for name, totals in self.quarter_totals.items():
+                data[name] = {field: totals[field] for field in QUARTER_FIELDS}
+                data[name]["avg_market_share"] = totals["market_share"] / totals["turns"]
+            self.quarterly_report = {"turn_range": [self.quarter_start, self.turn], "data": data}
+            self.quarter_totals = {}
+            self.quarter_start = None
+
     def get_company_state(self, name: str) -> dict:
         if name in self.companies:
             return self.companies[name]
@@ -434,7 +602,7 @@ class MarketSimulator:
     def get_market_state(self):
         state = {
             "turn": self.turn,
-            "config": self.config,
+            "config": self.config.to_dict(),
             "companies": {}
         }
         for name, data in self.companies.items():
@@ -443,8 +611,34 @@ class MarketSimulator:
         state["active_events"] = [f"{e.description} ({e.duration}턴 남음)" for e in self.active_effects]
         if self.history:
             state["last_turn_results"] = self.history[-1]
+        # 분기 보고서는 분기가 끝난 직후 턴에만 공개 (그 외에는 '전쟁 안개')
+        if self.quarterly_report and self.quarterly_report["turn_range"][1] == self.turn:
+            state["quarterly_report"] = self.quarterly_report
             
         return state
 
+    def get_agent_state(self, name: str, market_state: dict = None) -> dict:
+        """
+        market_state(없으면 새로 생성)에 name 회사 시점의 지난 턴 비교 / 최근 N턴 요약을 붙인 얕은 복사본.
+        모두 증분 집계에서 바로 읽으므로 게임 길이와 상관없이 일정한 시간이 걸립니다.
+        """
+        state = dict(market_state if market_state is not None else self.get_market_state())
+        delta = self.last_turn_delta.get(name)
+        if delta:
+            state["last_turn_comparison"] = {
+                "my_profit": delta["profit"],
+                "my_profit_change": delta["profit_change"],
+                "my_market_share": delta["market_share"],
+                "my_market_share_change": delta["market_share_change"],
+            }
+        window = self.rolling.get(name)
+        if window and window["profit"].values:
+            state["historical_summary"] = {
+                "window_size": len(window["profit"].values),
+                "my_avg_profit_4turn": window["profit"].mean,
+                "my_avg_market_share": window["market_share"].mean,
+            }
+        return state
+
     def get_history_df(self):
         return pd.DataFrame(self.history)
\ No newline at end of file
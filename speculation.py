@@ -0,0 +1,182 @@
+# speculation.py
+"""
+다음 턴 선택지의 투기적(speculative) 선행 계산.
+
+get_choices가 끝나면 에이전트별로 확률이 가장 높은 결정을 '예측 결정'으로 보고,
+시장을 복제(fork)해 그 결정으로 한 턴을 미리 진행한 뒤 다음 턴 decide_action을 백그라운드에서 시작합니다.
+    - execute_turn의 실제 결정이 예측과 같고 진행 후 상태도 같으면 다음 get_choices는 그 결과를 바로 사용 (hit)
+    - 결정이 다르거나, 이벤트 주입/페르소나 변경이 있으면 폐기 (miss / invalidated)
+    - 선행 계산의 결정 로그/DECISION_STATS 기록은 DeferredDecisions에 모아 두었다가 hit일 때만 반영
+동시에 돌 수 있는 선행 계산 수는 SPECULATION_MAX_INFLIGHT로 제한합니다. (초과하면 건너뜀)
+"""
+
+import asyncio
+import contextlib
+import copy
+import hashlib
+import io
+import json
+import os
+
+from decision_schema import DeferredDecisions
+
+DECISION_FIELDS = ("price", "marketing_brand_spend", "marketing_promo_spend", "rd_innovation_spend", "rd_efficiency_spend")
+
+
+def predicted_decisions(choices: dict) -> dict:
+    """{회사: 선택지 배열} -> {회사: 확률이 가장 높은 결정}"""
+    predicted = {}
+    for name, options in choices.items():
+        best = max(options, key=lambda c: c.get("probability", 0))
+        predicted[name] = {field: int(best["decision"].get(field, 0)) for field in DECISION_FIELDS}
+    return predicted
+
+
+def decisions_match(predicted: dict, committed: dict) -> bool:
+    if set(predicted) != set(committed):
+        return False
+    return all(int(committed[name].get(field, 0)) == predicted[name][field]
+               for name in predicted for field in DECISION_FIELDS)
+
+
+def state_fingerprint(market_state: dict) -> str:
+    """에이전트 프롬프트에 영향을 주는 수치 상태의 해시. (설명 텍스트 등 비수치 결과 값은 제외)"""
+    last = {k: v for k, v in (market_state.get("last_turn_results") or {}).items() if isinstance(v, (int, float))}
+    payload = {
+        "turn": market_state.get("turn"),
+        "companies": market_state.get("companies"),
+        "active_events": market_state.get("active_events"),
+        "last_turn_results": last,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Speculation:
+    def __init__(self, turn: int, decisions: dict, fingerprint: str, task: asyncio.Future,
+                 deferred: DeferredDecisions = None):
+        self.turn = turn                # 선행 계산한 선택지가 쓰일 턴 (복제 시장의 turn)
+        self.decisions = decisions      # 예측 결정
+        self.fingerprint = fingerprint  # 복제 시장의 진행 후 상태
+        self.task = task                # {회사: 선택지 배열}
+        self.confirmed = False          # execute_turn에서 예측 결정이 실제로 채택되었는지
+        self.deferred = deferred        # hit일 때 반영할 결정 로그/통계
+
+
+class SpeculativePrefetcher:
+    def __init__(self, max_inflight: int = None):
+        self.max_inflight = int(os.getenv("SPECULATION_MAX_INFLIGHT", "4")) if max_inflight is None else max_inflight
+        self.inflight = 0
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.skipped = 0
+
+    def maybe_start(self, sim_data: dict, choices: dict, make_jobs):
+        """
+        예측 결정으로 복제 시장을 한 턴 진행하고 다음 턴 선택지 계산을 시작합니다.
+        make_jobs(fork_market, deferred) -> [(agent, coroutine)] 는 api_main의 선택지 작업 생성기입니다.
+        """
+        if not sim_data.get("speculative"):
+            return
+        self.discard(sim_data, "superseded")
+        market = sim_data["market"]
+        if market.turn + 1 >= market.config.get("total_turns", 30):
+            return
+        if self.inflight >= self.max_inflight:
+            self.skipped += 1
+            return
+
+        decisions = predicted_decisions(choices)
+        fork = copy.deepcopy(market)
+        with contextlib.redirect_stdout(io.StringIO()):  # 복제 시장의 턴 로그는 실제 턴 로그와 섞이지 않게
+            fork.process_turn({name: dict(d) for name, d in decisions.items()})
+        deferred = DeferredDecisions()
+        jobs = make_jobs(fork, deferred)
+
+        async def run():
+            results = await asyncio.gather(*(job for _, job in jobs))
+            return {agent.name: result for (agent, _), result in zip(jobs, results)}
+
+        task = asyncio.ensure_future(run())
+        self.inflight += 1
+        self.started += 1
+
+        def _done(t):
+            self.inflight -= 1
+            if not t.cancelled():
+                t.exception()  # 폐기된 선행 계산의 예외가 경고로 남지 않게 소비
+
+        task.add_done_callback(_done)
+        sim_data["speculation"] = Speculation(fork.turn, decisions, state_fingerprint(fork.get_market_state()), task,
+                                              deferred)
+        print(f"🔮 [Speculation] 턴 {fork.turn} 선택지 선행 계산 시작")
+
+    def on_commit(self, sim_data: dict, committed: dict):
+        """execute_turn 직후 호출. 실제 결정과 진행 후 상태가 예측과 다르면 폐기합니다."""
+        spec = sim_data.get("speculation")
+        if spec is None:
+            return
+        market = sim_data["market"]
+        if (market.turn == spec.turn and decisions_match(spec.decisions, committed)
+                and state_fingerprint(market.get_market_state()) == spec.fingerprint):
+            spec.confirmed = True
+        else:
+            self.discard(sim_data, "miss")
+
+    def take(self, sim_data: dict):
+        """다음 get_choices에서 호출. 확정된 선행 계산이 있으면 그 task를 돌려줍니다 (hit)."""
+        spec = sim_data.get("speculation")
+        if spec is None:
+            return None
+        market = sim_data["market"]
+        if not spec.confirmed or market.turn != spec.turn or spec.task.cancelled() \
+                or state_fingerprint(market.get_market_state()) != spec.fingerprint:
+            self.discard(sim_data, "miss")
+            return None
+        sim_data["speculation"] = None
+        self.hits += 1
+        self._commit_when_done(spec)
+        print(f"⚡ [Speculation] 턴 {spec.turn} 선행 계산 적중")
+        return spec.task
+
+    @staticmethod
+    def _commit_when_done(spec: Speculation):
+        """채택된 선행 계산의 결정 로그/통계를 실제 턴 것으로 반영 (아직 진행 중이면 끝난 뒤)"""
+        if spec.deferred is None:
+            return
+        def commit(t):
+            if not t.cancelled() and t.exception() is None:
+                spec.deferred.commit()
+        if spec.task.done():
+            commit(spec.task)
+        else:
+            spec.task.add_done_callback(commit)
+
+    def discard(self, sim_data: dict, reason: str):
+        spec = sim_data.get("speculation")
+        if spec is None:
+            return
+        sim_data["speculation"] = None
+        if not spec.task.done():
+            spec.task.cancel()
+        if reason == "miss":
+            self.misses += 1
+        elif reason == "invalidated":
+            self.invalidated += 1
+
+    def stats(self) -> dict:
+        resolved = self.hits + self.misses + self.invalidated
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "skipped_over_budget": self.skipped,
+            "hit_rate": self.hits / resolved if resolved else 0.0,
+        }
+
+
+SPECULATOR = SpeculativePrefetcher()
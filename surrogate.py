@@ -0,0 +1,256 @@
+# surrogate.py
+"""
+LLM 결정 로그로 학습하는 대리(surrogate) 정책 에이전트.
+
+1) 기록: DECISION_LOG_PATH가 설정되어 있으면 AIAgent가 (시장 상태, 페르소나, 선택지)를 JSONL로 남깁니다.
+2) 학습: python -m surrogate fit --log decisions.jsonl --out surrogate_model.json
+   가격 마크업(log(가격/원가))과 예산 대비 지출 비율 4개를 릿지 회귀로 맞춥니다.
+   페르소나 텍스트는 해시된 단어 가방(bag-of-words) 특성으로 들어가므로 페르소나별 성향이 유지됩니다.
+3) 사용: create_simulation에서 회사별 agent_backend="surrogate" (모델 경로는 SURROGATE_MODEL_PATH)
+
+예측은 행렬 곱 한 번이라 여러 시뮬레이션/회사를 predict_batch로 한꺼번에 처리할 수 있습니다.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+PERSONA_BUCKETS = 32
+STATE_FEATURES = (
+    "bias",
+    "progress",
+    "log_unit_cost",
+    "quality",
+    "brand",
+    "market_share",
+    "last_markup",
+    "rival_price_ratio",
+    "rival_quality_gap",
+    "rival_brand_gap",
+    "capital_ratio",
+    "rd_innovation_progress",
+    "rd_efficiency_progress",
+)
+FEATURE_NAMES = STATE_FEATURES + tuple(f"persona_{i}" for i in range(PERSONA_BUCKETS))
+TARGETS = ("log_markup", "brand_ratio", "promo_ratio", "rd_innovation_ratio", "rd_efficiency_ratio")
+
+_TOKEN_RE = re.compile(r"[\w가-힣]+")
+_log_lock = threading.Lock()
+
+
+def _persona_vector(persona: str) -> np.ndarray:
+    vec = np.zeros(PERSONA_BUCKETS)
+    for token in _TOKEN_RE.findall((persona or "").lower()):
+        bucket = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % PERSONA_BUCKETS
+        vec[bucket] += 1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+def extract_features(market_state: dict, name: str, persona: str) -> np.ndarray:
+    """시장 상태에서 규모에 무관한(비율/로그) 특성 벡터를 만듭니다."""
+    companies = market_state.get("companies", {})
+    me = companies.get(name, {})
+    config = market_state.get("config", {}) or {}
+    last = market_state.get("last_turn_results", {}) or {}
+
+    unit_cost = max(1e-6, float(me.get("unit_cost", 100.0)))
+    last_price = float(last.get(f"{name}_price", unit_cost * 1.1)) or unit_cost * 1.1
+    rivals = [n for n in companies if n != name]
+    rival_prices = [float(last[f"{n}_price"]) for n in rivals if last.get(f"{n}_price")]
+    rival_price = float(np.mean(rival_prices)) if rival_prices else last_price
+    rival_quality = np.mean([companies[n].get("product_quality", 50.0) for n in rivals]) if rivals else 50.0
+    rival_brand = np.mean([companies[n].get("brand_awareness", 50.0) for n in rivals]) if rivals else 50.0
+    initial_capital = float(config.get("initial_capital", 0) or 0) or max(1.0, abs(me.get("accumulated_profit", 1.0)))
+    rd_inno_threshold = float(config.get("rd_innovation_threshold", 0) or 0)
+    rd_eff_threshold = float(config.get("rd_efficiency_threshold", 0) or 0)
+
+    state = [
+        1.0,
+        market_state.get("turn", 0) / max(1.0, float(config.get("total_turns", 30))),
+        math.log(unit_cost),
+        me.get("product_quality", 50.0) / 100.0,
+        me.get("brand_awareness", 50.0) / 100.0,
+        me.get("market_share", 0.0),
+        math.log(max(1e-6, last_price / unit_cost)),
+        math.log(max(1e-6, rival_price / last_price)),
+        (rival_quality - me.get("product_quality", 50.0)) / 100.0,
+        (rival_brand - me.get("brand_awareness", 50.0)) / 100.0,
+        float(np.clip(me.get("accumulated_profit", 0.0) / initial_capital, -2.0, 5.0)),
+        me.get("accumulated_rd_innovation_point", 0.0) / rd_inno_threshold if rd_inno_threshold > 0 else 0.0,
+        me.get("accumulated_rd_efficiency_point", 0.0) / rd_eff_threshold if rd_eff_threshold > 0 else 0.0,
+    ]
+    return np.concatenate([np.asarray(state, dtype=float), _persona_vector(persona)])
+
+
+def decision_targets(market_state: dict, name: str, decision: dict) -> np.ndarray:
+    me = market_state.get("companies", {}).get(name, {})
+    unit_cost = max(1e-6, float(me.get("unit_cost", 100.0)))
+    max_mkt = max(1.0, float(me.get("max_marketing_budget", 1000000)))
+    max_rd = max(1.0, float(me.get("max_rd_budget", 500000)))
+    price = float(decision.get("price", unit_cost * 1.1)) or unit_cost * 1.1
+    return np.array([
+        math.log(max(1e-6, price / unit_cost)),
+        min(1.5, decision.get("marketing_brand_spend", 0) / max_mkt),
+        min(1.5, decision.get("marketing_promo_spend", 0) / max_mkt),
+        min(1.5, decision.get("rd_innovation_spend", 0) / max_rd),
+        min(1.5, decision.get("rd_efficiency_spend", 0) / max_rd),
+    ])
+
+
+def _targets_to_decision(market_state: dict, name: str, y: np.ndarray) -> dict:
+    me = market_state.get("companies", {}).get(name, {})
+    unit_cost = float(me.get("unit_cost", 100.0))
+    max_mkt = float(me.get("max_marketing_budget", 1000000))
+    max_rd = float(me.get("max_rd_budget", 500000))
+
+    brand, promo, inno, eff = np.clip(y[1:], 0.0, None)
+    # 예산 한도를 넘지 않도록 비율 합을 1 이하로 축소
+    mkt_total, rd_total = brand + promo, inno + eff
+    if mkt_total > 1.0:
+        brand, promo = brand / mkt_total, promo / mkt_total
+    if rd_total > 1.0:
+        inno, eff = inno / rd_total, eff / rd_total
+    return {
+        "price": max(1, int(unit_cost * math.exp(float(y[0])))),
+        "marketing_brand_spend": int(max_mkt * brand),
+        "marketing_promo_spend": int(max_mkt * promo),
+        "rd_innovation_spend": int(max_rd * inno),
+        "rd_efficiency_spend": int(max_rd * eff),
+    }
+
+
+# --- 기록 ---
+def log_decision(market_state: dict, name: str, persona: str, choices: list, path: str = None):
+    """DECISION_LOG_PATH(또는 path)가 있으면 결정 한 건을 JSONL로 추가합니다."""
+    path = path or os.getenv("DECISION_LOG_PATH")
+    if not path or not choices:
+        return
+    record = {
+        "agent": name,
+        "persona": persona,
+        "state": {
+            "turn": market_state.get("turn"),
+            "config": {k: v for k, v in (market_state.get("config") or {}).items()
+                       if k in ("total_turns", "initial_capital", "rd_innovation_threshold", "rd_efficiency_threshold")},
+            "companies": market_state.get("companies", {}),
+            "last_turn_results": market_state.get("last_turn_results", {}),
+        },
+        "choices": [{"probability": c.get("probability", 1.0), "decision": c.get("decision", {})} for c in choices],
+    }
+    line = json.dumps(record, ensure_ascii=False, default=float)
+    with _log_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# --- 학습/예측 ---
+class SurrogatePolicy:
+    def __init__(self, weights: np.ndarray, ridge: float = 1.0, n_samples: int = 0):
+        self.weights = np.asarray(weights, dtype=float)  # [특성, 타깃]
+        self.ridge = ridge
+        self.n_samples = n_samples
+
+    @classmethod
+    def fit(cls, records: list, ridge: float = 1.0) -> "SurrogatePolicy":
+        """선택지마다 probability를 가중치로 하는 가중 릿지 회귀 (절편은 규제하지 않음)."""
+        X, Y, w = [], [], []
+        for record in records:
+            state, name, persona = record["state"], record["agent"], record.get("persona", "")
+            x = extract_features(state, name, persona)
+            for choice in record["choices"]:
+                X.append(x)
+                Y.append(decision_targets(state, name, choice["decision"]))
+                w.append(float(choice.get("probability", 1.0)) or 1e-3)
+        if not X:
+            raise ValueError("학습할 결정 로그가 없습니다.")
+        X, Y, w = np.asarray(X), np.asarray(Y), np.asarray(w)
+        penalty = ridge * np.eye(X.shape[1])
+        penalty[0, 0] = 0.0
+        Xw = X * w[:, None]
+        weights = np.linalg.solve(X.T @ Xw + penalty, Xw.T @ Y)
+        return cls(weights, ridge=ridge, n_samples=len(records))
+
+    def predict_batch(self, items: list) -> list:
+        """items: [(market_state, 회사이름, 페르소나), ...] -> 결정 dict 목록 (한 번의 행렬 곱)."""
+        if not items:
+            return []
+        X = np.vstack([extract_features(state, name, persona) for state, name, persona in items])
+        Y = X @ self.weights
+        return [_targets_to_decision(state, name, y) for (state, name, _), y in zip(items, Y)]
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"features": list(FEATURE_NAMES), "targets": list(TARGETS), "ridge": self.ridge,
+                       "n_samples": self.n_samples, "weights": self.weights.tolist()}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "SurrogatePolicy":
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("features") != list(FEATURE_NAMES):
+            raise ValueError(f"특성 구성이 다른 대리 모델입니다. 다시 학습하세요: {path}")
+        return cls(np.asarray(payload["weights"]), ridge=payload.get("ridge", 1.0), n_samples=payload.get("n_samples", 0))
+
+
+_policies = {}
+
+
+def get_surrogate_policy(path: str = None) -> SurrogatePolicy:
+    """경로별로 한 번만 읽어 프로세스 안에서 공유합니다."""
+    path = path or os.getenv("SURROGATE_MODEL_PATH", "surrogate_model.json")
+    if path not in _policies:
+        _policies[path] = SurrogatePolicy.load(path)
+    return _policies[path]
+
+
+class SurrogateAgent:
+    """AIAgent와 같은 decide_action 계약을 가진 대리 정책 에이전트. LLM 호출이 없습니다."""
+
+    def __init__(self, name: str, persona: str, policy: SurrogatePolicy = None, sim_id: str = None):
+        self.name = name
+        self.persona = persona
+        self.policy = policy or get_surrogate_policy()
+        self.sim_id = sim_id
+        self.backend = "surrogate"
+        self.use_mock = False
+
+    async def decide_action(self, market_state: dict, deadline: float = None, projection=None,
+                            deferred=None) -> list:
+        decision = self.policy.predict_batch([(market_state, self.name, self.persona)])[0]
+        return [{"reasoning": "Surrogate policy: 학습된 LLM 결정 패턴 기반", "probability": 1.0, "decision": decision}]
+
+
+def load_records(path: str) -> list:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM 결정 로그로 대리 정책 학습")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fit = sub.add_parser("fit")
+    fit.add_argument("--log", required=True, help="DECISION_LOG_PATH로 쌓은 JSONL")
+    fit.add_argument("--out", default="surrogate_model.json")
+    fit.add_argument("--ridge", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    records = load_records(args.log)
+    policy = SurrogatePolicy.fit(records, ridge=args.ridge)
+    policy.save(args.out)
+    print(f"✅ [Surrogate] {len(records)}건으로 학습 -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
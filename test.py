@@ -102,3 +102,955 @@ def test_bankruptcy_removes_company():
     # accumulated_profit는 여전히 파산선보다 아래일 것이다.
     assert name in sim.companies
     assert sim.companies[name]["accumulated_profit"] <= limit
+
+def _make_benchmark_data(n_turns):
+    from api_main import BenchmarkData
+    turns = []
+    for t in range(1, n_turns + 1):
+        turns.append({
+            "turn": t,
+            "macro": {"gdp_growth": 0.01, "inflation": 0.005},
+            "companies": {
+                "A": {"inputs": {"price": 100 + t, "marketing_spend_ratio": 0.05, "rd_spend_ratio": 0.05,
+                                 "unit_cost": 70, "initial_quality": 60, "initial_brand": 55},
+                      "outputs": {"actual_market_share": 0.4 + 0.01 * t}},
+                "B": {"inputs": {"price": 90, "marketing_spend_ratio": 0.08, "rd_spend_ratio": 0.02,
+                                 "unit_cost": 65, "initial_quality": 50, "initial_brand": 60},
+                      "outputs": {"actual_market_share": 0.35 - 0.01 * t}},
+            },
+        })
+    return BenchmarkData(scenario_name="cache", config={"market_size": 1000, "initial_capital": 100000,
+                                                        "physics": {"price_sensitivity": 10.0}},
+                         turns_data=turns)
+
+def test_benchmark_resume_matches_full_replay():
+    import api_main
+    from benchmark_cache import BenchmarkPrefixCache
+
+    api_main.benchmark_prefix_cache = BenchmarkPrefixCache()
+    api_main._run_benchmark_turns(_make_benchmark_data(3))
+    resumed_market, resumed_turns = api_main._run_benchmark_turns(_make_benchmark_data(5))
+    assert resumed_turns == 3
+
+    api_main.benchmark_prefix_cache = BenchmarkPrefixCache()
+    full_market, full_resumed = api_main._run_benchmark_turns(_make_benchmark_data(5))
+    assert full_resumed == 0
+    assert [r["total_error_mae"] for r in resumed_market.history] == \
+           [r["total_error_mae"] for r in full_market.history]
+
+
+def test_estimator_recovers_logit_parameters():
+    import math
+    import random
+    from estimator import estimate_physics
+
+    w_q, w_b, w_p, sensitivity = 0.5, 0.3, 0.2, 20.0
+    rng = random.Random(0)
+    turns = []
+    for t in range(12):
+        comps = {}
+        for name in ("A", "B", "C"):
+            comps[name] = {"inputs": {"price": rng.uniform(80, 120),
+                                      "initial_quality": rng.uniform(40, 80),
+                                      "initial_brand": rng.uniform(40, 80)}}
+        avg_price = sum(c["inputs"]["price"] for c in comps.values()) / 3
+        utils = {n: w_q * c["inputs"]["initial_quality"] / 10 + w_b * c["inputs"]["initial_brand"] / 10
+                 + w_p * math.log(avg_price / c["inputs"]["price"]) * sensitivity / 5
+                 for n, c in comps.items()}
+        utils["Others"] = 4.0
+        total = sum(math.exp(u) for u in utils.values())
+        for name, comp in comps.items():
+            comp["outputs"] = {"actual_market_share": math.exp(utils[name]) / total}
+        turns.append({"turn": t + 1, "companies": comps})
+
+    estimate = estimate_physics(turns, weight_price=w_p)
+    assert abs(estimate["physics"]["weight_quality"] - w_q) < 1e-6
+    assert abs(estimate["physics"]["weight_brand"] - w_b) < 1e-6
+    assert abs(estimate["physics"]["price_sensitivity"] - sensitivity) < 1e-4
+
+def test_distributed_tuning_matches_single_node():
+    import os
+    import subprocess
+    import sys
+    import threading
+    from multiprocessing.connection import Client
+
+    import api_main
+    from distributed import TuningCoordinator
+
+    data = _make_benchmark_data(4)
+    candidates = [{"price_sensitivity": s, "weight_quality": 0.5, "weight_brand": 0.3, "weight_price": 0.2}
+                  for s in (5.0, 10.0, 20.0, 40.0, 60.0)]
+    expected = [api_main._evaluate_benchmark_params(data, p) for p in candidates]
+
+    coordinator = TuningCoordinator(("127.0.0.1", 0), authkey="test", batch_size=2, batch_timeout=30)
+    host, port = coordinator.address
+
+    # 배치를 받자마자 끊기는 워커 -> 해당 배치는 다른 워커에게 재시도되어야 함
+    lost = Client((host, port), authkey=b"test")
+    def drop_after_first_batch():
+        lost.recv(); lost.recv(); lost.close()
+    dropper = threading.Thread(target=drop_after_first_batch)
+    dropper.start()
+
+    result = {}
+    runner = threading.Thread(target=lambda: result.update(maes=coordinator.evaluate(data.model_dump(), candidates, timeout=60)))
+    runner.start()
+    dropper.join(timeout=10)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    workers = [subprocess.Popen([sys.executable, "-m", "distributed", "worker", "--connect", f"{host}:{port}",
+                                 "--authkey", "test"], cwd=here, stdout=subprocess.DEVNULL)
+               for _ in range(2)]
+    runner.join(timeout=60)
+    coordinator.close()
+    for w in workers:
+        w.wait(timeout=30)
+
+    assert result["maes"] == expected
+    assert coordinator.stats["batches_retried"] >= 1
+
+    # 공개 기본 인증키 없음: 인증키 없이 시작하면 거절
+    env = {k: v for k, v in os.environ.items() if k != "TUNING_AUTHKEY"}
+    refused = subprocess.run([sys.executable, "-m", "distributed", "worker", "--connect", f"{host}:{port}"],
+                             cwd=here, env=env, capture_output=True, text=True, timeout=30)
+    assert refused.returncode != 0 and "TUNING_AUTHKEY" in refused.stderr
+
+def test_auto_tune_grid_resumes_after_turns_are_appended(monkeypatch):
+    import asyncio
+    import api_main
+    from benchmark_cache import BenchmarkPrefixCache
+
+    candidates = [{"price_sensitivity": float(v), "weight_brand": 0.3} for v in range(5, 30, 5)]
+    monkeypatch.setattr(api_main, "_build_tuning_candidates", lambda data: ([dict(c) for c in candidates], None))
+    # LRU 한도가 그리드보다 작아도 auto_tune이 그리드 크기만큼 늘림
+    monkeypatch.setattr(api_main, "benchmark_prefix_cache", BenchmarkPrefixCache(max_entries=2))
+    asyncio.run(api_main.auto_tune_parameters(_make_benchmark_data(3)))
+    stats = api_main.benchmark_prefix_cache.stats()
+    assert stats["entries"] == len(candidates) and stats["hits"] == 0
+
+    result = asyncio.run(api_main.auto_tune_parameters(_make_benchmark_data(5)))
+    stats = api_main.benchmark_prefix_cache.stats()
+    assert stats["hits"] == len(candidates) and stats["resumed_turns"] == 3 * len(candidates)
+    assert result["best_params"]
+
+def test_shared_scenario_matches_benchmark():
+    import api_main
+    from shared_scenario import SharedScenario, evaluate_shared
+
+    data = _make_benchmark_data(4)
+    params = {"price_sensitivity": 20.0, "weight_quality": 0.5, "weight_brand": 0.3, "weight_price": 0.2}
+    scenario = SharedScenario.create(data)
+    try:
+        attached = SharedScenario.attach(scenario.spec)
+        assert attached.turn(2) == data.turns_data[2]
+        assert evaluate_shared(attached, params) == api_main._evaluate_benchmark_params(data, params)
+        attached.close()
+    finally:
+        scenario.close()
+        scenario.unlink()
+
+def test_shared_worker_pool_matches_single_process():
+    import api_main
+    from shared_scenario import evaluate_candidates_shared
+
+    data = _make_benchmark_data(4)
+    candidates = [{"price_sensitivity": s, "weight_quality": 0.5, "weight_brand": 0.3, "weight_price": 0.2}
+                  for s in (5.0, 20.0, 60.0)]
+    # spawn 워커의 _init_worker -> 공유 메모리 attach 경로까지 실행
+    maes = evaluate_candidates_shared(data, candidates, workers=2, batch_size=2)
+    assert maes == [api_main._evaluate_benchmark_params(data, p) for p in candidates]
+
+def test_shared_base_config_is_not_mutated():
+    import api_main
+    from simulator import FrozenConfig
+
+    data = _make_benchmark_data(3)
+    physics_before = dict(data.config["physics"])
+    a = api_main._initialize_market_for_benchmark(data, override_params={"price_sensitivity": 1.0})
+    b = api_main._initialize_market_for_benchmark(data, override_params={"price_sensitivity": 99.0})
+    for turn_data in data.turns_data:
+        a.run_benchmark_turn(turn_data)
+
+    assert a.base_config is b.base_config
+    assert isinstance(a.base_config, FrozenConfig)
+    assert data.config["physics"] == physics_before
+    assert b.config["physics"]["price_sensitivity"] == 99.0
+    assert b.config["market_size"] == data.config["market_size"]
+    assert a.config["market_size"] > data.config["market_size"]
+
+def test_llm_cache_replay_and_eviction(tmp_path):
+    import asyncio
+    from agent import AIAgent
+    from llm_cache import LLMResponseCache, CacheMissError
+
+    path = str(tmp_path / "llm.sqlite3")
+    writer = LLMResponseCache(path, max_bytes=10, mode="read_write")
+    writer.put("m", "  prompt one\n\n\n", "12345")
+    assert writer.get("m", "prompt one") == "12345"   # 공백 정규화
+    writer.put("m", "prompt two", "678901")           # 10바이트 초과 -> LRU(prompt one) 제거
+    assert writer.get("m", "prompt one") is None
+    assert writer.stats()["evictions"] == 1
+    writer.close()
+
+    replay = LLMResponseCache(path, mode="replay")
+    agent = AIAgent("A", "persona", response_cache=replay)  # API 키 없이도 생성 가능
+    agent.model_name = "m"
+    assert asyncio.run(agent.get_gemini_response_async("prompt two")) == "678901"
+    try:
+        asyncio.run(agent.get_gemini_response_async("never seen"))
+        assert False, "replay 모드에서 캐시 미스는 예외여야 함"
+    except CacheMissError:
+        pass
+    assert replay.stats()["hits"] == 1 and replay.stats()["misses"] == 1
+
+def test_llm_pool_round_robin_across_simulations():
+    import asyncio
+    from types import SimpleNamespace
+    from llm_pool import LLMClientPool
+
+    order = []
+
+    async def fake_generate(model, contents, config=None):
+        order.append(contents)
+        await asyncio.sleep(0)
+        return SimpleNamespace(text=contents)
+
+    class FakePool(LLMClientPool):
+        client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=fake_generate)))
+
+    pool = FakePool(max_concurrency=1, requests_per_minute=0)
+
+    async def run():
+        # A가 먼저 3개를 몰아 넣어도 B가 A 뒤에 줄 서지 않고 번갈아 처리되어야 함
+        tasks = [asyncio.create_task(pool.generate_content("m", f"{sim}{i}", sim_id=sim))
+                 for sim in ("A", "B") for i in range(3)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["A0", "A1", "B0", "A2", "B1", "B2"]
+    stats = pool.stats()
+    assert stats["calls"] == 6 and stats["active"] == 0 and stats["queue_wait"]["count"] == 6
+
+def test_llm_retry_hedge_and_deadline(monkeypatch):
+    import asyncio
+    from agent import AIAgent
+    from llm_cache import LLMResponseCache
+    from llm_pool import call_with_retries, hedged
+
+    class Unavailable(Exception):
+        code = 503
+
+    attempts = []
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Unavailable("busy")
+        return "ok"
+    assert asyncio.run(call_with_retries(flaky, max_retries=2, base_delay=0.001)) == "ok"
+
+    cancelled = []
+    calls = []
+    async def slow_then_fast():
+        calls.append(1)
+        try:
+            await asyncio.sleep(10 if len(calls) == 1 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return len(calls)
+    assert asyncio.run(hedged(slow_then_fast, hedge_delay=0.02)) == 2
+    assert cancelled == [1]
+
+    # 마감 시간을 넘긴 에이전트만 Fallback
+    monkeypatch.setenv("GOOGLE_API_KEY", "dummy")
+    agent = AIAgent("A", "persona", response_cache=LLMResponseCache(mode="off"))
+    async def never(prompt, **kwargs):
+        await asyncio.sleep(10)
+    agent.get_gemini_response_async = never
+    market = MarketSimulator(["A", "B"], {"market_size": 1000, "initial_capital": 100000})
+
+    async def run():
+        return await agent.decide_action(market.get_market_state(), deadline=asyncio.get_running_loop().time() + 0.05)
+    choices = asyncio.run(run())
+    assert "마감" in choices[0]["reasoning"]
+
+def test_prompt_builder_hides_opponents_and_respects_budget():
+    from prompt_builder import TurnProjection, build_decision_prompt, estimate_tokens
+
+    names = [f"C{i}" for i in range(8)]
+    market = MarketSimulator(names, {"market_size": 1000, "initial_capital": 100000})
+    market.process_turn({n: {"price": 100 + i, "marketing_brand_spend": 1000, "marketing_promo_spend": 0,
+                             "rd_innovation_spend": 1000, "rd_efficiency_spend": 0} for i, n in enumerate(names)})
+    state = market.get_market_state()
+    projection = TurnProjection(state)
+
+    system, prompt = build_decision_prompt("C0", "공격적", state, projection=projection)
+    assert "공격적" in system and "공격적" not in prompt
+    assert '"C1":{"product_quality"' in prompt and "accumulated_profit" in prompt
+    opponent = projection.snapshot_for("C0")["last_turn_results"]["C1"]
+    assert "accumulated_profit" not in opponent and "unit_cost" not in opponent
+
+    budget = estimate_tokens(system) + 700
+    _, small = build_decision_prompt("C0", "공격적", state, projection=projection, token_budget=budget)
+    assert estimate_tokens(system) + estimate_tokens(small) <= budget
+    assert "[E. R&D 프로젝트 진행 현황" in small
+
+def test_prompt_builder_enforces_tiny_budget_with_valid_json():
+    import json
+    from prompt_builder import TurnProjection, build_batch_prompt, build_decision_prompt, estimate_tokens
+
+    names = [f"C{i}" for i in range(8)]
+    market = MarketSimulator(names, {"market_size": 1000, "initial_capital": 100000})
+    market.process_turn({n: {"price": 100 + i, "marketing_brand_spend": 1000, "marketing_promo_spend": 0,
+                             "rd_innovation_spend": 1000, "rd_efficiency_spend": 0} for i, n in enumerate(names)})
+    state = market.get_market_state()
+    projection = TurnProjection(state)
+
+    def snapshot_of(prompt):
+        return json.loads(prompt.split("\n")[1])  # 스냅샷 JSON은 잘리지 않고 항목 단위로만 빠짐
+
+    system, _ = build_decision_prompt("C0", "공격적", state, projection=projection)
+    budget = estimate_tokens(system) + 200
+    _, tiny = build_decision_prompt("C0", "공격적", state, projection=projection, token_budget=budget)
+    assert estimate_tokens(system) + estimate_tokens(tiny) <= budget
+    snapshot = snapshot_of(tiny)
+    assert list(snapshot["companies"]) == ["C0"] and "unit_cost" in snapshot["companies"]["C0"]
+    assert "[D. 기업 생존 및 예산 제약" in tiny and "…(생략)" not in tiny
+
+    states = {n: market.get_agent_state(n) for n in names[:3]}
+    personas = {n: "균형" for n in names[:3]}
+    system, _ = build_batch_prompt(states, personas, projection)
+    budget = estimate_tokens(system) + 700
+    _, batch = build_batch_prompt(states, personas, projection, token_budget=budget)
+    assert estimate_tokens(system) + estimate_tokens(batch) <= budget
+    snapshot_of(batch)
+
+def _create_mock_simulation(monkeypatch, names=("A", "B"), **options):
+    from fastapi.testclient import TestClient
+    import api_main
+
+    monkeypatch.setenv("GOOGLE_API_KEY", "dummy")
+    client = TestClient(api_main.app)
+    companies = [{"name": n, "persona": "테스트", "initial_unit_cost": 100, "initial_market_share": 0.3,
+                  "initial_product_quality": 50.0, "initial_brand_awareness": 50.0} for n in names]
+    sim_id = client.post("/simulations", json={"companies": companies, "total_turns": 5,
+                                               "market_size": 1000, "initial_capital": 100000,
+                                               **options}).json()["simulation_id"]
+    for agent in api_main.active_simulations[sim_id]["agents"]:
+        agent.use_mock = True
+    return client, sim_id
+
+def test_get_choices_stream_emits_fast_agents_first(monkeypatch):
+    import asyncio
+    import json
+    import api_main
+
+    monkeypatch.setattr(api_main, "CHOICE_STREAM_PROGRESS_SEC", 0.05)
+    client, sim_id = _create_mock_simulation(monkeypatch)
+    slow = api_main.active_simulations[sim_id]["agents"][0]
+    fast_decide = slow.decide_action
+    async def slow_decide(*args, **kwargs):
+        await asyncio.sleep(0.3)
+        return await fast_decide(*args, **kwargs)
+    slow.decide_action = slow_decide
+
+    events = []
+    with client.stream("GET", f"/simulations/{sim_id}/get_choices_stream") as response:
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                events.append([line[len("event: "):], None])
+            elif line.startswith("data: "):
+                events[-1][1] = json.loads(line[len("data: "):])
+
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "start" and kinds[-1] == "done"
+    choice_agents = [data["agent"] for kind, data in events if kind == "choice"]
+    assert choice_agents == ["B", "A"]
+    assert "progress" in kinds[kinds.index("choice"):]
+    assert list(events[-1][1]["choices"]) == ["A", "B"]
+
+def test_http_standin_backend_returns_valid_choices(monkeypatch):
+    import asyncio
+    from agent import AIAgent
+    from llm_cache import LLMResponseCache
+    from llm_standin import StandInConfig, start_standin
+
+    server, url = start_standin(config=StandInConfig(latency_median=0.0, error_rate=0.0))
+    try:
+        monkeypatch.setenv("LLM_HTTP_URL", url)
+        monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+        monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+        agent = AIAgent("A", "테스트", backend="http", response_cache=LLMResponseCache(mode="off"))
+        market = MarketSimulator(["A", "B"], {"market_size": 1000, "initial_capital": 100000})
+        choices = asyncio.run(agent.decide_action(market.get_market_state()))
+    finally:
+        server.shutdown()
+
+    assert len(choices) == 3
+    assert abs(sum(c["probability"] for c in choices) - 1.0) < 1e-6
+    unit_cost = market.companies["A"]["unit_cost"]
+    assert all(c["decision"]["price"] > unit_cost for c in choices)
+
+def test_batched_prompting_one_call_with_per_agent_fallback(monkeypatch):
+    import asyncio
+    import json
+    from agent import AIAgent, decide_actions_batched
+    from llm_cache import LLMResponseCache
+    from prompt_builder import TurnProjection
+
+    monkeypatch.setenv("GOOGLE_API_KEY", "dummy")
+    names = ["A", "B", "C"]
+    agents = [AIAgent(n, f"{n} 페르소나", response_cache=LLMResponseCache(mode="off")) for n in names]
+    market = MarketSimulator(names, {"market_size": 1000, "initial_capital": 100000})
+    states = {n: market.get_market_state() for n in names}
+
+    prompts = []
+    async def fake_call(prompt, deadline=None, system_instruction=None):
+        prompts.append((system_instruction, prompt))
+        choice = {"reasoning": "r", "probability": 1.0, "decision": {"price": 150, "marketing_brand_spend": 0,
+                  "marketing_promo_spend": 0, "rd_innovation_spend": 0, "rd_efficiency_spend": 0}}
+        return json.dumps({"A": [choice], "B": "잘못된 형식"})  # C 누락
+    agents[0].get_gemini_response_async = fake_call
+
+    result = asyncio.run(decide_actions_batched(agents, states, TurnProjection(states["A"])))
+    assert len(prompts) == 1
+    system, prompt = prompts[0]
+    assert all(f"{n} 페르소나" in system for n in names)
+    assert all(f"## [회사: {n}]" in prompt for n in names)
+    assert result["A"][0]["decision"]["price"] == 150
+    assert "Fallback" not in result["A"][0]["reasoning"]
+    assert "안전 모드" in result["B"][0]["reasoning"] and "안전 모드" in result["C"][0]["reasoning"]
+
+def test_surrogate_agent_learns_persona_policies(tmp_path):
+    import asyncio
+    from surrogate import SurrogateAgent, SurrogatePolicy, load_records, log_decision
+
+    log_path = str(tmp_path / "decisions.jsonl")
+    personas = {"A": "공격적 저가 점유율 확대", "B": "프리미엄 고품질 브랜드"}
+    markups = {"A": 1.05, "B": 1.5}
+    market = MarketSimulator(["A", "B"], BASE_CONFIG)
+    for _ in range(6):
+        state = market.get_market_state()
+        decisions = {}
+        for name in ("A", "B"):
+            me = state["companies"][name]
+            decisions[name] = {"price": int(me["unit_cost"] * markups[name]),
+                               "marketing_brand_spend": 0 if name == "A" else int(me["max_marketing_budget"] * 0.5),
+                               "marketing_promo_spend": int(me["max_marketing_budget"] * 0.4) if name == "A" else 0,
+                               "rd_innovation_spend": 0, "rd_efficiency_spend": 0}
+            log_decision(state, name, personas[name], [{"probability": 1.0, "decision": decisions[name]}], path=log_path)
+        market.process_turn(decisions)
+
+    policy = SurrogatePolicy.fit(load_records(log_path), ridge=0.01)
+    state = market.get_market_state()
+    batch = policy.predict_batch([(state, "A", personas["A"]), (state, "B", personas["B"])])
+    for name, decision in zip(("A", "B"), batch):
+        unit_cost = state["companies"][name]["unit_cost"]
+        assert abs(decision["price"] / unit_cost - markups[name]) < 0.05
+    assert batch[0]["marketing_promo_spend"] > batch[1]["marketing_promo_spend"]
+    assert batch[1]["marketing_brand_spend"] > batch[0]["marketing_brand_spend"]
+
+    path = str(tmp_path / "surrogate_model.json")
+    policy.save(path)
+    agent = SurrogateAgent("B", personas["B"], policy=SurrogatePolicy.load(path))
+    choices = asyncio.run(agent.decide_action(state))
+    assert choices[0]["probability"] == 1.0 and choices[0]["decision"] == batch[1]
+
+def test_decision_schema_repairs_near_misses_and_counts_fallbacks():
+    import pytest
+    from decision_schema import DecisionParseError, DecisionStats, parse_choices
+
+    stats = DecisionStats()
+    direct = '[{"reasoning": "a", "probability": 1.0, "decision": {"price": 120}}]'
+    assert parse_choices(direct, stats)[0]["decision"]["marketing_brand_spend"] == 0
+
+    fenced = ('분석 결과입니다.\n```json\n[{"reasoning": "a", "probability": "60%", "decision": {"price": "1,200", '
+              '"marketing_spend": 500, "rd_innovation_spend": -3}}, {"probability": 0.2, "decision": {"price": 1100}},]\n```')
+    choices = parse_choices(fenced, stats)
+    assert choices[0]["decision"] == {"price": 1200, "marketing_brand_spend": 500, "marketing_promo_spend": 0,
+                                      "rd_innovation_spend": 0, "rd_efficiency_spend": 0}
+    assert abs(sum(c["probability"] for c in choices) - 1.0) < 1e-9
+
+    truncated = '{"choices": [{"probability": 1.0, "decision": {"price": 130, "rd_efficiency_spend": 10'
+    assert parse_choices(truncated, stats)[0]["decision"]["rd_efficiency_spend"] == 10
+
+    with pytest.raises(DecisionParseError):
+        parse_choices('[{"reasoning": "가격 없음"}]', stats)
+    summary = stats.summary()
+    assert summary["parse"] == {"direct": 1, "repaired": 2, "failed": 1}
+    assert summary["parse_time"]["count"] == 4
+
+def test_chunked_scenario_generation_runs_turns_concurrently_and_caches(monkeypatch, tmp_path):
+    import asyncio
+    import json
+    from types import SimpleNamespace
+    import agent
+    from llm_cache import LLMResponseCache
+
+    monkeypatch.setenv("GOOGLE_API_KEY", "dummy")
+    monkeypatch.setattr(agent, "_scenario_cache", LLMResponseCache(path=str(tmp_path / "scenario.sqlite3")))
+    inputs = {"price": 800, "unit_cost": 600, "marketing_spend_ratio": 0.1, "rd_spend_ratio": 0.1,
+              "initial_quality": 70, "initial_brand": 60}
+    outline = {"scenario_name": "S", "description": "d", "key_turn": 1,
+               "config": {"total_turns": 10, "market_size": 1000, "initial_capital": 10 ** 8,
+                          "physics": {"price_sensitivity": 30, "marketing_efficiency": 2, "weight_quality": 0.5,
+                                      "weight_brand": 0.3, "weight_price": 0.2, "others_overall_competitiveness": 0.5},
+                          "marketing_cost_base": 1, "rd_innovation_threshold": 1, "rd_efficiency_threshold": 1},
+               "companies": [{"name": n, "identity": f"{n} 정체성", "inputs": inputs} for n in ("A", "B")],
+               "turn_descriptions": ["t0", "t1", "t2", "t3", "t4"]}
+    calls = {"outline": 0, "turn": 0, "in_flight": 0, "max_in_flight": 0, "truncated_once": False}
+
+    class FakePool:
+        async def generate_content(self, model, contents, config=None, sim_id=None):
+            if "시나리오 개요 JSON" in contents:
+                calls["outline"] += 1
+                if calls["outline"] == 1:  # 요청보다 짧은 개요 -> 다시 요청
+                    return SimpleNamespace(text=json.dumps({**outline, "turn_descriptions": ["t0", "t1"]}))
+                return SimpleNamespace(text=json.dumps(outline))
+            calls["turn"] += 1
+            calls["in_flight"] += 1
+            calls["max_in_flight"] = max(calls["max_in_flight"], calls["in_flight"])
+            await asyncio.sleep(0.01)
+            calls["in_flight"] -= 1
+            turn = int(contents.split("# 작성할 턴: ")[1].split("\n")[0])
+            company = {"persona": "p", "inputs": inputs,
+                       "outputs": {"actual_market_share": 0.3, "actual_accumulated_profit": 100}}
+            text = json.dumps({"turn": turn, "turn_description": f"t{turn}", "companies": {"A": company, "B": company}})
+            if turn == 2 and not calls["truncated_once"]:
+                calls["truncated_once"] = True
+                text = text[:40]  # 잘린 응답 -> 이 턴만 다시 요청
+            return SimpleNamespace(text=text)
+
+    monkeypatch.setattr(agent, "get_llm_pool", lambda backend=None: FakePool())
+    scenario = asyncio.run(agent.generate_scenario_async("  스마트폰   전쟁 ", total_turns=3))
+    assert [t["turn"] for t in scenario["turns_data"]] == [0, 1, 2]
+    assert calls["outline"] == 2 and calls["turn"] == 4 and calls["max_in_flight"] == 3
+    agent.ScenarioOutput.model_validate(scenario)
+    # 개요가 더 긴 턴 수를 적어도 요청한 total_turns로 고정
+    assert scenario["config"]["total_turns"] == 3
+    assert scenario["config"]["marketing_cost_base"] == int(1000 * 800 * 0.1)
+
+    again = asyncio.run(agent.generate_scenario_async("스마트폰 전쟁", total_turns=3))
+    assert again == scenario and calls["outline"] == 2
+
+def test_llm_trace_records_calls_and_summarizes(monkeypatch, tmp_path):
+    import asyncio
+    from types import SimpleNamespace
+    import llm_pool
+    import llm_trace
+    from agent import AIAgent
+    from llm_cache import LLMResponseCache
+
+    monkeypatch.setenv("LLM_TRACE_DIR", str(tmp_path / "traces"))
+    monkeypatch.setenv("LLM_TRACE_SEGMENT_MB", "0.0005")  # 약 500바이트마다 새 세그먼트
+    # A는 정상 응답, B는 파싱 불가 응답 (순서대로 호출)
+    answers = ['[{"reasoning": "r", "probability": 1.0, "decision": {"price": 150}}]', "응답 아님"]
+
+    class FakeModels:
+        async def generate_content(self, model, contents, config=None):
+            return SimpleNamespace(text=answers.pop(0), usage_metadata=SimpleNamespace(
+                prompt_token_count=100, candidates_token_count=20, cached_content_token_count=0))
+
+    pool = llm_pool.LLMClientPool(max_concurrency=2, requests_per_minute=0, backend="http")
+    monkeypatch.setattr(llm_pool, "_pools", {"http": pool})
+    market = MarketSimulator(["A", "B"], BASE_CONFIG)
+
+    async def run():
+        pool._bind_loop()
+        pool._client = SimpleNamespace(aio=SimpleNamespace(models=FakeModels()))
+        for name in ("A", "B"):
+            agent = AIAgent(name, f"{name} 페르소나", backend="http", sim_id="s1", response_cache=LLMResponseCache(mode="off"))
+            await agent.decide_action(market.get_market_state())
+    asyncio.run(run())
+
+    records = llm_trace.load_traces(str(tmp_path / "traces"))
+    assert len(records) == 2 and len(list((tmp_path / "traces").iterdir())) == 2
+    by_agent = {r["agent"]: r for r in records}
+    assert by_agent["A"]["llm_calls"] == 1 and by_agent["A"]["input_tokens"] == 100
+    assert by_agent["A"]["parse"] == "direct" and by_agent["A"]["fallbacks"] == 0
+    assert by_agent["B"]["parse"] == "failed" and by_agent["B"]["fallbacks"] == 1
+    assert all(r["sim_id"] == "s1" and r["turn"] == 0 and r["latency_sec"] >= r["call_sec"] for r in records)
+
+    summary = llm_trace.summarize(records, by="agent")
+    assert summary["B"]["fallback_rate"] == 1.0 and summary["A"]["output_tokens"]["sum"] == 20
+
+def test_speculative_prefetch_hits_on_predicted_commit_and_misses_otherwise(monkeypatch, tmp_path):
+    import json
+    from speculation import SPECULATOR
+
+    log_path = tmp_path / "decisions.jsonl"
+    monkeypatch.setenv("DECISION_LOG_PATH", str(log_path))
+    logged_turns = lambda: [json.loads(line)["state"]["turn"] for line in log_path.read_text(encoding="utf-8").splitlines()]
+    client, sim_id = _create_mock_simulation(monkeypatch, speculative_prefetch=True)
+    base = SPECULATOR.stats()
+    with client:
+        def commit(choices, price_bump=0):
+            decisions = {}
+            for name, options in choices.items():
+                best = max(options, key=lambda c: c["probability"])
+                decisions[name] = {**best["decision"], "reasoning": best["reasoning"]}
+                decisions[name]["price"] += price_bump
+            assert client.post(f"/simulations/{sim_id}/execute_turn", json={"decisions": decisions}).status_code == 200
+
+        first = client.post(f"/simulations/{sim_id}/get_choices").json()
+        commit(first)
+        second = client.post(f"/simulations/{sim_id}/get_choices").json()
+        assert SPECULATOR.stats()["hits"] == base["hits"] + 1
+        assert set(second) == {"A", "B"}
+        assert logged_turns() == [0, 0, 1, 1]  # 채택된 선행 계산도 실제 턴으로 기록
+
+        commit(second, price_bump=7)  # 예측과 다른 결정 -> 선행 계산 폐기
+        assert SPECULATOR.stats()["misses"] == base["misses"] + 1
+        client.post(f"/simulations/{sim_id}/get_choices")
+        client.post(f"/simulations/{sim_id}/inject_event", json={"description": "e", "target_company": "A",
+                                                                 "effect_type": "brand_awareness", "impact_value": 1,
+                                                                 "duration": 1})
+        assert SPECULATOR.stats()["invalidated"] == base["invalidated"] + 1
+    assert SPECULATOR.stats()["hits"] == base["hits"] + 1
+    assert logged_turns() == [0, 0, 1, 1, 2, 2]  # 폐기된 선행 계산은 기록하지 않음
+
+def test_autoplay_streams_whole_games_without_round_trips(monkeypatch):
+    import asyncio
+    import json
+    import api_main
+    from autoplay import choose_decisions, persona_matchups
+
+    monkeypatch.setenv("LLM_BACKEND", "mock")
+    games = persona_matchups(["저가 공세", "프리미엄", "R&D 집중"], size=2,
+                             template={"total_turns": 3, "market_size": 1000, "initial_capital": 100000})
+    assert len(games) == 3
+    req = api_main.AutoplayRequest(games=games, policy="sample", seed=3, max_concurrent_games=2)
+
+    async def collect_from(request):
+        return [event async for event in api_main.autoplay_events(request)]
+    events = asyncio.run(collect_from(req))
+
+    turns = [e for e in events if e["event"] == "turn"]
+    done = [e for e in events if e["event"] == "game_done"]
+    assert len(turns) == 9 and len(done) == 3 and events[-1] == {"event": "done", "games": 3}
+    assert all(d["turns"] == 3 and d["winner"] in d["accumulated_profit"] for d in done)
+    started = {e["sim_id"] for e in events if e["event"] == "game_start"}
+    assert not started & set(api_main.active_simulations)
+    json.dumps(events, default=float)
+
+    # 잘못된 설정의 게임은 error 이벤트로 알리고, 이미 만든 시뮬레이션은 남기지 않음
+    bad = {**games[1], "companies": [{**c, "agent_backend": "bogus"} for c in games[1]["companies"]]}
+    before = set(api_main.active_simulations)
+    events = asyncio.run(collect_from(api_main.AutoplayRequest(games=[games[0], bad], policy="top", seed=3)))
+    assert [e for e in events if e["event"] == "error"][0]["game"] == 1
+    assert [e["game"] for e in events if e["event"] == "game_done"] == [0]
+    assert events[-1] == {"event": "done", "games": 1}
+    assert set(api_main.active_simulations) == before
+
+    choices = {"A": [{"reasoning": "a", "probability": 0.9, "decision": {"price": 1}},
+                     {"reasoning": "b", "probability": 0.1, "decision": {"price": 2}}]}
+    assert choose_decisions(choices)["A"] == {"price": 1, "reasoning": "a"}
+
+def test_best_response_dummy_and_baseline_agent(monkeypatch):
+    import asyncio
+    import copy
+    import numpy as np
+    from best_response import BestResponseAgent, LogitModel, best_response_prices
+
+    fixed = MarketSimulator(["A", "B"], BASE_CONFIG)
+    best = MarketSimulator(["A", "B"], {**BASE_CONFIG, "dummy_policy": "best_response"})
+    decisions = {n: {"price": int(fixed.companies[n]["unit_cost"] * 1.3), "marketing_brand_spend": 0,
+                     "marketing_promo_spend": 0, "rd_innovation_spend": 0, "rd_efficiency_spend": 0} for n in ("A", "B")}
+    fixed.process_turn(copy.deepcopy(decisions))
+    best.process_turn(copy.deepcopy(decisions))
+    assert best.history[-1]["Others_profit"] > fixed.history[-1]["Others_profit"]
+
+    # 뉴턴 결과가 격자 탐색 최적값과 일치
+    state = {n: {**decisions[n]} for n in ("A", "B")}
+    state["Others"] = {"price": 100}
+    model = LogitModel(fixed.config, fixed.companies, state)
+    price = best_response_prices(model, ["Others"])[0]
+    cost = fixed.companies["Others"]["unit_cost"]
+    def profit(p):
+        model.prices[2] = p
+        return model.shares(model.utilities(model.prices[None, :]))[0][2] * (p - cost)
+    grid = np.linspace(cost * 1.01, cost * 3, 2000)
+    assert abs(price - grid[int(np.argmax([profit(p) for p in grid]))]) < cost * 0.01
+
+    choices = asyncio.run(BestResponseAgent("A").decide_action(fixed.get_market_state()))
+    me = fixed.companies["A"]
+    assert choices[0]["decision"]["price"] > me["unit_cost"]
+    assert choices[0]["decision"]["marketing_brand_spend"] <= me["max_marketing_budget"]
+
+    client, sim_id = _create_mock_simulation(monkeypatch, dummy_policy="best_response")
+    assert client.post("/simulations", json={"companies": [], "dummy_policy": "nope"}).status_code == 400
+
+def test_batch_market_matches_process_turn_and_lookahead_is_attached(monkeypatch):
+    import contextlib
+    import copy
+    import io
+    import random
+    import numpy as np
+    import pytest
+    from batch_sim import BatchMarket, project_choices
+    from speculation import DECISION_FIELDS
+
+    rng = random.Random(1)
+    for policy in ("fixed", "best_response"):
+        market = MarketSimulator(["A", "B"], {**BASE_CONFIG, "dummy_policy": policy})
+        market.inject_event("원가 상승", "A", "unit_cost_multiplier", 1.1, 2)
+        batch = BatchMarket(market, 2)
+        for _ in range(4):
+            decisions = {n: {"price": rng.randint(100, 200), "marketing_brand_spend": rng.randint(0, 20000),
+                             "marketing_promo_spend": rng.randint(0, 20000), "rd_innovation_spend": rng.randint(0, 30000),
+                             "rd_efficiency_spend": rng.randint(0, 30000)} for n in ("A", "B")}
+            out = batch.step(np.array([[[decisions[n][f] for f in DECISION_FIELDS] for n in ("A", "B")]] * 2))
+            with contextlib.redirect_stdout(io.StringIO()):
+                market.process_turn(copy.deepcopy(decisions))
+            for i, name in enumerate(market.all_company_names):
+                assert out["market_share"][1, i] == pytest.approx(market.history[-1][f"{name}_market_share"], abs=1e-9)
+                assert out["profit"][1, i] == pytest.approx(market.history[-1][f"{name}_profit"], rel=1e-9, abs=1e-6)
+        assert batch.accumulated_profit[0, :2] == pytest.approx([market.companies[n]["accumulated_profit"] for n in ("A", "B")])
+
+    option = lambda price, p: {"reasoning": "", "probability": p, "decision": {"price": price}}
+    choices = {"A": [option(120, 0.7), option(300, 0.3)], "B": [option(130, 1.0)]}
+    projected = project_choices(market, choices, turns=2)
+    cheap, dear = projected["A"][0]["lookahead"], projected["A"][1]["lookahead"]
+    assert cheap["turns"] == 2 and cheap["market_share"] > dear["market_share"]
+    assert "lookahead" not in choices["A"][0]
+
+    client, sim_id = _create_mock_simulation(monkeypatch)
+    result = client.post(f"/simulations/{sim_id}/get_choices").json()
+    assert all("lookahead" in c for options in result.values() for c in options)
+
+def test_what_if_demand_curve_is_read_only_and_matches_process_turn(monkeypatch):
+    import contextlib
+    import copy
+    import io
+    import pytest
+    import api_main
+
+    client, sim_id = _create_mock_simulation(monkeypatch)
+    market = api_main.active_simulations[sim_id]["market"]
+    before = copy.deepcopy(market.companies)
+    result = client.post(f"/simulations/{sim_id}/what_if",
+                         json={"company": "A", "price_steps": 50, "promo_spends": [0, 500], "brand_spends": [0, 1000]}).json()
+    assert result["points"] == 200 and len(result["curve"]) == 50
+    assert market.companies == before and market.turn == 0
+    assert result["best"]["profit"] == max(p["profit"] for p in result["curve"])
+
+    best = result["best"]
+    fork = copy.deepcopy(market)
+    held = {"price": fork.companies["B"]["unit_cost"] * 1.2}
+    with contextlib.redirect_stdout(io.StringIO()):
+        fork.process_turn({"A": {"price": best["price"], "marketing_promo_spend": best["marketing_promo_spend"],
+                                 "marketing_brand_spend": best["marketing_brand_spend"]}, "B": held})
+    assert fork.history[-1]["A_profit"] == pytest.approx(best["profit"])
+    assert client.post(f"/simulations/{sim_id}/what_if", json={"company": "Others"}).status_code == 400
+
+def test_oracle_planner_bounds_agent_regret_within_budgets(monkeypatch):
+    import pytest
+    import api_main
+
+    client, sim_id = _create_mock_simulation(monkeypatch)
+    assert client.post(f"/simulations/{sim_id}/oracle", json={"company": "A"}).status_code == 400  # 아직 진행한 턴 없음
+    for width in (0, 65):
+        assert client.post(f"/simulations/{sim_id}/oracle", json={"company": "A", "beam_width": width}).status_code == 422
+    market = api_main.active_simulations[sim_id]["market"]
+    for turn in range(3):
+        if turn == 1:
+            client.post(f"/simulations/{sim_id}/inject_event", json={"description": "원가 상승", "target_company": "A",
+                                                                     "effect_type": "unit_cost_multiplier", "impact_value": 1.2, "duration": 2})
+        decisions = {n: {"price": 120, "marketing_brand_spend": 100, "marketing_promo_spend": 0,
+                         "rd_innovation_spend": 0, "rd_efficiency_spend": 0, "reasoning": ""} for n in ("A", "B")}
+        client.post(f"/simulations/{sim_id}/execute_turn", json={"decisions": decisions})
+
+    report = client.post(f"/simulations/{sim_id}/oracle", json={"company": "A", "beam_width": 4}).json()
+    # 스냅샷 재생이 실제 진행과 일치하고, 실제 경로가 빔에 남아 있으므로 regret >= 0
+    assert report["agent"]["accumulated_profit"] == pytest.approx(market.companies["A"]["accumulated_profit"])
+    assert report["regret"] >= 0 and len(report["oracle"]["trajectory"]) == 3
+
+    budget_mkt = api_main.active_simulations[sim_id]["initial_market"].companies["A"]["max_marketing_budget"]
+    first = report["oracle"]["trajectory"][0]["decision"]
+    assert first["marketing_brand_spend"] + first["marketing_promo_spend"] <= budget_mkt
+
+    forward = client.post(f"/simulations/{sim_id}/oracle", json={"company": "B", "mode": "forward"}).json()
+    assert forward["turns"] == 2 and "regret" not in forward
+
+def test_tournament_checkpoints_resumes_and_ranks_personas(tmp_path):
+    import asyncio
+    import pytest
+    from tournament import Tournament, update_elo
+
+    checkpoint = str(tmp_path / "tournament.json")
+    spec = {"personas": {"저가": "공격적 저가", "프리미엄": "고품질 브랜드", "균형": "균형 전략"},
+            "seeds": [0, 1], "backend": "best_response", "template": {"total_turns": 2, "market_size": 1000,
+                                                                       "initial_capital": 100000}}
+    first = Tournament(spec, checkpoint)
+    asyncio.run(first.run(max_games=2))
+    assert len(first.results) == 2
+
+    with pytest.raises(ValueError, match="seeds"):
+        Tournament({**spec, "seeds": [0, 1, 2]}, checkpoint)  # 다른 spec으로는 재개하지 않음
+    assert Tournament({**spec, "backend": "mock", "concurrency": 2}, checkpoint).spec["backend"] == "mock"
+    resumed = Tournament(None, checkpoint)  # spec도 체크포인트에서 복원
+    done_before = dict(resumed.results)
+    board = asyncio.run(resumed.run())
+    assert len(resumed.results) == 6 and all(resumed.results[k] == v for k, v in done_before.items())
+    assert sum(row["games"] for row in board) == 12 and sum(row["wins"] for row in board) <= 6
+    assert board == sorted(board, key=lambda r: (-r["elo_profit"], -r["elo_share"], r["persona"]))
+
+    swiss = Tournament({**spec, "personas": ["a", "b", "c", "d"], "format": "swiss", "rounds": 2, "seeds": [0]})
+    asyncio.run(swiss.run())
+    rounds = [sorted(tuple(r["players"]) for r in swiss.results.values() if r["round"] == n) for n in (0, 1)]
+    assert len(rounds[0]) == len(rounds[1]) == 2 and not set(rounds[0]) & set(rounds[1])
+
+    ratings = {}
+    update_elo(ratings, {"x": 10, "y": 5})
+    assert ratings["x"] == 1516 and ratings["y"] == 1484
+
+def test_tournament_cached_backend_replays_even_with_read_write_env(monkeypatch, tmp_path):
+    import asyncio
+    import os
+    import agent
+    from tournament import Tournament
+
+    monkeypatch.setenv("LLM_CACHE_MODE", "read_write")
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    network_calls = []
+    def no_network(backend=None):
+        network_calls.append(backend)  # decide_action이 예외를 Fallback으로 삼키므로 호출 기록으로 확인
+        raise RuntimeError("network")
+    monkeypatch.setattr(agent, "get_llm_pool", no_network)
+
+    tournament = Tournament({"personas": ["a", "b"], "backend": "cached",
+                             "template": {"total_turns": 1, "market_size": 1000, "initial_capital": 100000}})
+    assert tournament.response_cache.mode == "replay"
+    asyncio.run(tournament.run())
+    assert len(tournament.results) == 1 and not network_calls
+    assert os.environ["LLM_CACHE_MODE"] == "read_write"
+
+def test_rolling_aggregates_match_history_rescans():
+    import contextlib
+    import io
+    import pytest
+    from prompt_builder import build_decision_prompt
+
+    sim = MarketSimulator(["A", "B"], BASE_CONFIG)
+    assert "historical_summary" not in sim.get_agent_state("A")
+    with contextlib.redirect_stdout(io.StringIO()):
+        for turn in range(1, 10):
+            sim.process_turn({n: {"price": 100 + 7 * turn + (n == "B") * 5, "marketing_brand_spend": 10 * turn,
+                                  "marketing_promo_spend": 0, "rd_innovation_spend": 0, "rd_efficiency_spend": 0}
+                              for n in ("A", "B")})
+            state = sim.get_agent_state("A")
+            recent = [h["A_profit"] for h in sim.history[-4:]]
+            assert state["historical_summary"]["window_size"] == len(recent)
+            assert state["historical_summary"]["my_avg_profit_4turn"] == pytest.approx(sum(recent) / len(recent))
+            if turn > 1:
+                change = sim.history[-1]["A_profit"] - sim.history[-2]["A_profit"]
+                assert state["last_turn_comparison"]["my_profit_change"] == pytest.approx(change)
+            # 분기 보고서는 분기가 끝난 턴에만 공개
+            assert ("quarterly_report" in state) == (turn % 4 == 0)
+            if turn == 8:
+                report = state["quarterly_report"]
+                assert report["turn_range"] == [5, 8]
+                assert report["data"]["B"]["revenue"] == pytest.approx(sum(h["B_revenue"] for h in sim.history[4:8]))
+                _, prompt = build_decision_prompt("A", "테스트", state)
+                assert "5~8턴" in prompt and "전 턴 대비" in prompt
+
+def test_concurrent_get_choices_share_one_flight_and_stale_execute_is_rejected(monkeypatch):
+    import asyncio
+    import httpx
+    import api_main
+    from choice_flight import CHOICE_FLIGHTS
+
+    client, sim_id = _create_mock_simulation(monkeypatch)
+    calls = []
+    for agent in api_main.active_simulations[sim_id]["agents"]:
+        original = agent.decide_action
+        async def counted(*args, _original=original, _name=agent.name, **kwargs):
+            calls.append(_name)
+            await asyncio.sleep(0.05)
+            return await _original(*args, **kwargs)
+        agent.decide_action = counted
+    base = CHOICE_FLIGHTS.stats()
+
+    async def run():
+        transport = httpx.ASGITransport(app=api_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            first, second = await asyncio.gather(*(http.post(f"/simulations/{sim_id}/get_choices") for _ in range(2)))
+            again = await http.post(f"/simulations/{sim_id}/get_choices")
+            choices = first.json()
+            decisions = {name: {**options[0]["decision"], "reasoning": options[0]["reasoning"]}
+                         for name, options in choices.items()}
+            committed = await asyncio.gather(*(http.post(f"/simulations/{sim_id}/execute_turn",
+                                                         json={"decisions": decisions, "turn": 0}) for _ in range(2)))
+            after = await http.post(f"/simulations/{sim_id}/get_choices")
+            return first.json(), second.json(), again.json(), committed, after.json()
+
+    first, second, again, committed, after = asyncio.run(run())
+    assert first == second == again
+    assert sorted(calls) == ["A", "A", "B", "B"]  # 턴 0에 한 번, 턴 1에 한 번
+    assert sorted(r.status_code for r in committed) == [200, 409]
+    assert api_main.active_simulations[sim_id]["market"].turn == 1 and set(after) == {"A", "B"}
+    stats = CHOICE_FLIGHTS.stats()
+    assert stats["started"] == base["started"] + 2
+    assert stats["joined"] == base["joined"] + 1 and stats["cached"] == base["cached"] + 1
+
+def test_execute_turn_cancels_in_flight_choices_for_that_turn(monkeypatch):
+    import asyncio
+    import httpx
+    import api_main
+    from choice_flight import CHOICE_FLIGHTS
+
+    client, sim_id = _create_mock_simulation(monkeypatch, speculative_prefetch=True)
+    sim_data = api_main.active_simulations[sim_id]
+    for agent in sim_data["agents"]:
+        original = agent.decide_action
+        async def slow(*args, _original=original, **kwargs):
+            await asyncio.sleep(0.3)
+            return await _original(*args, **kwargs)
+        agent.decide_action = slow
+    decisions = {name: {"price": 150, "marketing_brand_spend": 0, "marketing_promo_spend": 0,
+                        "rd_innovation_spend": 0, "rd_efficiency_spend": 0, "reasoning": "manual"}
+                 for name in ("A", "B")}
+    base = CHOICE_FLIGHTS.stats()
+
+    async def run():
+        transport = httpx.ASGITransport(app=api_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            async def execute_soon():
+                await asyncio.sleep(0.05)
+                return await http.post(f"/simulations/{sim_id}/execute_turn", json={"decisions": decisions, "turn": 0})
+            return await asyncio.gather(http.post(f"/simulations/{sim_id}/get_choices"), execute_soon())
+
+    choices, executed = asyncio.run(run())
+    assert executed.status_code == 200 and choices.status_code == 409
+    assert CHOICE_FLIGHTS.stats()["cancelled"] == base["cancelled"] + 1
+    assert sim_data["speculation"] is None and sim_data["choice_flight"] is None
+
+def test_speculative_decisions_skip_decision_log_and_stats(monkeypatch, tmp_path):
+    import asyncio
+    import llm_trace
+    from agent import AIAgent
+    from decision_schema import DECISION_STATS, DeferredDecisions
+
+    monkeypatch.setenv("LLM_TRACE_DIR", str(tmp_path / "traces"))
+    monkeypatch.setenv("DECISION_LOG_PATH", str(tmp_path / "decisions.jsonl"))
+    agent = AIAgent("A", "테스트", use_mock=True)
+    state = MarketSimulator(["A", "B"], BASE_CONFIG).get_market_state()
+    before = DECISION_STATS.summary()
+
+    deferred = DeferredDecisions()
+    assert asyncio.run(agent.decide_action(state, deferred=deferred))
+    assert DECISION_STATS.summary() == before
+    assert not (tmp_path / "decisions.jsonl").exists()
+
+    deferred.commit()  # 채택(hit)되면 그때 반영
+    assert DECISION_STATS.summary()["decisions"] == before["decisions"] + 1
+    assert len((tmp_path / "decisions.jsonl").read_text(encoding="utf-8").splitlines()) == 1
+
+    asyncio.run(agent.decide_action(state))
+    assert DECISION_STATS.summary()["decisions"] == before["decisions"] + 2
+    assert len((tmp_path / "decisions.jsonl").read_text(encoding="utf-8").splitlines()) == 2
+    kinds = [r["kind"] for r in llm_trace.load_traces(str(tmp_path / "traces"))]
+    assert sorted(kinds) == ["decision", "speculative"]
@@ -0,0 +1,279 @@
+# tournament.py
+"""
+페르소나 토너먼트: 페르소나 대진을 프리셋 x 시나리오 x seed 마다 병렬로 자동 진행하고 Elo 리더보드를 만듭니다.
+
+- 대진 방식
+    round_robin: 모든 size인 페르소나 조합 (1라운드)
+    swiss:       라운드마다 현재 Elo 순으로 정렬해 아직 만나지 않은 비슷한 순위끼리 대진 (rounds 라운드)
+- 게임은 api_main.autoplay_events로 동시에 진행합니다. (처리량은 에이전트 백엔드 속도에만 묶임)
+- 백엔드: mock(LLM 없음) / cached(LLM 캐시 replay, 네트워크 호출 없음) / live(기본 LLM 백엔드 + 캐시 read_write)
+          / surrogate / best_response
+- 게임이 끝날 때마다 체크포인트(JSON)에 결과를 기록하므로, 중단된 토너먼트는 같은 체크포인트로 다시 실행하면
+  끝난 게임은 건너뛰고 이어서 진행합니다. Elo는 기록된 결과에서 항상 같은 순서로 다시 계산합니다.
+- Elo는 게임 내 모든 쌍을 누적 이익(elo_profit)과 최종 점유율(elo_share)로 각각 비교해 갱신합니다.
+
+    python -m tournament --spec tournament.json --checkpoint tournament_state.json
+
+spec 예시:
+    {"personas": {"저가": "공격적 저가 점유율 확대", "프리미엄": "고품질 브랜드"},
+     "presets": [null, "camera.json"], "scenarios": [{"name": "불황", "gdp_growth_rate": -0.01}],
+     "seeds": [0, 1], "format": "swiss", "rounds": 3, "size": 2, "backend": "mock",
+     "policy": "sample", "concurrency": 32, "template": {"total_turns": 10}}
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+
+from autoplay import AUTOPLAY_POLICIES, matchup_config
+from llm_cache import response_cache_from_env
+
+TOURNAMENT_FORMATS = ("round_robin", "swiss")
+TOURNAMENT_BACKENDS = ("mock", "cached", "live", "surrogate", "best_response")
+ELO_INITIAL = 1500.0
+ELO_K = 32.0
+
+DEFAULT_SPEC = {
+    "presets": [None],
+    "scenarios": [{"name": "base"}],
+    "seeds": [0],
+    "format": "round_robin",
+    "rounds": 3,
+    "size": 2,
+    "backend": "mock",
+    "policy": "top",
+    "concurrency": 16,
+    "template": {},
+    "k_factor": ELO_K,
+}
+# 체크포인트로 재개할 때 바꿔도 되는 spec 항목 (결과/대진에 영향 없음)
+RESUME_OVERRIDABLE = ("backend", "concurrency")
+
+
+def _agent_backend(backend: str):
+    """토너먼트 백엔드 -> CompanyConfig.agent_backend (cached/live는 기본 LLM 백엔드 + 전용 캐시)"""
+    if backend not in TOURNAMENT_BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Use one of {TOURNAMENT_BACKENDS}")
+    return None if backend in ("cached", "live") else backend
+
+
+def _response_cache(backend: str):
+    """
+    cached/live 에이전트에 넘길 LLM 응답 캐시. LLM_CACHE_MODE와 상관없이 모드를 고정합니다.
+    (cached가 replay가 아니면 캐시에 없는 프롬프트가 실제 호출로 새어 나감)
+    """
+    if backend == "cached":
+        return response_cache_from_env("replay")
+    if backend == "live":
+        return response_cache_from_env("read_write")
+    return None
+
+
+def update_elo(ratings: dict, ranking: dict, k: float = ELO_K):
+    """ranking {이름: 점수(클수록 좋음)}의 모든 쌍으로 ratings를 갱신합니다. (다인 게임은 K를 상대 수로 나눔)"""
+    names = list(ranking)
+    if len(names) < 2:
+        return
+    k = k / (len(names) - 1)
+    delta = {n: 0.0 for n in names}
+    for a, b in itertools.combinations(names, 2):
+        ra, rb = ratings.setdefault(a, ELO_INITIAL), ratings.setdefault(b, ELO_INITIAL)
+        expected = 1.0 / (1.0 + 10 ** ((rb - ra) / 400.0))
+        score = 1.0 if ranking[a] > ranking[b] else 0.5 if ranking[a] == ranking[b] else 0.0
+        delta[a] += k * (score - expected)
+        delta[b] -= k * (score - expected)
+    for n in names:
+        ratings[n] += delta[n]
+
+
+def _check_resume_spec(saved: dict, spec: dict):
+    """체크포인트의 spec과 backend/concurrency 외에 다르면 재개를 거부합니다. (다른 토너먼트 결과가 섞이지 않게)"""
+    def normalize(s):
+        s = {k: v for k, v in {**DEFAULT_SPEC, **s}.items() if k not in RESUME_OVERRIDABLE}
+        return json.loads(json.dumps(s, default=float))
+    saved, spec = normalize(saved), normalize(spec)
+    changed = sorted(k for k in saved.keys() | spec.keys() if saved.get(k) != spec.get(k))
+    if changed:
+        raise ValueError(f"Checkpoint spec differs in {changed}; use a new --checkpoint or omit --spec to resume")
+
+
+class Tournament:
+    def __init__(self, spec: dict, checkpoint_path: str = None):
+        self.checkpoint_path = checkpoint_path
+        state = None
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if spec is not None:
+                _check_resume_spec(state["spec"], spec)
+            spec = spec or state["spec"]
+        self.spec = {**DEFAULT_SPEC, **(spec or {})}
+        personas = self.spec["personas"]
+        if isinstance(personas, list):
+            personas = {f"P{i}": p for i, p in enumerate(personas)}
+        self.personas = personas
+        if self.spec["format"] not in TOURNAMENT_FORMATS:
+            raise ValueError(f"Unknown format '{self.spec['format']}'. Use one of {TOURNAMENT_FORMATS}")
+        if self.spec["policy"] not in AUTOPLAY_POLICIES:
+            raise ValueError(f"Unknown policy '{self.spec['policy']}'. Use one of {AUTOPLAY_POLICIES}")
+        self.agent_backend = _agent_backend(self.spec["backend"])
+        self.response_cache = _response_cache(self.spec["backend"])
+        self.results = (state or {}).get("results", {})
+        if self.results:
+            print(f"♻️ [Tournament] 체크포인트에서 {len(self.results)}게임 복원")
+
+    # --- 대진 ---
+    def _games_for(self, round_no: int, players: tuple) -> list:
+        """한 대진을 프리셋 x 시나리오 x seed 게임들로 펼칩니다. [(게임 키, 메타)]"""
+        games = []
+        for preset, scenario, seed in itertools.product(self.spec["presets"], self.spec["scenarios"], self.spec["seeds"]):
+            name = scenario.get("name", "base")
+            key = f"r{round_no}|{preset or '-'}|{name}|s{seed}|{'+'.join(players)}"
+            games.append((key, {"round": round_no, "players": list(players), "preset": preset,
+                                "scenario": name, "seed": seed}))
+        return games
+
+    def _pairings(self, round_no: int) -> list:
+        ids = sorted(self.personas)
+        size = self.spec["size"]
+        if self.spec["format"] == "round_robin":
+            return list(itertools.combinations(ids, size))
+        # swiss: Elo 순으로 정렬 후 위에서부터 아직 함께 뛰지 않은 상대를 우선해 size명씩 묶음
+        ratings = self.ratings()["elo_profit"]
+        order = sorted(ids, key=lambda n: (-ratings.get(n, ELO_INITIAL), n))
+        met = {frozenset(r["players"]) for r in self.results.values() if r["round"] < round_no}
+        pairings = []
+        while len(order) >= size:
+            group = [order.pop(0)]
+            while len(group) < size:
+                fresh = [n for n in order if not any(frozenset((g, n)) <= m for g in group for m in met)]
+                group.append(order.pop(order.index((fresh or order)[0])))
+            pairings.append(tuple(sorted(group)))
+        return pairings
+
+    def _config(self, meta: dict) -> dict:
+        scenario = next(s for s in self.spec["scenarios"] if s.get("name", "base") == meta["scenario"])
+        template = {**self.spec["template"], **{k: v for k, v in scenario.items() if k != "name"},
+                    "agent_backend": self.agent_backend}
+        config = matchup_config([(p, self.personas[p]) for p in meta["players"]], template)
+        if meta["preset"]:
+            config["preset_name"] = meta["preset"]
+        return config
+
+    # --- 진행 ---
+    def _save(self):
+        if not self.checkpoint_path:
+            return
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"spec": self.spec, "results": self.results}, f, ensure_ascii=False, indent=2, default=float)
+        os.replace(tmp, self.checkpoint_path)
+
+    async def _play(self, games: list, max_games: int = None) -> int:
+        import api_main
+
+        pending = [(key, meta) for key, meta in games if key not in self.results]
+        if max_games is not None:
+            pending = pending[:max_games]
+        if not pending:
+            return 0
+        req = api_main.AutoplayRequest(games=[self._config(meta) for _, meta in pending], policy=self.spec["policy"],
+                                       game_seeds=[meta["seed"] for _, meta in pending],
+                                       max_concurrent_games=self.spec["concurrency"])
+        for config in req.games:
+            config._response_cache = self.response_cache
+        played = 0
+        async for event in api_main.autoplay_events(req):
+            if event["event"] == "game_done":
+                key, meta = pending[event["game"]]
+                self.results[key] = {**meta, "accumulated_profit": event["accumulated_profit"],
+                                     "market_share": event["market_share"], "winner": event["winner"]}
+                self._save()
+                played += 1
+                print(f"🏁 [Tournament] {key} winner={event['winner']} ({len(self.results)} done)")
+            elif event["event"] == "error":
+                print(f"!!! [Tournament] {pending[event['game']][0]} error: {event['error']} (재개 시 다시 실행)")
+        return played
+
+    async def run(self, max_games: int = None) -> list:
+        """토너먼트를 끝까지(또는 새 게임 max_games개까지) 진행하고 리더보드를 돌려줍니다."""
+        rounds = 1 if self.spec["format"] == "round_robin" else self.spec["rounds"]
+        budget = max_games
+        for round_no in range(rounds):
+            games = [g for players in self._round_pairings(round_no) for g in self._games_for(round_no, players)]
+            played = await self._play(games, budget)
+            if budget is not None:
+                budget -= played
+            if any(key not in self.results for key, _ in games):
+                break  # 이번 라운드가 끝나지 않으면 (중단/오류) 다음 라운드 대진을 만들 수 없음
+        return self.leaderboard()
+
+    def _round_pairings(self, round_no: int) -> list:
+        # 이미 시작한 라운드는 체크포인트에 기록된 대진을 그대로 사용 (재개 시 Swiss 대진이 바뀌지 않게)
+        recorded = sorted({tuple(r["players"]) for r in self.results.values() if r["round"] == round_no})
+        if recorded and self.spec["format"] == "swiss":
+            return recorded
+        return self._pairings(round_no)
+
+    # --- 순위 ---
+    def ratings(self) -> dict:
+        ratings = {"elo_profit": {}, "elo_share": {}}
+        for key in sorted(self.results, key=lambda k: (self.results[k]["round"], k)):
+            result = self.results[key]
+            update_elo(ratings["elo_profit"], result["accumulated_profit"], self.spec["k_factor"])
+            update_elo(ratings["elo_share"], result["market_share"], self.spec["k_factor"])
+        return ratings
+
+    def leaderboard(self) -> list:
+        ratings = self.ratings()
+        stats = {p: {"games": 0, "wins": 0} for p in self.personas}
+        for result in self.results.values():
+            for p in result["players"]:
+                stats[p]["games"] += 1
+            profits = result["accumulated_profit"]
+            leaders = [p for p, v in profits.items() if v == max(profits.values())]
+            if len(leaders) == 1:  # 동률은 승리로 세지 않음
+                stats[leaders[0]]["wins"] += 1
+        board = [{"persona": p, "description": self.personas[p],
+                  "elo_profit": round(ratings["elo_profit"].get(p, ELO_INITIAL), 1),
+                  "elo_share": round(ratings["elo_share"].get(p, ELO_INITIAL), 1), **stats[p]}
+                 for p in self.personas]
+        return sorted(board, key=lambda row: (-row["elo_profit"], -row["elo_share"], row["persona"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="페르소나 토너먼트 (병렬 자동 진행 + Elo 리더보드)")
+    parser.add_argument("--spec", help="토너먼트 spec JSON (체크포인트로 재개할 때는 생략 가능)")
+    parser.add_argument("--checkpoint", default="tournament_state.json")
+    parser.add_argument("--backend", choices=TOURNAMENT_BACKENDS, help="spec의 backend 덮어쓰기")
+    parser.add_argument("--concurrency", type=int, help="spec의 concurrency 덮어쓰기")
+    parser.add_argument("--max-games", type=int, default=None, help="이번 실행에서 진행할 최대 게임 수")
+    args = parser.parse_args(argv)
+
+    spec = None
+    if args.spec:
+        with open(args.spec, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    elif not os.path.exists(args.checkpoint):
+        parser.error("--spec is required when the checkpoint does not exist")
+    overrides = {k: v for k, v in (("backend", args.backend), ("concurrency", args.concurrency)) if v is not None}
+    if overrides:
+        if spec is None:
+            with open(args.checkpoint, "r", encoding="utf-8") as f:
+                spec = json.load(f)["spec"]
+        spec = {**spec, **overrides}
+
+    tournament = Tournament(spec, args.checkpoint)
+    print(f"=== 🏆 [Tournament] {len(tournament.personas)} personas, format={tournament.spec['format']}, "
+          f"backend={tournament.spec['backend']} ===")
+    board = asyncio.run(tournament.run(args.max_games))
+    for rank, row in enumerate(board, 1):
+        print(f"{rank:>2}. {row['persona']:<16} elo_profit={row['elo_profit']:>7} elo_share={row['elo_share']:>7} "
+              f"wins={row['wins']}/{row['games']}")
+    return board
+
+
+if __name__ == "__main__":
+    main()
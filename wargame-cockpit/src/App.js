@@ -235,6 +235,9 @@ function App() {
   const [choiceOptions, setChoiceOptions] = useState(null);
   const [selectedDecisions, setSelectedDecisions] = useState({});
   const [isWaitingForChoice, setIsWaitingForChoice] = useState(false);
+  // 선택지 스트리밍 중 여부와 진행 상황 (에이전트별 응답이 도착하는 대로 표시)
+  const [isStreamingChoices, setIsStreamingChoices] = useState(false);
+  const [choiceProgress, setChoiceProgress] = useState(null);
   
   const [isAutoRun, setIsAutoRun] = useState(false);
   const [isLooping, setIsLooping] = useState(false);
@@ -608,15 +611,23 @@ function App() {
   const handleGetChoices = useCallback(async () => {
     if (!simulationId) return;
     setError(null);
+    setChoiceOptions({});
+    setSelectedDecisions({});
+    setChoiceProgress(null);
+    setIsStreamingChoices(true);
     try {
-      const choices = await api.getDecisionChoices(simulationId);
+      const choices = await api.streamDecisionChoices(simulationId, {
+        onChoice: (name, agentChoices) => setChoiceOptions(prev => ({ ...prev, [name]: agentChoices })),
+        onProgress: (progress) => setChoiceProgress(progress),
+      });
       setChoiceOptions(choices);
       setIsWaitingForChoice(true);
-      setSelectedDecisions({});
     } catch (err) {
       setError(`선택지 요청 실패: ` + err.message);
       setIsAutoRun(false); setIsLooping(false); setIsLoading(false);
       throw err;
+    } finally {
+      setIsStreamingChoices(false);
     }
   }, [simulationId]);
 
@@ -637,7 +648,7 @@ function App() {
         }
       });
 
-      const data = await api.executeTurn(simulationId, decisionsToExecute);
+      const data = await api.executeTurn(simulationId, decisionsToExecute, currentTurn);
       
       setHistory(prevHistory => [...prevHistory, data.turn_results]);
       setCurrentTurn(data.turn);
@@ -669,7 +680,7 @@ function App() {
       setIsStrategyLocked(false);
     }
 
-  }, [simulationId, isLoading, isWaitingForChoice, companyNames, selectedDecisions]);
+  }, [simulationId, isLoading, isWaitingForChoice, companyNames, selectedDecisions, currentTurn]);
 
   // 자동 주행(Looping) 드라이버
   useEffect(() => {
@@ -998,16 +1009,21 @@ function App() {
   // [UI Component] 결정 패널 (Decision Panel) - 재사용 가능
   // -------------------------------------------------------------------------------
   const renderDecisionPanel = () => {
-    if (!isWaitingForChoice || !choiceOptions) return null;
+    if ((!isWaitingForChoice && !isStreamingChoices) || !choiceOptions) return null;
 
     return (
         <div style={{ marginTop: '20px', padding: '20px', border: '1px solid #007bff', borderRadius: '8px', backgroundColor: '#eaf4ff' }}>
-          <h3 style={{ textAlign: 'center', color: '#0056b3', marginTop: 0 }}>🧠 AI 전략 수립 완료: {currentTurn + 1}턴 </h3>
+          <h3 style={{ textAlign: 'center', color: '#0056b3', marginTop: 0 }}>
+            {isStreamingChoices
+              ? `⏳ AI 전략 수립 중: ${currentTurn + 1}턴 (${Object.keys(choiceOptions).length}/${companyNames.length}${choiceProgress ? `, ${choiceProgress.elapsed_sec.toFixed(1)}s` : ''})`
+              : `🧠 AI 전략 수립 완료: ${currentTurn + 1}턴`}
+          </h3>
           
           <div style={{ display: 'grid', gridTemplateColumns: `repeat(${Math.min(companyNames.length, 3)}, 1fr)`, gap: '15px' }}>
               {companyNames.map(name => (
               <div key={name} style={{ border: '1px solid #ccc', padding: '15px', backgroundColor: '#fff', borderRadius: '8px', boxShadow: '0 2px 5px rgba(0,0,0,0.05)' }}>
                 <h4 style={{ color: COMPANY_COLORS[name] || '#000', borderBottom: '2px solid #eee', paddingBottom: '10px', marginTop: 0 }}>{name}의 전략</h4>
+                {!choiceOptions[name] && <p style={{ color: '#888' }}>⏳ 전략 수립 중...</p>}
                 {choiceOptions[name] && choiceOptions[name].map((choice, index) => {
                   const isSelected = selectedDecisions[name] === choice;
                   return (
@@ -40,8 +40,38 @@ export const getDecisionChoices = async (simulationId) => {
   return await response.json();
 };
 
+// 2-1. 현재 턴의 선택지 스트리밍 조회 (SSE)
+// 에이전트별 선택지가 준비되는 즉시 onChoice(이름, 선택지, 이벤트데이터)를 호출하고,
+// 대기 중에는 onProgress({ waiting, elapsed_sec, completed, total })를 호출합니다.
+// 모든 에이전트가 끝나면 getDecisionChoices와 같은 형태의 전체 결과로 resolve 됩니다.
+export const streamDecisionChoices = (simulationId, { onChoice, onProgress } = {}) => {
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE_URL}/simulations/${simulationId}/get_choices_stream`);
+    let finished = false;
+
+    source.addEventListener('choice', (event) => {
+      const data = JSON.parse(event.data);
+      if (onChoice) onChoice(data.agent, data.choices, data);
+    });
+    source.addEventListener('progress', (event) => {
+      if (onProgress) onProgress(JSON.parse(event.data));
+    });
+    source.addEventListener('done', (event) => {
+      finished = true;
+      source.close();
+      resolve(JSON.parse(event.data).choices);
+    });
+    source.onerror = () => {
+      // 서버가 스트림을 닫으면 EventSource가 재연결을 시도하므로 직접 닫음
+      source.close();
+      if (!finished) reject(new Error('Failed to stream choices'));
+    };
+  });
+};
+
 // 3. 선택(Decision) 전송 및 턴 실행
-export const executeTurn = async (simulationId, decisions) => {
+// turn: 선택지를 받은 턴. 주면 다른 탭/더블클릭으로 이미 진행된 턴이면 서버가 409로 거절합니다.
+export const executeTurn = async (simulationId, decisions, turn) => {
   // [수정됨] 경로: /simulation/... -> /simulations/... (이전에 수정한 부분 유지)
   const response = await fetch(`${API_BASE_URL}/simulations/${simulationId}/execute_turn`, {
     method: 'POST',
@@ -49,7 +79,7 @@ export const executeTurn = async (simulationId, decisions) => {
       'Content-Type': 'application/json',
     },
     // [중요 수정] 백엔드 스키마(ExecuteTurnRequest)에 맞춰 'decisions' 키로 한 번 감싸야 합니다.
-    body: JSON.stringify({ decisions }), 
+    body: JSON.stringify(turn === undefined ? { decisions } : { decisions, turn }), 
   });
 
   if (!response.ok) {